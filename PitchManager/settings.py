@@ -88,6 +88,16 @@ DATABASES = {
     }
 }
 
+# Cache (locmem mặc định; có thể trỏ sang file/Redis qua biến môi trường)
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='pitchmanager'),
+    }
+}
+
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -5,9 +5,11 @@ from django.contrib import messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Facility, PitchType, TimeSlot, Pitch, PitchTimeSlot, Voucher,
-    Booking, Review, Comment, Favorite, BookingStatus
+    Booking, BookingSeries, Review, Comment, Favorite, BookingStatus,
+    DailySlotLedger, VoucherRedemption, EmailOutbox, EmailStatus
 )
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 from . import constants
 
 
@@ -81,11 +83,12 @@ class TimeSlotAdmin(admin.ModelAdmin):
         'name',
         'start_time',
         'end_time',
+        'duration_minutes',
         'is_active',
         'created_at')
     search_fields = ('name',)
     list_filter = ('is_active', 'start_time')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('duration_minutes', 'created_at')
     ordering = ('start_time',)
     list_per_page = constants.ADMIN_LIST_PER_PAGE
 
@@ -94,7 +97,8 @@ class PitchTimeSlotInline(admin.TabularInline):
     model = PitchTimeSlot
     extra = constants.ADMIN_INLINE_EXTRA
     raw_id_fields = ('time_slot',)
-    fields = ('time_slot', 'is_available')
+    fields = ('time_slot', 'is_available', 'price')
+    readonly_fields = ('price',)
 
 
 class PitchAdmin(admin.ModelAdmin):
@@ -164,14 +168,15 @@ class PitchTimeSlotAdmin(admin.ModelAdmin):
         'created_at')
     search_fields = ('pitch__name', 'time_slot__name')
     list_filter = ('is_available', 'time_slot', 'pitch__facility')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('price', 'created_at')
     raw_id_fields = ('pitch', 'time_slot')
     ordering = ('pitch__name', 'time_slot__start_time')
     list_per_page = constants.ADMIN_LIST_PER_PAGE
 
     def get_price_per_slot(self, obj):
-        return f"{obj.get_price():,.0f}"
+        return f"{obj.price:,.0f}"
     get_price_per_slot.short_description = "Giá/Slot"
+    get_price_per_slot.admin_order_field = 'price'
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
@@ -234,6 +239,32 @@ class BookingAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class DailySlotLedgerAdmin(admin.ModelAdmin):
+    list_display = (
+        'pitch',
+        'booking_date',
+        'occupied_count',
+        'occupied_slot_ids',
+        'updated_at')
+    list_filter = ('booking_date', 'pitch__facility')
+    search_fields = ('pitch__name',)
+    readonly_fields = (
+        'pitch',
+        'booking_date',
+        'occupied_slot_ids',
+        'occupied_count',
+        'updated_at')
+    date_hierarchy = constants.DATE_HIERARCHY_BOOKING
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('pitch')
+
+    def has_add_permission(self, request):
+        # Sổ cái được sinh tự động từ Booking
+        return False
+
+
 class ReviewAdmin(admin.ModelAdmin):
     list_display = (
         'id',
@@ -258,6 +289,7 @@ class CommentAdmin(admin.ModelAdmin):
         'user',
         'review',
         'parent_comment',
+        'depth',
         'created_at',
         'updated_at')
     search_fields = ('user__username', 'review__pitch__name', 'content')
@@ -270,6 +302,27 @@ class CommentAdmin(admin.ModelAdmin):
             'user', 'review', 'parent_comment')
 
 
+class BookingSeriesAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'pitch',
+        'user',
+        'time_slot',
+        'start_date',
+        'weeks',
+        'is_active',
+        'created_at')
+    search_fields = ('user__username', 'pitch__name')
+    list_filter = ('is_active', 'pitch__facility')
+    readonly_fields = ('cancelled_at', 'created_at')
+    raw_id_fields = ('user', 'pitch', 'time_slot')
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user', 'pitch', 'time_slot__time_slot')
+
+
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'pitch', 'created_at')
     search_fields = ('user__username', 'pitch__name')
@@ -282,6 +335,36 @@ class FavoriteAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user', 'pitch')
 
 
+class VoucherRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'voucher', 'created_at')
+    search_fields = ('user__username', 'voucher__code')
+    readonly_fields = ('created_at',)
+    raw_id_fields = ('user', 'voucher')
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'voucher')
+
+
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        'subject', 'status', 'attempts', 'next_attempt_at', 'created_at',
+        'sent_at')
+    search_fields = ('subject',)
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+    actions = ['retry_now']
+
+    @admin.action(description="Gửi lại ngay các email đã chọn")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=EmailStatus.SENT).update(
+            status=EmailStatus.PENDING, attempts=0, next_attempt_at=timezone.now())
+        self.message_user(
+            request, f"Đã đưa {updated} email vào hàng đợi gửi lại.",
+            messages.SUCCESS)
+
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Facility, FacilityAdmin)
 admin.site.register(PitchType, PitchTypeAdmin)
@@ -289,7 +372,11 @@ admin.site.register(TimeSlot, TimeSlotAdmin)
 admin.site.register(Pitch, PitchAdmin)
 admin.site.register(PitchTimeSlot, PitchTimeSlotAdmin)
 admin.site.register(Voucher, VoucherAdmin)
+admin.site.register(VoucherRedemption, VoucherRedemptionAdmin)
 admin.site.register(Booking, BookingAdmin)
+admin.site.register(BookingSeries, BookingSeriesAdmin)
+admin.site.register(DailySlotLedger, DailySlotLedgerAdmin)
 admin.site.register(Review, ReviewAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
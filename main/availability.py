@@ -0,0 +1,273 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from . import constants
+from .models import (
+    ACTIVE_BOOKING_STATUSES, Booking, DailySlotLedger, PitchTimeSlot
+)
+
+
+CACHE_PREFIX = 'availability'
+STAT_HITS = 'hits'
+STAT_MISSES = 'misses'
+
+
+def _version_key(pitch_id, booking_date):
+    return f"{CACHE_PREFIX}:version:{pitch_id}:{booking_date.isoformat()}"
+
+
+def _data_key(pitch_id, booking_date, version):
+    return f"{CACHE_PREFIX}:booked:{pitch_id}:{booking_date.isoformat()}:{version}"
+
+
+def _stat_key(name):
+    return f"{CACHE_PREFIX}:stats:{name}"
+
+
+def _incr_stat(name, amount):
+    if not amount:
+        return
+    key = _stat_key(name)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def get_cache_stats():
+    """Số lần cache hit/miss của dữ liệu tình trạng trống"""
+    stats = cache.get_many([_stat_key(STAT_HITS), _stat_key(STAT_MISSES)])
+    return {
+        STAT_HITS: stats.get(_stat_key(STAT_HITS), 0),
+        STAT_MISSES: stats.get(_stat_key(STAT_MISSES), 0),
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([_stat_key(STAT_HITS), _stat_key(STAT_MISSES)])
+
+
+def _get_versions(keys):
+    """
+    Version hiện tại của từng (pitch_id, booking_date).
+
+    Version khởi tạo bằng time_ns() để khi key version bị evict,
+    dữ liệu cũ của version trước không bị đọc lại.
+    """
+    version_keys = {key: _version_key(*key) for key in keys}
+    found = cache.get_many(version_keys.values())
+    versions = {}
+    for key, version_key in version_keys.items():
+        if version_key not in found:
+            cache.add(version_key, time.time_ns(), timeout=None)
+            found[version_key] = cache.get(version_key)
+        versions[key] = found[version_key]
+    return versions
+
+
+def invalidate_availability(keys):
+    """Tăng version của các (pitch_id, booking_date) để bỏ dữ liệu đã cache"""
+    for key in keys:
+        if None in key:
+            continue
+        version_key = _version_key(*key)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.set(version_key, time.time_ns(), timeout=None)
+
+
+def invalidate_availability_on_commit(keys):
+    """
+    Bỏ cache ngay và bỏ thêm lần nữa khi commit, tránh request khác
+    kịp cache lại dữ liệu cũ trong lúc transaction chưa commit.
+    """
+    invalidate_availability(keys)
+    transaction.on_commit(lambda: invalidate_availability(keys))
+
+
+def get_booked_slot_ids_many(keys):
+    """
+    Tập id PitchTimeSlot đã bị chiếm cho nhiều (pitch_id, booking_date).
+
+    Đọc từ cache trước; các cặp chưa có trong cache được lấy từ sổ cái
+    bằng 1 query rồi ghi lại vào cache.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    versions = _get_versions(keys)
+    data_keys = {key: _data_key(*key, versions[key]) for key in keys}
+    cached = cache.get_many(data_keys.values())
+
+    result = {}
+    missing = []
+    for key, data_key in data_keys.items():
+        if data_key in cached:
+            result[key] = set(cached[data_key])
+        else:
+            missing.append(key)
+
+    _incr_stat(STAT_HITS, len(result))
+    _incr_stat(STAT_MISSES, len(missing))
+
+    if missing:
+        key_filter = Q()
+        for pitch_id, booking_date in missing:
+            key_filter |= Q(pitch_id=pitch_id, booking_date=booking_date)
+        for pitch_id, booking_date, occupied in DailySlotLedger.objects.filter(
+            key_filter
+        ).values_list('pitch_id', 'booking_date', 'occupied_slot_ids'):
+            result[(pitch_id, booking_date)] = set(occupied)
+
+        to_cache = {}
+        for key in missing:
+            result.setdefault(key, set())
+            to_cache[data_keys[key]] = sorted(result[key])
+        cache.set_many(to_cache, timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+
+    return result
+
+
+def get_booked_slot_ids(pitch, booking_date):
+    """Tập id PitchTimeSlot đã bị chiếm của sân trong ngày."""
+    key = (pitch.id, booking_date)
+    return get_booked_slot_ids_many([key])[key]
+
+
+def _open_slots(slots):
+    """Các PitchTimeSlot đang mở, đã kèm TimeSlot, theo giờ bắt đầu."""
+    return (
+        slots.filter(is_available=True)
+        .select_related('time_slot')
+        .order_by('time_slot__start_time')
+    )
+
+
+def get_pitch_slots_on_date(pitch, booking_date):
+    """
+    Lấy toàn bộ khung giờ đang mở của sân kèm trạng thái trống trong ngày.
+
+    Số query cố định (khung giờ + sổ cái nếu cache miss) bất kể sân có
+    bao nhiêu khung giờ.
+    Mỗi PitchTimeSlot trả về có thêm thuộc tính `is_booked`.
+    """
+    slots = list(_open_slots(PitchTimeSlot.objects.filter(pitch=pitch)))
+    booked_ids = get_booked_slot_ids(pitch, booking_date)
+    for slot in slots:
+        # Gắn lại pitch đã load để template đọc slot.pitch không query thêm
+        slot.pitch = pitch
+        slot.is_booked = slot.id in booked_ids
+    return slots
+
+
+def get_free_pitch_slots(pitch, booking_date):
+    """Chỉ trả về các khung giờ còn trống của sân trong ngày."""
+    return [
+        slot for slot in get_pitch_slots_on_date(pitch, booking_date)
+        if not slot.is_booked
+    ]
+
+
+def attach_slots_on_date(pitches, booking_date):
+    """
+    Gắn danh sách `slots_on_date` (kèm `is_booked`) cho từng sân.
+
+    Dùng cho trang cơ sở: 1 query khung giờ và tối đa 1 query sổ cái
+    cho mọi sân, số query không phụ thuộc số sân.
+    """
+    pitches_by_id = {pitch.id: pitch for pitch in pitches}
+    for pitch in pitches:
+        pitch.slots_on_date = []
+
+    booked_ids = set()
+    for occupied in get_booked_slot_ids_many(
+        (pitch_id, booking_date) for pitch_id in pitches_by_id
+    ).values():
+        booked_ids.update(occupied)
+
+    slots = _open_slots(
+        PitchTimeSlot.objects.filter(pitch_id__in=pitches_by_id))
+    for slot in slots:
+        pitch = pitches_by_id[slot.pitch_id]
+        slot.pitch = pitch
+        slot.is_booked = slot.id in booked_ids
+        pitch.slots_on_date.append(slot)
+    return pitches
+
+
+def get_availability_calendar(pitch, start_date, days):
+    """
+    Ma trận khung giờ × ngày của sân trong `days` ngày kể từ `start_date`.
+
+    Dùng 1 query lấy khung giờ và tối đa 1 query sổ cái (các ngày chưa
+    có trong cache) cho cả khoảng ngày, thay vì query theo từng ngày.
+    """
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    slots = list(_open_slots(PitchTimeSlot.objects.filter(pitch=pitch)))
+    booked = set()
+    for (_, booking_date), occupied in get_booked_slot_ids_many(
+        (pitch.id, day) for day in dates
+    ).items():
+        booked.update((slot_id, booking_date) for slot_id in occupied)
+
+    matrix = []
+    for slot in slots:
+        slot.pitch = pitch
+        matrix.append([
+            0 if (slot.id, day) in booked else 1
+            for day in dates
+        ])
+
+    return {
+        'pitch_id': pitch.id,
+        'dates': [day.isoformat() for day in dates],
+        'slots': [
+            {
+                'id': slot.id,
+                'name': slot.time_slot.name,
+                'start_time': slot.time_slot.start_time.strftime('%H:%M'),
+                'end_time': slot.time_slot.end_time.strftime('%H:%M'),
+                'price': float(slot.get_price()),
+            }
+            for slot in slots
+        ],
+        # matrix[i][j] = 1 nếu slots[i] còn trống vào dates[j]
+        'matrix': matrix,
+    }
+
+
+def annotate_free_slot_count(pitches, booking_date):
+    """
+    Gắn `free_slot_count` (số khung giờ đang mở còn trống trong ngày) cho
+    queryset Pitch.
+
+    Số khung giờ bị chiếm lấy từ 1 subquery gom nhóm trên Booking, lọc
+    theo (pitch, booking_date) nên dùng được index của Booking. Chỉ đếm
+    booking của khung giờ đang mở để khung giờ đã đóng không bị trừ 2 lần.
+    """
+    open_slots = PitchTimeSlot.objects.filter(
+        pitch=OuterRef('pk'), is_available=True
+    ).order_by().values('pitch').annotate(total=Count('pk')).values('total')
+    booked_slots = Booking.objects.filter(
+        pitch=OuterRef('pk'),
+        booking_date=booking_date,
+        status__in=ACTIVE_BOOKING_STATUSES,
+        time_slot__is_available=True,
+    ).order_by().values('pitch').annotate(
+        total=Count('time_slot', distinct=True)
+    ).values('total')
+
+    return pitches.annotate(
+        free_slot_count=(
+            Coalesce(Subquery(open_slots), 0) -
+            Coalesce(Subquery(booked_slots), 0)
+        )
+    )
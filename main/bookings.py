@@ -0,0 +1,343 @@
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import constants
+from .availability import (
+    get_booked_slot_ids_many, invalidate_availability_on_commit
+)
+from .models import (
+    ACTIVE_BOOKING_STATUSES, Booking, BookingSeries, BookingStatus,
+    DailySlotLedger, PitchTimeSlot, VoucherRedemption, is_slot_conflict
+)
+from .outbox import queue_emails
+from .utils import build_booking_email
+
+
+def load_cart_slots(items):
+    """
+    Load các PitchTimeSlot trong giỏ bằng 1 query.
+
+    items: danh sách (time_slot_id, booking_date).
+    Trả về dict id → PitchTimeSlot (đã kèm pitch và time_slot).
+    """
+    slot_ids = {time_slot_id for time_slot_id, _ in items}
+    return PitchTimeSlot.objects.select_related(
+        'pitch', 'time_slot').in_bulk(slot_ids)
+
+
+def validate_cart(items, slots):
+    """
+    Kiểm tra toàn bộ giỏ, trả về danh sách lỗi (rỗng nếu hợp lệ).
+
+    Tình trạng trống của mọi (sân, ngày) trong giỏ được lấy bằng 1 lần
+    đọc sổ cái thay vì kiểm tra từng khung giờ.
+    """
+    if not items:
+        return [constants.ERR_CART_EMPTY]
+
+    errors = []
+    if any(time_slot_id not in slots for time_slot_id, _ in items):
+        errors.append(constants.ERR_CART_SLOT_INVALID)
+        items = [item for item in items if item[0] in slots]
+
+    booked = get_booked_slot_ids_many(
+        (slots[time_slot_id].pitch_id, booking_date)
+        for time_slot_id, booking_date in items
+    )
+    today = date.today()
+    for time_slot_id, booking_date in items:
+        slot = slots[time_slot_id]
+        context = {
+            'time_slot_name': slot.time_slot.name,
+            'pitch_name': slot.pitch.name,
+            'booking_date': booking_date.strftime('%d/%m/%Y'),
+        }
+        if booking_date < today:
+            errors.append(constants.ERR_CART_DATE_PAST.format(**context))
+        elif not slot.is_available or not slot.pitch.is_available:
+            errors.append(constants.ERR_CART_SLOT_CLOSED.format(**context))
+        elif slot.id in booked[(slot.pitch_id, booking_date)]:
+            errors.append(constants.ERR_CART_SLOT_TAKEN.format(**context))
+    return errors
+
+
+def checkout_cart(user, items, voucher=None, note=None):
+    """
+    Đặt toàn bộ khung giờ trong giỏ trong 1 transaction.
+
+    Các booking được tạo bằng 1 câu bulk_create; voucher (nếu có) được áp
+    dụng cho mọi booking trong giỏ nhưng chỉ tính 1 lượt sử dụng.
+    Raise ValidationError nếu có khung giờ không hợp lệ hoặc đã bị đặt.
+    """
+    items = list(dict.fromkeys(items))
+    slots = load_cart_slots(items)
+    errors = validate_cart(items, slots)
+    if errors:
+        raise ValidationError(errors)
+
+    bookings = []
+    voucher_applied = False
+    for time_slot_id, booking_date in items:
+        slot = slots[time_slot_id]
+        booking = Booking(
+            user=user,
+            pitch=slot.pitch,
+            time_slot=slot,
+            booking_date=booking_date,
+            voucher=voucher,
+            note=note,
+            status=BookingStatus.PENDING,
+        )
+        voucher_applied = booking._apply_pricing() or voucher_applied
+        bookings.append(booking)
+
+    # bulk_create không gọi Booking.save() nên sổ cái và cache phải
+    # được đồng bộ thủ công
+    keys = {(booking.pitch_id, booking.booking_date) for booking in bookings}
+    try:
+        with transaction.atomic():
+            if voucher_applied:
+                VoucherRedemption.redeem(user.id, voucher.pk)
+            Booking.objects.bulk_create(bookings)
+            DailySlotLedger.rebuild_for(keys)
+    except IntegrityError as exc:
+        if not is_slot_conflict(exc):
+            raise
+        # Khung giờ vừa bị người khác đặt sau bước kiểm tra
+        raise ValidationError("Khung giờ này đã được đặt.") from exc
+    invalidate_availability_on_commit(keys)
+    return bookings
+
+
+def find_series_conflicts(pitch_time_slot, dates):
+    """Các ngày trong `dates` mà khung giờ đã có booking active (1 query)"""
+    return set(
+        Booking.objects.filter(
+            time_slot=pitch_time_slot,
+            booking_date__in=dates,
+            status__in=ACTIVE_BOOKING_STATUSES,
+        ).values_list('booking_date', flat=True)
+    )
+
+
+def create_booking_series(user, pitch_time_slot, start_date, weeks, note=None):
+    """
+    Tạo lịch đặt định kỳ hằng tuần và các booking của nó.
+
+    Mọi ngày của lịch được kiểm tra trùng bằng 1 query; các ngày còn trống
+    được tạo bằng 1 câu bulk_create, các ngày bị trùng được bỏ qua.
+    pitch_time_slot cần load sẵn pitch và time_slot.
+    Trả về (series, bookings, conflict_dates).
+    """
+    if not pitch_time_slot.is_available or \
+            not pitch_time_slot.pitch.is_available:
+        raise ValidationError("Khung giờ này hiện không nhận đặt.")
+
+    series = BookingSeries(
+        user=user,
+        pitch=pitch_time_slot.pitch,
+        time_slot=pitch_time_slot,
+        start_date=start_date,
+        weeks=weeks,
+        note=note,
+    )
+    dates = series.occurrence_dates
+    conflict_dates = find_series_conflicts(pitch_time_slot, dates)
+    free_dates = [day for day in dates if day not in conflict_dates]
+    if not free_dates:
+        raise ValidationError(constants.ERR_SERIES_NO_FREE_DATES)
+
+    bookings = []
+    for booking_date in free_dates:
+        booking = Booking(
+            user=user,
+            pitch=pitch_time_slot.pitch,
+            time_slot=pitch_time_slot,
+            booking_date=booking_date,
+            note=note,
+            status=BookingStatus.PENDING,
+            series=series,
+        )
+        booking._apply_pricing()
+        bookings.append(booking)
+
+    keys = {(series.pitch_id, booking_date) for booking_date in free_dates}
+    try:
+        with transaction.atomic():
+            series.save()
+            Booking.objects.bulk_create(bookings)
+            DailySlotLedger.rebuild_for(keys)
+    except IntegrityError as exc:
+        if not is_slot_conflict(exc):
+            raise
+        raise ValidationError("Khung giờ này đã được đặt.") from exc
+    invalidate_availability_on_commit(keys)
+    return series, bookings, sorted(conflict_dates)
+
+
+def cancel_booking_series(series):
+    """
+    Hủy lịch định kỳ theo đúng quy tắc user tự hủy: chỉ các buổi từ ngày
+    mai trở đi còn đang chờ xác nhận; buổi đã được duyệt hoặc diễn ra hôm
+    nay giữ nguyên. Các buổi được khoá rồi hủy bằng 1 UPDATE, voucher được
+    trả lượt và email hủy được đưa vào hàng đợi như khi hủy từng booking.
+
+    Trả về số buổi đã hủy.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        cancelled = list(
+            series.bookings.select_for_update(of=('self',))
+            .filter(
+                booking_date__gt=date.today(),
+                status=BookingStatus.PENDING,
+            )
+            .select_related('user', 'pitch', 'time_slot__time_slot')
+        )
+        Booking.objects.filter(
+            pk__in=[booking.pk for booking in cancelled]
+        ).update(status=BookingStatus.CANCELLED, updated_at=now)
+        for booking in cancelled:
+            booking.status = BookingStatus.CANCELLED
+            booking.updated_at = now
+
+        series.is_active = False
+        series.cancelled_at = now
+        series.save(update_fields=['is_active', 'cancelled_at'])
+
+        keys = {(booking.pitch_id, booking.booking_date) for booking in cancelled}
+        _release_vouchers(cancelled, forget=False)
+        DailySlotLedger.rebuild_for(keys)
+        queue_emails([
+            build_booking_email(
+                booking,
+                constants.EMAIL_SUBJECT_BOOKING_CANCELLATION,
+                constants.EMAIL_TEMPLATE_BOOKING_CANCELLATION)
+            for booking in cancelled if booking.user.email
+        ])
+    invalidate_availability_on_commit(keys)
+    return len(cancelled)
+
+
+# Email gửi cho khách khi duyệt/từ chối hàng loạt
+BULK_STATUS_EMAILS = {
+    BookingStatus.CONFIRMED: (
+        constants.EMAIL_SUBJECT_BOOKING_APPROVED,
+        constants.EMAIL_TEMPLATE_BOOKING_APPROVED,
+    ),
+    BookingStatus.REJECTED: (
+        constants.EMAIL_SUBJECT_BOOKING_REJECTION,
+        constants.EMAIL_TEMPLATE_BOOKING_REJECTION,
+    ),
+}
+
+
+def _release_vouchers(bookings, forget=True):
+    """
+    Trả lượt voucher của các booking vừa bị từ chối/hủy. Như Booking.save,
+    chỉ trả khi user không còn booking active nào khác dùng voucher đó;
+    forget=False (user tự hủy) vẫn tính là user đã dùng voucher.
+    """
+    pairs = {
+        (booking.user_id, booking.voucher_id)
+        for booking in bookings if booking.voucher_id
+    }
+    if not pairs:
+        return
+    pair_filter = Q()
+    for user_id, voucher_id in pairs:
+        pair_filter |= Q(user_id=user_id, voucher_id=voucher_id)
+    still_used = set(
+        Booking.objects.filter(pair_filter, status__in=ACTIVE_BOOKING_STATUSES)
+        .values_list('user_id', 'voucher_id')
+    )
+    VoucherRedemption.release_many(pairs - still_used, forget=forget)
+
+
+def _supports_update_returning():
+    """Backend có UPDATE ... RETURNING (PostgreSQL, SQLite >= 3.35)"""
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite'
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+def _update_pending_status(booking_ids, new_status):
+    """
+    Đổi các booking trong booking_ids còn đang chờ sang new_status, trả về
+    id của đúng các dòng vừa đổi (gọi trong transaction).
+
+    Có RETURNING thì chỉ 1 câu UPDATE ... WHERE status='Pending' RETURNING
+    id. Backend khác khoá các dòng đang chờ bằng SELECT ... FOR UPDATE rồi
+    UPDATE đúng các id đã khoá.
+    """
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return []
+    now = timezone.now()
+
+    if _supports_update_returning():
+        table = Booking._meta.db_table
+        placeholders = ', '.join(['%s'] * len(booking_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET status = %s, updated_at = %s "
+                f"WHERE status = %s AND id IN ({placeholders}) RETURNING id",
+                [
+                    new_status,
+                    connection.ops.adapt_datetimefield_value(now),
+                    BookingStatus.PENDING,
+                    *booking_ids,
+                ])
+            return [row[0] for row in cursor.fetchall()]
+
+    locked_ids = list(
+        Booking.objects.select_for_update()
+        .filter(pk__in=booking_ids, status=BookingStatus.PENDING)
+        .values_list('pk', flat=True)
+    )
+    Booking.objects.filter(pk__in=locked_ids).update(
+        status=new_status, updated_at=now)
+    return locked_ids
+
+
+def bulk_update_booking_status(booking_ids, new_status, reason=None):
+    """
+    Duyệt hoặc từ chối nhiều booking đang chờ cùng lúc.
+
+    Trạng thái được đổi bằng 1 câu UPDATE ... WHERE status='Pending' nên
+    đơn đã được xử lý (kể cả vừa bị admin khác xử lý) tự bị bỏ qua. Từ chối
+    thì trả lượt voucher và giải phóng khung giờ trong sổ cái; email thông
+    báo được đưa vào hàng đợi bằng 1 câu INSERT.
+    Trả về danh sách booking đã thực sự đổi trạng thái.
+    """
+    if new_status not in BULK_STATUS_EMAILS:
+        raise ValueError(f"Không hỗ trợ chuyển hàng loạt sang {new_status}")
+
+    with transaction.atomic():
+        changed_ids = _update_pending_status(booking_ids, new_status)
+        if not changed_ids:
+            return []
+
+        changed = list(
+            Booking.objects.filter(pk__in=changed_ids)
+            .select_related('user', 'pitch', 'time_slot__time_slot')
+        )
+        keys = {(booking.pitch_id, booking.booking_date) for booking in changed}
+        if new_status == BookingStatus.REJECTED:
+            _release_vouchers(changed)
+            DailySlotLedger.rebuild_for(keys)
+
+        subject_template, message_template = BULK_STATUS_EMAILS[new_status]
+        extra_context = {'reason': reason or constants.DEFAULT_REJECTION_REASON}
+        queue_emails([
+            build_booking_email(
+                booking, subject_template, message_template, extra_context)
+            for booking in changed if booking.user.email
+        ])
+    invalidate_availability_on_commit(keys)
+    return changed
@@ -21,6 +21,16 @@ BOOKINGS_PER_PAGE = 10
 ADMIN_LIST_PER_PAGE = 20
 ADMIN_INLINE_EXTRA = 1
 
+# Phân trang theo cursor chỉ đếm tổng tối đa tới số này (hiển thị "1000+")
+APPROXIMATE_COUNT_LIMIT = 1000
+
+# Số id sân tối đa cho 1 lần hỏi trạng thái yêu thích
+FAVORITE_STATE_MAX_IDS = 100
+
+# Đánh giá trên trang đặt sân: số hiện sẵn và số tải thêm mỗi lần cuộn
+REVIEWS_INITIAL_COUNT = 5
+REVIEWS_PER_PAGE = 10
+
 PRICE_RANGES = {
     '0-100000': (0, 100000),
     '100000-200000': (100000, 200000),
@@ -34,6 +44,36 @@ VOUCHER_CODE_PATTERN = r'^[A-Za-z0-9\-_]+$'
 MIN_BOOKING_ADVANCE_DAYS = 0
 MAX_BOOKING_ADVANCE_DAYS = 14
 
+# Thời gian (giây) cache tình trạng trống theo (sân, ngày)
+AVAILABILITY_CACHE_TIMEOUT = 300
+
+# Gợi ý tìm kiếm khi gõ: số kết quả mỗi loại và thời gian cache (giây)
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_PREFIX_LENGTH = 50
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+AUTOCOMPLETE_BROWSER_MAX_AGE = 15
+
+# Tra cứu voucher theo mã: thời gian cache (giây), kể cả mã không tồn tại
+VOUCHER_CACHE_TIMEOUT = 30
+VOUCHER_CHECK_BROWSER_MAX_AGE = 30
+
+# Hàng đợi email (EmailOutbox) và worker run_mail_worker
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_DELAY = 60  # giây, gấp đôi sau mỗi lần lỗi
+EMAIL_RETRY_MAX_DELAY = 3600
+# Thời gian giữ email đã nhận để gửi; worker chết giữa chừng thì hết hạn
+# giữ là worker khác gửi lại
+EMAIL_SEND_LEASE_SECONDS = 300
+EMAIL_WORKER_IDLE_SECONDS = 5
+
+# Giỏ đặt sân (lưu trong session)
+CART_SESSION_KEY = 'booking_cart'
+MAX_CART_ITEMS = 10
+
+# Lịch đặt định kỳ hằng tuần
+MAX_SERIES_WEEKS = 12
+
 ROLE_ADMIN = "Admin"
 ROLE_USER = "User"
 
@@ -76,6 +116,31 @@ Trân trọng,
 Hệ thống đặt sân bóng
 """
 
+EMAIL_SUBJECT_BOOKING_CART_CONFIRMATION = "Xác nhận đặt {count} khung giờ"
+
+EMAIL_TEMPLATE_BOOKING_CART_CONFIRMATION = """
+Xin chào {user_name},
+
+Bạn đã đặt sân thành công {count} khung giờ!
+
+Thông tin đặt sân:
+{booking_lines}
+
+Tổng tiền: {total_price}đ
+
+Trạng thái: Đang chờ xác nhận
+
+Vui lòng đợi admin xác nhận đặt sân của bạn.
+
+Trân trọng,
+Hệ thống đặt sân bóng
+"""
+
+EMAIL_BOOKING_CART_LINE = (
+    "- #{booking_id} {pitch_name}, ngày {booking_date}, "
+    "{time_slot_name} ({start_time} - {end_time}): {final_price}đ"
+)
+
 EMAIL_TEMPLATE_BOOKING_APPROVED = """
 Xin chào {user_name},
 
@@ -111,6 +176,8 @@ Trân trọng,
 Hệ thống đặt sân bóng
 """
 
+DEFAULT_REJECTION_REASON = "Khung giờ đã có người đặt hoặc sân không khả dụng."
+
 EMAIL_TEMPLATE_BOOKING_CANCELLATION = """
 Xin chào {user_name},
 
@@ -127,16 +194,46 @@ Trân trọng,
 Hệ thống đặt sân bóng
 """
 
+EMAIL_SUBJECT_PITCH_NOTICE = "Thông báo về sân {pitch_name}"
+
+EMAIL_TEMPLATE_PITCH_NOTICE = """
+Xin chào {user_name},
+
+{message}
+
+Trân trọng,
+Hệ thống đặt sân bóng
+"""
+
+# Duyệt/từ chối hàng loạt: số đơn tối đa mỗi lần
+BULK_BOOKING_MAX_IDS = 500
+
+# Gửi thông báo hàng loạt: số luồng gửi song song và số email mỗi kết nối
+BULK_EMAIL_MAX_WORKERS = 4
+BULK_EMAIL_CHUNK_SIZE = 50
+
 
 MSG_BOOKING_CREATED = "Đặt sân thành công! Vui lòng chờ xác nhận."
 MSG_BOOKING_CANCELLED = "Đã hủy đặt sân."
 MSG_BOOKING_APPROVED = "Đã duyệt booking #{booking_id}."
 MSG_BOOKING_REJECTED = "Đã từ chối booking #{booking_id}."
+MSG_BOOKINGS_BULK_APPROVED = "Đã duyệt {changed}/{requested} đơn đặt sân."
+MSG_BOOKINGS_BULK_REJECTED = "Đã từ chối {changed}/{requested} đơn đặt sân."
+MSG_BOOKINGS_BULK_SKIPPED = "{skipped} đơn không còn ở trạng thái chờ xác nhận nên được bỏ qua."
+MSG_CART_ITEM_ADDED = "Đã thêm {time_slot_name} ngày {booking_date} vào giỏ."
+MSG_CART_ITEM_REMOVED = "Đã xóa khung giờ khỏi giỏ."
+MSG_VOUCHER_APPLIED = "Đã áp dụng mã giảm giá {discount_percent}%!"
+MSG_CART_CHECKED_OUT = "Đặt sân thành công {count} khung giờ! Vui lòng chờ xác nhận."
+MSG_SERIES_CREATED = "Đã tạo lịch định kỳ với {count} buổi. Vui lòng chờ xác nhận."
+MSG_SERIES_CONFLICTS_SKIPPED = "Bỏ qua {count} buổi đã có người đặt: {dates}."
+MSG_SERIES_CANCELLED = "Đã hủy lịch định kỳ ({count} buổi đang chờ xác nhận)."
 
 MSG_FAVORITE_ADDED = "Đã thêm {pitch_name} vào yêu thích."
 MSG_FAVORITE_REMOVED = "Đã bỏ yêu thích {pitch_name}."
 
 MSG_REVIEW_CREATED = "Cảm ơn bạn đã đánh giá!"
+MSG_REVIEW_UPDATED = "Đã cập nhật đánh giá của bạn."
+MSG_REVIEW_DELETED = "Đã xóa đánh giá của bạn."
 
 
 ERR_BOOKING_DATE_PAST = "Không thể đặt lịch trong quá khứ."
@@ -144,12 +241,29 @@ ERR_BOOKING_SLOT_TAKEN = "Khung giờ {time_slot_name} đã được đặt vào
 ERR_BOOKING_SLOT_MISMATCH = "Khung giờ không thuộc về sân này."
 ERR_BOOKING_ONLY_CANCEL_PENDING = "Chỉ có thể hủy đặt sân đang chờ xác nhận."
 ERR_BOOKING_ONLY_APPROVE_PENDING = "Chỉ có thể duyệt booking đang chờ."
+ERR_BULK_NO_SELECTION = "Vui lòng chọn ít nhất 1 đơn đặt sân."
+ERR_BULK_TOO_MANY = "Chỉ xử lý tối đa {limit} đơn mỗi lần."
+ERR_BULK_INVALID_ACTION = "Hành động không hợp lệ."
+
+ERR_CART_EMPTY = "Giỏ đặt sân đang trống."
+ERR_CART_FULL = "Giỏ đặt sân chỉ chứa tối đa {max_items} khung giờ."
+ERR_CART_DUPLICATE = "Khung giờ này đã có trong giỏ."
+ERR_CART_SLOT_INVALID = "Có khung giờ trong giỏ không còn tồn tại."
+ERR_CART_SLOT_CLOSED = "Khung giờ {time_slot_name} của {pitch_name} hiện không nhận đặt."
+ERR_CART_SLOT_TAKEN = "Khung giờ {time_slot_name} của {pitch_name} ngày {booking_date} đã được đặt."
+ERR_CART_DATE_PAST = "Không thể đặt {time_slot_name} của {pitch_name} vào ngày {booking_date} trong quá khứ."
+
+ERR_SERIES_NO_FREE_DATES = "Tất cả các buổi trong lịch định kỳ đều đã có người đặt."
+ERR_SERIES_ALREADY_CANCELLED = "Lịch định kỳ này đã bị hủy."
 
 ERR_VOUCHER_INVALID = "Mã giảm giá không hợp lệ hoặc đã hết hạn."
 ERR_VOUCHER_NOT_FOUND = "Mã giảm giá không tồn tại."
+ERR_VOUCHER_ALREADY_USED = "Bạn đã sử dụng voucher này trước đó. Mỗi người chỉ dùng 1 lần."
+ERR_VOUCHER_EXHAUSTED = "Mã giảm giá vừa hết lượt sử dụng, vui lòng thử lại."
 
 ERR_REVIEW_ONLY_AFTER_BOOKING = "Bạn chỉ có thể đánh giá sân đã đặt."
 ERR_REVIEW_ALREADY_EXISTS = "Bạn đã đánh giá sân này rồi."
+ERR_REVIEW_NOT_FOUND = "Bạn chưa đánh giá sân này."
 
 
 INFO_SELECT_DATE_FIRST = "Vui lòng chọn ngày để xem khung giờ có sẵn."
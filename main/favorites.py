@@ -0,0 +1,56 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Favorite, Pitch
+
+
+def add_favorite(user, pitch_id):
+    """
+    Thêm sân vào yêu thích (idempotent).
+
+    1 câu INSERT ... ON CONFLICT DO NOTHING trên unique (user, pitch): bấm
+    2 lần liên tiếp không tạo lỗi và chỉ lần chèn thật mới tăng
+    favorite_count. Chèn qua SELECT từ bảng sân nên pitch_id không tồn
+    tại thì không chèn gì. Trả về True nếu vừa thêm.
+    """
+    table = Favorite._meta.db_table
+    pitch_table = Pitch._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, pitch_id, created_at) "
+                f"SELECT %s, id, %s FROM {pitch_table} WHERE id = %s "
+                "ON CONFLICT (user_id, pitch_id) DO NOTHING",
+                [user.id, timezone.now(), pitch_id])
+            inserted = cursor.rowcount == 1
+        if inserted:
+            Pitch.apply_favorite_change(pitch_id, 1)
+    return inserted
+
+
+def remove_favorite(user, pitch_id):
+    """
+    Bỏ sân khỏi yêu thích (idempotent), 1 câu DELETE; favorite_count được
+    trừ trong signal post_delete của Favorite.
+    Trả về True nếu vừa xoá.
+    """
+    deleted, _ = Favorite.objects.filter(user=user, pitch_id=pitch_id).delete()
+    return bool(deleted)
+
+
+def toggle_favorite(user, pitch_id):
+    """Đảo trạng thái yêu thích, trả về trạng thái mới"""
+    if add_favorite(user, pitch_id):
+        return True
+    remove_favorite(user, pitch_id)
+    return False
+
+
+def get_favorited_pitch_ids(user, pitch_ids):
+    """Tập id trong pitch_ids mà user đã yêu thích (1 query)"""
+    if not user.is_authenticated or not pitch_ids:
+        return set()
+    return set(
+        Favorite.objects.filter(user=user, pitch_id__in=pitch_ids)
+        .values_list('pitch_id', flat=True)
+    )
@@ -282,6 +282,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 from .models import Booking, Pitch, PitchTimeSlot, User, Review
+from .constants import MAX_SERIES_WEEKS
 from datetime import date
 import re
 
@@ -558,3 +559,50 @@ class VoucherForm(forms.ModelForm):
         if percent is not None and (percent < 0 or percent > 100):
             raise ValidationError("Phần trăm giảm phải trong khoảng 0-100.")
         return percent
+
+
+class BookingSeriesForm(forms.Form):
+    time_slot = forms.ChoiceField(
+        required=True,
+        label="Khung giờ",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    start_date = forms.DateField(
+        required=True,
+        label="Ngày bắt đầu",
+        widget=forms.DateInput(attrs={
+            'type': 'date',
+            'class': 'form-control',
+        })
+    )
+
+    weeks = forms.IntegerField(
+        required=True,
+        label="Số tuần",
+        min_value=1,
+        max_value=MAX_SERIES_WEEKS,
+        initial=4,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    note = forms.CharField(
+        required=False,
+        label="Ghi chú",
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 2,
+            'placeholder': 'Nhập ghi chú của bạn...'
+        })
+    )
+
+    def __init__(self, *args, **kwargs):
+        time_slot_choices = kwargs.pop('time_slot_choices', [])
+        super().__init__(*args, **kwargs)
+        self.fields['time_slot'].choices = time_slot_choices
+
+    def clean_start_date(self):
+        start_date = self.cleaned_data.get('start_date')
+        if start_date and start_date < date.today():
+            raise forms.ValidationError("Không thể đặt sân trong quá khứ.")
+        return start_date
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main.availability import STAT_HITS, STAT_MISSES, get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Hiển thị số lần hit/miss của cache tình trạng trống."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Đặt lại bộ đếm sau khi hiển thị.",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        hits, misses = stats[STAT_HITS], stats[STAT_MISSES]
+        total = hits + misses
+        ratio = hits / total * 100 if total else 0
+
+        self.stdout.write(f"Hits  : {hits}")
+        self.stdout.write(f"Misses: {misses}")
+        self.stdout.write(self.style.SUCCESS(f"Hit ratio: {ratio:.1f}%"))
+
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.NOTICE("Đã đặt lại bộ đếm."))
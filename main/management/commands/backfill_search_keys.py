@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Facility, Pitch
+from main.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Tính lại search_key (không dấu) của sân, cơ sở và dựng lại index tìm kiếm."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Số dòng mỗi lần bulk_update (mặc định 500)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            facilities = list(Facility.objects.only("id", "name", "address"))
+            for facility in facilities:
+                facility.search_key = facility.build_search_key()
+            Facility.objects.bulk_update(
+                facilities, ["search_key"], batch_size=batch_size)
+
+            pitches = list(Pitch.objects.only("id", "name"))
+            for pitch in pitches:
+                pitch.search_key = pitch.build_search_key()
+            Pitch.objects.bulk_update(
+                pitches, ["search_key"], batch_size=batch_size)
+
+            rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã cập nhật search_key cho {len(facilities)} cơ sở, "
+            f"{len(pitches)} sân."
+        ))
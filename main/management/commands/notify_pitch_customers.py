@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Pitch
+from main.notifications import notify_pitch_customers
+
+
+class Command(BaseCommand):
+    help = "Gửi thông báo (bảo trì, khuyến mãi...) tới mọi khách sắp đá tại 1 sân."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pitch_id", type=int, help="Id của sân")
+        parser.add_argument("message", help="Nội dung thông báo")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Số luồng gửi song song",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            pitch = Pitch.objects.get(pk=options["pitch_id"])
+        except Pitch.DoesNotExist:
+            raise CommandError(f"Không tìm thấy sân #{options['pitch_id']}.")
+
+        results = notify_pitch_customers(
+            pitch, options["message"], max_workers=options["workers"])
+
+        failed = {email: error for email, error in results.items() if error}
+        for email, error in failed.items():
+            self.stderr.write(f"{email}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã gửi {len(results) - len(failed)}/{len(results)} thông báo."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Dựng lại index tìm kiếm toàn văn của sân và cơ sở."
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stdout.write(
+                f"Database {connection.vendor} dùng index trên chính bảng, không cần dựng lại."
+            )
+            return
+
+        with transaction.atomic():
+            rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS("Đã dựng lại index tìm kiếm."))
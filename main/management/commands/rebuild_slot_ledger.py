@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.availability import invalidate_availability
+from main.models import Booking, DailySlotLedger
+
+
+class Command(BaseCommand):
+    help = "Dựng lại sổ cái khung giờ (DailySlotLedger) từ bảng Booking."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-date",
+            help="Chỉ dựng lại từ ngày này trở đi (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        ledgers = DailySlotLedger.objects.all()
+
+        if options["from_date"]:
+            try:
+                from_date = datetime.strptime(options["from_date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--from-date phải có định dạng YYYY-MM-DD.")
+            bookings = bookings.filter(booking_date__gte=from_date)
+            ledgers = ledgers.filter(booking_date__gte=from_date)
+
+        with transaction.atomic():
+            keys = set(ledgers.values_list("pitch_id", "booking_date"))
+            deleted, _ = ledgers.delete()
+            rows = DailySlotLedger.build_rows(bookings)
+            DailySlotLedger.objects.bulk_create(rows, batch_size=500)
+
+        keys.update((row.pitch_id, row.booking_date) for row in rows)
+        invalidate_availability(keys)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã dựng lại sổ cái: xoá {deleted} dòng cũ, tạo {len(rows)} dòng mới."
+            )
+        )
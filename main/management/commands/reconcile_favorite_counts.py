@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Pitch
+
+
+class Command(BaseCommand):
+    help = "Tính lại favorite_count của sân từ bảng Favorite."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pitch",
+            type=int,
+            action="append",
+            dest="pitch_ids",
+            help="Chỉ tính lại cho sân có id này (có thể lặp lại)",
+        )
+
+    def handle(self, *args, **options):
+        pitches = Pitch.objects.all()
+        if options["pitch_ids"]:
+            pitches = pitches.filter(id__in=options["pitch_ids"])
+
+        with transaction.atomic():
+            updated = Pitch.reconcile_favorite_counts(pitches)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tính lại lượt yêu thích cho {updated} sân."
+        ))
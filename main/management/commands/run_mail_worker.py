@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import constants
+from main.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = "Gửi email trong hàng đợi (EmailOutbox) theo lô qua 1 kết nối SMTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=constants.EMAIL_OUTBOX_BATCH_SIZE,
+            help=f"Số email mỗi lô (mặc định {constants.EMAIL_OUTBOX_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=constants.EMAIL_WORKER_IDLE_SECONDS,
+            help="Số giây chờ khi hàng đợi trống",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Gửi hết các email đang đến hạn rồi thoát",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = deliver_batch(options["batch_size"])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Đã gửi {sent}, lỗi {failed}.")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tổng cộng đã gửi {total_sent} email, {total_failed} lần lỗi."
+        ))
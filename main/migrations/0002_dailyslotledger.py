@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_ledger(apps, schema_editor):
+    Booking = apps.get_model('main', 'Booking')
+    DailySlotLedger = apps.get_model('main', 'DailySlotLedger')
+
+    occupied = {}
+    for pitch_id, booking_date, slot_id in Booking.objects.filter(
+        status__in=['Pending', 'Confirmed'],
+        time_slot__isnull=False,
+    ).values_list('pitch_id', 'booking_date', 'time_slot_id'):
+        occupied.setdefault((pitch_id, booking_date), set()).add(slot_id)
+
+    DailySlotLedger.objects.bulk_create(
+        [
+            DailySlotLedger(
+                pitch_id=pitch_id,
+                booking_date=booking_date,
+                occupied_slot_ids=sorted(slot_ids),
+                occupied_count=len(slot_ids),
+            )
+            for (pitch_id, booking_date), slot_ids in occupied.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySlotLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking_date', models.DateField()),
+                ('occupied_slot_ids', models.JSONField(default=list)),
+                ('occupied_count', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pitch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_ledgers', to='main.pitch')),
+            ],
+            options={
+                'unique_together': {('pitch', 'booking_date')},
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """
+    Dữ liệu cũ có thể đã bị đặt trùng khung giờ: giữ booking đặt sớm nhất
+    của mỗi (khung giờ, ngày), hủy các booking còn lại để thêm được ràng buộc
+    """
+    Booking = apps.get_model('main', 'Booking')
+    active = Booking.objects.filter(
+        status__in=['Pending', 'Confirmed'], time_slot__isnull=False)
+
+    duplicates = (
+        active.order_by()
+        .values('time_slot_id', 'booking_date')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    cancelled_ids = []
+    for group in duplicates:
+        booking_ids = list(
+            active.filter(
+                time_slot_id=group['time_slot_id'],
+                booking_date=group['booking_date'])
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True))
+        cancelled_ids.extend(booking_ids[1:])
+
+    if cancelled_ids:
+        Booking.objects.filter(pk__in=cancelled_ids).update(status='Cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_dailyslotledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Pending', 'Confirmed'])), fields=('time_slot', 'booking_date'), name='unique_active_booking_per_slot'),
+        ),
+    ]
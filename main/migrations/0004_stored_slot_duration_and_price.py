@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:31
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def populate_duration_and_price(apps, schema_editor):
+    TimeSlot = apps.get_model('main', 'TimeSlot')
+    PitchTimeSlot = apps.get_model('main', 'PitchTimeSlot')
+
+    time_slots = list(TimeSlot.objects.all())
+    for time_slot in time_slots:
+        start = datetime.combine(date.today(), time_slot.start_time)
+        end = datetime.combine(date.today(), time_slot.end_time)
+        time_slot.duration_minutes = int((end - start).total_seconds() // 60)
+    TimeSlot.objects.bulk_update(
+        time_slots, ['duration_minutes'], batch_size=500)
+
+    slots = list(PitchTimeSlot.objects.select_related('pitch', 'time_slot'))
+    for slot in slots:
+        hours = (Decimal(slot.time_slot.duration_minutes) / 60).quantize(
+            Decimal('0.01'))
+        slot.price = (slot.pitch.base_price_per_hour * hours).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP)
+    PitchTimeSlot.objects.bulk_update(slots, ['price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_booking_unique_active_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pitchtimeslot',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='timeslot',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_duration_and_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_stored_slot_duration_and_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('weeks', models.PositiveSmallIntegerField()),
+                ('note', models.TextField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pitch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to='main.pitch')),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to='main.pitchtimeslot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='main.bookingseries'),
+        ),
+    ]
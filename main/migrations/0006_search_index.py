@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+SQLITE_CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS main_pitch_search USING fts5(
+        name, facility_name, facility_address,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS main_facility_search USING fts5(
+        name, address,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO main_pitch_search (rowid, name, facility_name, facility_address)
+    SELECT p.id, p.name, COALESCE(f.name, ''), COALESCE(f.address, '')
+    FROM main_pitch p LEFT JOIN main_facility f ON f.id = p.facility_id
+    """,
+    """
+    INSERT INTO main_facility_search (rowid, name, address)
+    SELECT id, name, address FROM main_facility
+    """,
+]
+SQLITE_DROP_SQL = [
+    "DROP TABLE IF EXISTS main_pitch_search",
+    "DROP TABLE IF EXISTS main_facility_search",
+]
+
+POSTGRES_CREATE_SQL = [
+    "CREATE INDEX IF NOT EXISTS main_pitch_name_tsv ON main_pitch "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(name, '')))",
+    "CREATE INDEX IF NOT EXISTS main_facility_name_tsv ON main_facility "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(name, '')))",
+    "CREATE INDEX IF NOT EXISTS main_facility_address_tsv ON main_facility "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(address, '')))",
+]
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS main_pitch_name_tsv",
+    "DROP INDEX IF EXISTS main_facility_name_tsv",
+    "DROP INDEX IF EXISTS main_facility_address_tsv",
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    _run(schema_editor, {
+        'sqlite': SQLITE_CREATE_SQL,
+        'postgresql': POSTGRES_CREATE_SQL,
+    })
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {
+        'sqlite': SQLITE_DROP_SQL,
+        'postgresql': POSTGRES_DROP_SQL,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_bookingseries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
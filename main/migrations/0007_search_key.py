@@ -0,0 +1,142 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:45
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize(text):
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(
+        ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.lower().split())
+
+
+def populate_search_keys(apps, schema_editor):
+    Pitch = apps.get_model('main', 'Pitch')
+    Facility = apps.get_model('main', 'Facility')
+
+    facilities = list(Facility.objects.all())
+    for facility in facilities:
+        facility.search_key = _normalize(f"{facility.name} {facility.address}")
+    Facility.objects.bulk_update(facilities, ['search_key'], batch_size=500)
+
+    pitches = list(Pitch.objects.all())
+    for pitch in pitches:
+        pitch.search_key = _normalize(pitch.name)
+    Pitch.objects.bulk_update(pitches, ['search_key'], batch_size=500)
+
+
+# Dựng lại bảng FTS5 trên cột search_key (thay cho cột name/address có dấu)
+SQLITE_CREATE_SQL = [
+    "DROP TABLE IF EXISTS main_pitch_search",
+    "DROP TABLE IF EXISTS main_facility_search",
+    """
+    CREATE VIRTUAL TABLE main_pitch_search USING fts5(
+        search_key, facility_key,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE main_facility_search USING fts5(
+        search_key,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO main_pitch_search (rowid, search_key, facility_key)
+    SELECT p.id, p.search_key, COALESCE(f.search_key, '')
+    FROM main_pitch p LEFT JOIN main_facility f ON f.id = p.facility_id
+    """,
+    """
+    INSERT INTO main_facility_search (rowid, search_key)
+    SELECT id, search_key FROM main_facility
+    """,
+]
+SQLITE_REVERSE_SQL = [
+    "DROP TABLE IF EXISTS main_pitch_search",
+    "DROP TABLE IF EXISTS main_facility_search",
+    """
+    CREATE VIRTUAL TABLE main_pitch_search USING fts5(
+        name, facility_name, facility_address,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE main_facility_search USING fts5(
+        name, address,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO main_pitch_search (rowid, name, facility_name, facility_address)
+    SELECT p.id, p.name, COALESCE(f.name, ''), COALESCE(f.address, '')
+    FROM main_pitch p LEFT JOIN main_facility f ON f.id = p.facility_id
+    """,
+    """
+    INSERT INTO main_facility_search (rowid, name, address)
+    SELECT id, name, address FROM main_facility
+    """,
+]
+
+POSTGRES_CREATE_SQL = [
+    "DROP INDEX IF EXISTS main_pitch_name_tsv",
+    "DROP INDEX IF EXISTS main_facility_name_tsv",
+    "DROP INDEX IF EXISTS main_facility_address_tsv",
+    "CREATE INDEX IF NOT EXISTS main_pitch_search_key_tsv ON main_pitch "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(search_key, '')))",
+    "CREATE INDEX IF NOT EXISTS main_facility_search_key_tsv ON main_facility "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(search_key, '')))",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS main_pitch_search_key_tsv",
+    "DROP INDEX IF EXISTS main_facility_search_key_tsv",
+    "CREATE INDEX IF NOT EXISTS main_pitch_name_tsv ON main_pitch "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(name, '')))",
+    "CREATE INDEX IF NOT EXISTS main_facility_name_tsv ON main_facility "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(name, '')))",
+    "CREATE INDEX IF NOT EXISTS main_facility_address_tsv ON main_facility "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(address, '')))",
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def rebuild_search_index(apps, schema_editor):
+    _run(schema_editor, {
+        'sqlite': SQLITE_CREATE_SQL,
+        'postgresql': POSTGRES_CREATE_SQL,
+    })
+
+
+def restore_search_index(apps, schema_editor):
+    _run(schema_editor, {
+        'sqlite': SQLITE_REVERSE_SQL,
+        'postgresql': POSTGRES_REVERSE_SQL,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facility',
+            name='search_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='search_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=512),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_search_index, restore_search_index),
+    ]
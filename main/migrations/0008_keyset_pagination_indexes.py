@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_search_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-created_at', 'id'], name='booking_created_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-booking_date', '-created_at', 'id'], name='booking_user_date_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='pitch',
+            index=models.Index(fields=['name', 'id'], name='pitch_name_keyset'),
+        ),
+    ]
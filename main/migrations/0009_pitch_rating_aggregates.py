@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:53
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_ratings(apps, schema_editor):
+    Pitch = apps.get_model('main', 'Pitch')
+    Review = apps.get_model('main', 'Review')
+
+    reviews = Review.objects.filter(
+        pitch=OuterRef('pk')).order_by().values('pitch')
+    Pitch.objects.update(
+        rating_count=Coalesce(
+            Subquery(reviews.annotate(total=Count('pk')).values('total')), 0),
+        rating_avg=Coalesce(
+            Subquery(
+                reviews.annotate(avg=Avg('rating')).values('avg'),
+                output_field=models.FloatField()),
+            Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='pitch',
+            index=models.Index(fields=['-rating_avg', '-rating_count', 'id'], name='pitch_rating_keyset'),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_pitch_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['pitch', '-created_at', '-id'], name='review_pitch_feed_keyset'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:01
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Comment = apps.get_model('main', 'Comment')
+
+    pending = list(Comment.objects.order_by('id'))
+    done = {}
+    # Cha thường có id nhỏ hơn con; lặp lại cho các trường hợp ngược lại
+    while pending:
+        remaining = []
+        for comment in pending:
+            parent_id = comment.parent_comment_id
+            if parent_id is not None and parent_id not in done:
+                remaining.append(comment)
+                continue
+            parent = done.get(parent_id)
+            comment.path = (parent.path if parent else '') + f"{comment.id:08d}/"
+            comment.depth = parent.depth + 1 if parent else 0
+            done[comment.id] = comment
+        if len(remaining) == len(pending):
+            break
+        pending = remaining
+    Comment.objects.bulk_update(
+        list(done.values()), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_review_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['review', 'path'], name='main_commen_review__f66864_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_favorite_counts(apps, schema_editor):
+    Pitch = apps.get_model('main', 'Pitch')
+    Favorite = apps.get_model('main', 'Favorite')
+
+    Pitch.objects.update(
+        favorite_count=Coalesce(
+            Subquery(
+                Favorite.objects.filter(pitch=OuterRef('pk'))
+                .order_by().values('pitch')
+                .annotate(total=Count('pk')).values('total')),
+            0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_comment_materialized_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pitch',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_favorite_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pitch',
+            index=models.Index(fields=['-favorite_count', 'id'], name='pitch_popular_keyset'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_redemptions(apps, schema_editor):
+    """Mỗi cặp (user, voucher) có booking chưa bị từ chối là 1 lượt đã dùng"""
+    Booking = apps.get_model('main', 'Booking')
+    VoucherRedemption = apps.get_model('main', 'VoucherRedemption')
+
+    pairs = (
+        Booking.objects.filter(voucher__isnull=False)
+        .exclude(status='Rejected')
+        .order_by()
+        .values('user_id', 'voucher_id')
+        .distinct()
+    )
+    VoucherRedemption.objects.bulk_create(
+        [
+            VoucherRedemption(
+                user_id=pair['user_id'], voucher_id=pair['voucher_id'])
+            for pair in pairs
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_pitch_favorite_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoucherRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='voucher_redemptions', to=settings.AUTH_USER_MODEL)),
+                ('voucher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='main.voucher')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'voucher'), name='unique_voucher_redemption')],
+            },
+        ),
+        migrations.RunPython(populate_redemptions, migrations.RunPython.noop),
+    ]
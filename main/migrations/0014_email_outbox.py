@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_voucher_redemption'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('html_body', models.TextField(blank=True)),
+                ('from_email', models.CharField(blank=True, max_length=254)),
+                ('to', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('Pending', 'Chờ gửi'), ('Sent', 'Đã gửi'), ('Dead', 'Gửi thất bại')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at', 'id'], name='email_outbox_due')],
+            },
+        ),
+    ]
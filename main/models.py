@@ -1,9 +1,15 @@
+from collections import Counter
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from datetime import datetime, date
+from django.utils import timezone
+from datetime import datetime, date, timedelta
+
+from . import constants
+from .utils import normalize_search_text
 
 # ===== User & Roles =====
 
@@ -21,6 +27,46 @@ class BookingStatus(models.TextChoices):
     CANCELLED = "Cancelled", "Người dùng hủy"
 
 
+class EmailStatus(models.TextChoices):
+    PENDING = "Pending", "Chờ gửi"
+    SENT = "Sent", "Đã gửi"
+    DEAD = "Dead", "Gửi thất bại"
+
+
+# Các trạng thái booking đang chiếm khung giờ
+ACTIVE_BOOKING_STATUSES = [BookingStatus.PENDING, BookingStatus.CONFIRMED]
+
+# Tên ràng buộc UNIQUE chống đặt trùng khung giờ
+SLOT_CONFLICT_CONSTRAINT = "unique_active_booking_per_slot"
+# SQLite không báo tên ràng buộc, chỉ báo các cột của unique index
+SQLITE_SLOT_CONFLICT_MESSAGE = (
+    "UNIQUE constraint failed: "
+    "main_booking.time_slot_id, main_booking.booking_date"
+)
+
+
+def is_slot_conflict(exc):
+    """
+    IntegrityError có phải do vi phạm ràng buộc trùng khung giờ không.
+
+    PostgreSQL: so tên ràng buộc trong diag của driver. SQLite chỉ báo cột
+    nên phải khớp đúng mã lỗi UNIQUE và đúng cặp (time_slot_id,
+    booking_date); nếu sau này thêm unique index khác trên đúng 2 cột này
+    thì SQLite sẽ không phân biệt được. Backend khác: tìm tên ràng buộc
+    trong thông báo lỗi.
+    """
+    cause = exc.__cause__
+    diag = getattr(cause, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name == SLOT_CONFLICT_CONSTRAINT
+    if connection.vendor == 'sqlite':
+        return (
+            getattr(cause, 'sqlite_errorname', None) == 'SQLITE_CONSTRAINT_UNIQUE'
+            and str(exc) == SQLITE_SLOT_CONFLICT_MESSAGE
+        )
+    return SLOT_CONFLICT_CONSTRAINT in str(exc)
+
+
 class User(AbstractUser):
     full_name = models.CharField(max_length=255, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
@@ -45,12 +91,25 @@ class Facility(models.Model):
     name = models.CharField(max_length=255)
     address = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
+    # Tên + địa chỉ đã bỏ dấu, viết thường (dùng cho tìm kiếm)
+    search_key = models.CharField(
+        max_length=512, blank=True, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def build_search_key(self):
+        return normalize_search_text(f"{self.name} {self.address}")
+
+    def save(self, *args, **kwargs):
+        self.search_key = self.build_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_key'}
+        super().save(*args, **kwargs)
+
 
 class PitchType(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -65,6 +124,8 @@ class TimeSlot(models.Model):
     name = models.CharField(max_length=50)  # "7h-9h"
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Lưu sẵn thời lượng, tính lại mỗi khi lưu khung giờ
+    duration_minutes = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -79,12 +140,23 @@ class TimeSlot(models.Model):
         if self.start_time >= self.end_time:
             raise ValidationError("Giờ bắt đầu phải trước giờ kết thúc")
 
-    def duration_hours(self):
+    def compute_duration_minutes(self):
         start = datetime.combine(date.today(), self.start_time)
         end = datetime.combine(date.today(), self.end_time)
-        duration_float = (end - start).total_seconds() / 3600
+        return int((end - start).total_seconds() // 60)
 
-        return Decimal(duration_float).quantize(Decimal('0.01'))
+    def duration_hours(self):
+        return (Decimal(self.duration_minutes) / 60).quantize(Decimal('0.01'))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        old_minutes = self.duration_minutes
+        self.duration_minutes = self.compute_duration_minutes()
+        super().save(*args, **kwargs)
+        if not adding and old_minutes != self.duration_minutes:
+            # Thời lượng đổi thì giá lưu sẵn của các sân dùng khung giờ này
+            # cũng phải tính lại
+            PitchTimeSlot.sync_prices(self.pitch_slots.all())
 
 
 class Pitch(models.Model):
@@ -102,19 +174,144 @@ class Pitch(models.Model):
     base_price_per_hour = models.DecimalField(max_digits=10, decimal_places=2)
     images = models.JSONField(blank=True, null=True)
     is_available = models.BooleanField(default=True)
+    # Tên sân đã bỏ dấu, viết thường (dùng cho tìm kiếm)
+    search_key = models.CharField(
+        max_length=512, blank=True, db_index=True, editable=False)
+    # Điểm đánh giá trung bình / số đánh giá, cập nhật bằng F() khi
+    # Review thay đổi (xem apply_rating_change)
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    # Số người yêu thích, cập nhật bằng F() trong main/favorites.py
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Chỉ ghi bằng UPDATE ... F(), không ghi đè từ instance đã load
+    COUNTER_FIELDS = frozenset({'rating_avg', 'rating_count', 'favorite_count'})
+
+    class Meta:
+        indexes = [
+            # Phân trang theo cursor của danh sách sân
+            models.Index(fields=['name', 'id'], name='pitch_name_keyset'),
+            models.Index(
+                fields=['-rating_avg', '-rating_count', 'id'],
+                name='pitch_rating_keyset'),
+            models.Index(
+                fields=['-favorite_count', 'id'],
+                name='pitch_popular_keyset'),
+        ]
+
     def __str__(self):
         facility_name = self.facility.name if self.facility else "No Facility"
         return f"{self.name} - {facility_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giữ giá lúc load để biết khi nào cần tính lại giá các khung giờ
+        instance._loaded_base_price = instance.__dict__.get(
+            'base_price_per_hour')
+        return instance
+
+    def build_search_key(self):
+        return normalize_search_text(self.name)
+
+    def save(self, *args, **kwargs):
+        self.search_key = self.build_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_key'}
+        elif not self._state.adding:
+            # Không ghi đè điểm đánh giá / lượt yêu thích bằng giá trị cũ
+            # trên instance khi có thay đổi trong lúc đang sửa sân
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        loaded_price = getattr(self, '_loaded_base_price', None)
+        if loaded_price is not None and \
+                loaded_price != self.base_price_per_hour:
+            PitchTimeSlot.sync_prices(
+                self.time_slots.select_related('time_slot'), pitch=self)
+        self._loaded_base_price = self.base_price_per_hour
+
+    @classmethod
+    def apply_rating_change(cls, pitch_id, added=None, removed=None):
+        """
+        Cập nhật rating_avg/rating_count của sân bằng 1 UPDATE với F().
+
+        `added`: điểm của review mới (hoặc điểm mới khi sửa),
+        `removed`: điểm của review bị xoá (hoặc điểm cũ khi sửa).
+        Các vế phải của UPDATE đều đọc giá trị cũ của dòng nên tính được
+        trung bình mới từ tổng = avg * count.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        new_sum = (
+            models.F('rating_avg') * models.F('rating_count') +
+            (added or 0) - (removed or 0)
+        )
+        new_count = models.F('rating_count') + count_delta
+        cls.objects.filter(pk=pitch_id).update(
+            rating_count=new_count,
+            rating_avg=models.Case(
+                models.When(
+                    rating_count__lte=-count_delta,
+                    then=models.Value(0.0)),
+                default=models.ExpressionWrapper(
+                    new_sum * 1.0 / new_count,
+                    output_field=models.FloatField()),
+                output_field=models.FloatField(),
+            ),
+        )
+
+    @classmethod
+    def reconcile_ratings(cls, queryset=None):
+        """Tính lại rating_avg/rating_count từ bảng Review bằng 1 UPDATE"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        reviews = Review.objects.filter(
+            pitch=models.OuterRef('pk')).order_by().values('pitch')
+        return queryset.update(
+            rating_count=Coalesce(
+                models.Subquery(
+                    reviews.annotate(total=models.Count('pk')).values('total')),
+                0),
+            rating_avg=Coalesce(
+                models.Subquery(
+                    reviews.annotate(avg=models.Avg('rating')).values('avg'),
+                    output_field=models.FloatField()),
+                models.Value(0.0)),
+        )
+
+    @classmethod
+    def apply_favorite_change(cls, pitch_id, delta):
+        """
+        Cộng/trừ favorite_count của sân bằng 1 UPDATE với F(). Trừ thì
+        không xuống dưới 0 (dòng đã lệch sẽ được reconcile sửa).
+        """
+        pitches = cls.objects.filter(pk=pitch_id)
+        if delta < 0:
+            pitches = pitches.filter(favorite_count__gte=-delta)
+        pitches.update(favorite_count=models.F('favorite_count') + delta)
+
+    @classmethod
+    def reconcile_favorite_counts(cls, queryset=None):
+        """Tính lại favorite_count từ bảng Favorite bằng 1 UPDATE"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(
+            favorite_count=Coalesce(
+                models.Subquery(
+                    Favorite.objects.filter(pitch=models.OuterRef('pk'))
+                    .order_by().values('pitch')
+                    .annotate(total=models.Count('pk')).values('total')),
+                0),
+        )
+
     def get_available_time_slots(self, booking_date):
         """Chỉ trả về các slot còn trống"""
-        available_slots = []
-        for slot in self.time_slots.filter(is_available=True):
-            if slot.is_available_on_date(booking_date):
-                available_slots.append(slot)
+        from .availability import get_free_pitch_slots
+        available_slots = get_free_pitch_slots(self, booking_date)
         # Cập nhật luôn is_available theo ngày
         self.is_available = len(available_slots) > 0
         return available_slots
@@ -133,6 +330,9 @@ class PitchTimeSlot(models.Model):
         on_delete=models.CASCADE,
         related_name='pitch_slots')
     is_available = models.BooleanField(default=True)
+    # Giá lưu sẵn = giá/giờ của sân × thời lượng khung giờ
+    price = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -142,9 +342,30 @@ class PitchTimeSlot(models.Model):
     def __str__(self):
         return f"{self.pitch.name} - {self.time_slot.name}"
 
-    def get_price(self):
+    def compute_price(self, pitch=None):
         """Tính giá tiền cho PitchTimeSlot này"""
-        return self.pitch.base_price_per_hour * self.time_slot.duration_hours()
+        pitch = pitch or self.pitch
+        return (
+            pitch.base_price_per_hour * self.time_slot.duration_hours()
+        ).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def get_price(self):
+        """Giá tiền đã lưu sẵn của PitchTimeSlot này"""
+        return self.price
+
+    def save(self, *args, **kwargs):
+        self.price = self.compute_price()
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def sync_prices(cls, slots, pitch=None):
+        """Tính lại và ghi giá lưu sẵn cho các khung giờ bằng 1 bulk_update"""
+        if pitch is None:
+            slots = slots.select_related('pitch', 'time_slot')
+        slots = list(slots)
+        for slot in slots:
+            slot.price = slot.compute_price(pitch)
+        cls.objects.bulk_update(slots, ['price'])
 
     def is_available_on_date(self, booking_date, exclude_booking_id=None):
         """Kiểm tra khung giờ này có còn trống vào ngày booking_date không"""
@@ -182,10 +403,24 @@ class Voucher(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Chỉ ghi bằng UPDATE ... F() trong redeem/release
+    COUNTER_FIELDS = frozenset({'used_count'})
+
     def clean(self):
         if self.start_date and self.end_date and self.start_date > self.end_date:
             raise ValidationError("Ngày bắt đầu phải trước ngày kết thúc.")
 
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None and not self._state.adding:
+            # Sửa voucher (form, admin) không ghi đè lượt dùng bằng giá trị
+            # cũ trên instance khi có booking dùng voucher trong lúc đang sửa
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def is_valid(self):
         today = date.today()
         if not self.is_active:
@@ -198,9 +433,134 @@ class Voucher(models.Model):
             return False
         return True
 
+    @classmethod
+    def redeemable_q(cls):
+        """Điều kiện is_valid() viết thành Q để kiểm tra ngay trong UPDATE"""
+        today = date.today()
+        return (
+            models.Q(is_active=True)
+            & (models.Q(usage_limit__isnull=True) | models.Q(usage_limit=0)
+               | models.Q(used_count__lt=models.F('usage_limit')))
+            & (models.Q(start_date__isnull=True) | models.Q(start_date__lte=today))
+            & (models.Q(end_date__isnull=True) | models.Q(end_date__gte=today))
+        )
+
+    @classmethod
+    def redeem(cls, voucher_id):
+        """
+        Dùng 1 lượt voucher.
+
+        1 câu UPDATE ... SET used_count = used_count + 1 có điều kiện
+        used_count < usage_limit: các request đồng thời không thể vượt giới
+        hạn vì database tự khoá dòng khi ghi. Trả về False nếu voucher đã
+        hết lượt/hết hạn (không có dòng nào được cập nhật).
+        """
+        return cls.objects.filter(cls.redeemable_q(), pk=voucher_id).update(
+            used_count=models.F('used_count') + 1) == 1
+
+    @classmethod
+    def release(cls, voucher_id):
+        """Trả lại 1 lượt voucher (khi booking bị hủy/từ chối)"""
+        return cls.objects.filter(pk=voucher_id, used_count__gt=0).update(
+            used_count=models.F('used_count') - 1) == 1
+
     def __str__(self):
         return self.code
 
+
+class VoucherRedemption(models.Model):
+    """
+    Lượt dùng voucher của 1 user (mỗi user chỉ dùng 1 lần mỗi voucher).
+
+    Ràng buộc UNIQUE (user, voucher) vừa là index để kiểm tra "đã dùng
+    chưa" bằng 1 lần tra khoá, vừa chặn 2 request đồng thời cùng dùng.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="voucher_redemptions")
+    voucher = models.ForeignKey(
+        Voucher,
+        on_delete=models.CASCADE,
+        related_name="redemptions")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'voucher'], name='unique_voucher_redemption'),
+        ]
+
+    @classmethod
+    def has_redeemed(cls, user, voucher):
+        if not user.is_authenticated:
+            return False
+        return cls.objects.filter(user=user, voucher=voucher).exists()
+
+    @classmethod
+    def redeem(cls, user_id, voucher_id):
+        """
+        Ghi lượt dùng của user và tăng used_count trong cùng transaction.
+        Raise ValidationError nếu user đã dùng hoặc voucher hết lượt.
+        """
+        with transaction.atomic(savepoint=False):
+            # ON CONFLICT DO NOTHING thay cho bắt IntegrityError: không cần
+            # savepoint, rowcount = 0 nghĩa là user đã dùng voucher
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {cls._meta.db_table} "
+                    "(user_id, voucher_id, created_at) VALUES (%s, %s, %s) "
+                    "ON CONFLICT (user_id, voucher_id) DO NOTHING",
+                    [user_id, voucher_id, timezone.now()])
+                inserted = cursor.rowcount == 1
+            if not inserted:
+                raise ValidationError(
+                    {'voucher': constants.ERR_VOUCHER_ALREADY_USED})
+            if not Voucher.redeem(voucher_id):
+                raise ValidationError(
+                    {'voucher': constants.ERR_VOUCHER_EXHAUSTED})
+
+    @classmethod
+    def release(cls, user_id, voucher_id, forget=False):
+        """
+        Trả lại lượt voucher. forget=True xoá luôn lượt dùng của user
+        (booking bị từ chối) để user được dùng lại voucher.
+        """
+        Voucher.release(voucher_id)
+        if forget:
+            cls.objects.filter(user_id=user_id, voucher_id=voucher_id).delete()
+
+    @classmethod
+    def release_many(cls, pairs, forget=False):
+        """
+        Như release() cho nhiều cặp (user_id, voucher_id): 1 câu UPDATE
+        trừ used_count của mọi voucher (+ 1 câu DELETE nếu forget=True).
+        """
+        pairs = set(pairs)
+        if not pairs:
+            return
+        per_voucher = Counter(voucher_id for _, voucher_id in pairs)
+        Voucher.objects.filter(pk__in=per_voucher).update(
+            used_count=Greatest(
+                models.F('used_count') - models.Case(
+                    *[
+                        models.When(pk=voucher_id, then=models.Value(count))
+                        for voucher_id, count in per_voucher.items()
+                    ],
+                    output_field=models.IntegerField(),
+                ),
+                0,
+            ))
+        if forget:
+            pair_filter = models.Q()
+            for user_id, voucher_id in pairs:
+                pair_filter |= models.Q(user_id=user_id, voucher_id=voucher_id)
+            cls.objects.filter(pair_filter).delete()
+
+    def __str__(self):
+        return f"{self.user.username} - {self.voucher.code}"
+
 # ===== Booking =====
 
 
@@ -234,6 +594,13 @@ class Booking(models.Model):
         max_length=10,
         choices=BookingStatus.choices,
         default=BookingStatus.PENDING)
+    # Lịch đặt định kỳ sinh ra booking này (nếu có)
+    series = models.ForeignKey(
+        'BookingSeries',
+        on_delete=models.SET_NULL,
+        related_name="bookings",
+        null=True,
+        blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -243,7 +610,33 @@ class Booking(models.Model):
             models.Index(fields=['pitch', 'booking_date', 'status']),
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['pitch', 'booking_date', 'time_slot']),
+            # Phân trang theo cursor của danh sách admin / danh sách của user
+            models.Index(
+                fields=['-created_at', 'id'], name='booking_created_keyset'),
+            models.Index(
+                fields=['user', '-booking_date', '-created_at', 'id'],
+                name='booking_user_date_keyset'),
         ]
+        constraints = [
+            # Mỗi khung giờ chỉ có tối đa 1 booking Pending/Confirmed mỗi ngày
+            models.UniqueConstraint(
+                fields=['time_slot', 'booking_date'],
+                condition=models.Q(status__in=ACTIVE_BOOKING_STATUSES),
+                name=SLOT_CONFLICT_CONSTRAINT,
+            ),
+        ]
+
+    # Các trường quyết định giá của booking
+    PRICING_FIELDS = {'pitch_id', 'time_slot_id', 'voucher_id'}
+    # Các trường quyết định khung giờ bị chiếm trong sổ cái
+    LEDGER_FIELDS = {'pitch_id', 'time_slot_id', 'booking_date', 'status'}
+    # Chỉ đổi các trường này (duyệt, hủy, ghi chú) thì không cần tính giá
+    # hay validate lại
+    STATUS_ONLY_FIELDS = {'status', 'note', 'updated_at'}
+    # FK không cần validate bằng query riêng, database đã có ràng buộc
+    CLEAN_EXCLUDE_FIELDS = ['user', 'pitch', 'time_slot', 'voucher']
+    # Chuyển sang các trạng thái này thì trả lại lượt voucher
+    RELEASED_STATUSES = {BookingStatus.CANCELLED, BookingStatus.REJECTED}
 
     def clean(self):
         errors = {}
@@ -253,51 +646,316 @@ class Booking(models.Model):
             if self.booking_date and self.booking_date < date.today():
                 errors['booking_date'] = "Không thể đặt lịch trong quá khứ."
 
-        if self.pitch and self.time_slot:
+        if self.pitch_id and self.time_slot_id:
             # Kiểm tra xem time_slot có thuộc về pitch không
-            if self.time_slot.pitch != self.pitch:
+            if self.time_slot.pitch_id != self.pitch_id:
                 errors['time_slot'] = "Khung giờ không thuộc về sân này."
 
-            # Kiểm tra xem khung giờ còn trống không
-            # Chỉ kiểm tra nếu booking đang active (Pending/Confirmed)
+            # Việc trùng lịch do ràng buộc UNIQUE trong database đảm nhận
+            # (xem save), ở đây chỉ chặn khung giờ đang bị đóng
             if self.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
-                if not self.time_slot.is_available_on_date(
-                        self.booking_date, exclude_booking_id=self.pk):
-                    errors['time_slot'] = "Khung giờ này đã được đặt."
+                if not self.time_slot.is_available:
+                    errors['time_slot'] = "Khung giờ này hiện không nhận đặt."
 
         if errors:
             raise ValidationError(errors)
 
+    def _snapshot(self):
+        """Giá trị hiện tại của các trường đã load (theo attname)"""
+        return {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def _changed_fields(self):
+        """
+        Các attname đã đổi so với lần load/lưu gần nhất.
+
+        Trả về None khi không có dữ liệu lúc load (coi như đổi toàn bộ).
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        current = self._snapshot()
+        return {
+            name for name, value in loaded.items()
+            if name in current and current[name] != value
+        }
+
+    def _apply_pricing(self):
+        """
+        Tính duration và final_price từ khung giờ đã load sẵn.
+
+        Dùng giá lưu sẵn trên PitchTimeSlot nên không cần load lại sân.
+        """
+        self.duration_hours = self.time_slot.time_slot.duration_hours()
+        base_price = self.time_slot.price
+
+        # Áp dụng voucher nếu có
+        if self.voucher and self.voucher.is_valid():
+            discount_amount = base_price * \
+                Decimal(self.voucher.discount_percent) / Decimal(100)
+            self.final_price = (
+                base_price -
+                discount_amount).quantize(
+                Decimal('0.01'),
+                rounding=ROUND_HALF_UP)
+            return True
+
+        if self._state.adding:
+            # Voucher không hợp lệ thì không giữ lượt, cũng không lưu lên
+            # booking để khi hủy/từ chối không trả lại lượt chưa từng dùng
+            self.voucher = None
+        self.final_price = base_price.quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return False
+
     def save(self, *args, **kwargs):
-        # Tự động tính duration và final_price từ time_slot
-        if self.time_slot:
-            self.duration_hours = self.time_slot.time_slot.duration_hours()
-            base_price = self.time_slot.get_price()
-
-            # Áp dụng voucher nếu có
-            if self.voucher and self.voucher.is_valid():
-                discount_amount = base_price * \
-                    Decimal(self.voucher.discount_percent) / Decimal(100)
-                self.final_price = (
-                    base_price -
-                    discount_amount).quantize(
-                    Decimal('0.01'),
-                    rounding=ROUND_HALF_UP)
-
-                # Tăng used_count của voucher
-                if self.pk is None:  # Chỉ tăng khi tạo mới booking
+        creating = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            touched = {
+                self._meta.get_field(name).attname for name in update_fields
+            }
+        else:
+            touched = None if creating else self._changed_fields()
+
+        redeem_voucher = False
+        release_voucher = self._releases_voucher(touched)
+        if touched is not None and touched <= self.STATUS_ONLY_FIELDS:
+            # Chỉ đổi trạng thái: ghi đúng các cột đã đổi, bỏ qua tính giá
+            # và validate
+            kwargs['update_fields'] = {
+                self._meta.get_field(name).name for name in touched
+            } | {'updated_at'}
+        else:
+            # Tự động tính duration và final_price từ time_slot
+            if self.time_slot_id and (
+                    touched is None or touched & self.PRICING_FIELDS):
+                has_voucher = self._apply_pricing()
+                # Chỉ tăng used_count khi tạo mới booking
+                redeem_voucher = has_voucher and creating
+
+            # Không kiểm tra trùng lịch trước khi ghi: insert thẳng và để
+            # ràng buộc UNIQUE của database từ chối nếu khung giờ đã có
+            # người đặt
+            self.full_clean(
+                exclude=self.CLEAN_EXCLUDE_FIELDS, validate_constraints=False)
+
+        try:
+            with transaction.atomic():
+                if redeem_voucher:
+                    # Giữ lượt voucher trước khi ghi booking; đã dùng hoặc
+                    # hết lượt thì huỷ cả booking thay vì âm thầm tính giá gốc
+                    VoucherRedemption.redeem(self.user_id, self.voucher_id)
                     self.voucher.used_count += 1
-                    self.voucher.save()
-            else:
-                self.final_price = base_price.quantize(
-                    Decimal('0.01'), rounding=ROUND_HALF_UP)
+                super().save(*args, **kwargs)
+                if release_voucher and not self._voucher_still_used():
+                    # Bị từ chối thì user được dùng lại voucher; tự hủy thì
+                    # vẫn tính là đã dùng như trước
+                    VoucherRedemption.release(
+                        self.user_id, self.voucher_id,
+                        forget=self.status == BookingStatus.REJECTED)
+                if touched is None or touched & self.LEDGER_FIELDS:
+                    DailySlotLedger.rebuild_for(self._ledger_keys())
+        except IntegrityError as exc:
+            if not is_slot_conflict(exc):
+                raise
+            raise ValidationError(
+                {'time_slot': "Khung giờ này đã được đặt."}) from exc
+        self._loaded_values = self._snapshot()
+
+    def _releases_voucher(self, touched):
+        """Lần lưu này chuyển booking có voucher từ active sang hủy/từ chối"""
+        if not self.voucher_id or touched is None or 'status' not in touched:
+            return False
+        old_status = getattr(self, '_loaded_values', {}).get('status')
+        return (
+            old_status in ACTIVE_BOOKING_STATUSES
+            and self.status in self.RELEASED_STATUSES
+        )
 
-        self.full_clean()
-        super().save(*args, **kwargs)
+    def _voucher_still_used(self):
+        """
+        Còn booking active khác của user dùng cùng voucher không. Giỏ hàng
+        áp 1 lượt voucher cho nhiều booking nên chỉ trả lượt khi booking
+        cuối cùng bị hủy.
+        """
+        return Booking.objects.filter(
+            user_id=self.user_id,
+            voucher_id=self.voucher_id,
+            status__in=ACTIVE_BOOKING_STATUSES,
+        ).exclude(pk=self.pk).exists()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lưu giá trị lúc load để biết trường nào đổi và (sân, ngày) cũ
+        # khi booking bị sửa
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _ledger_keys(self):
+        """Các cặp (sân, ngày) mà lần lưu này có thể làm thay đổi sổ cái"""
+        keys = {(self.pitch_id, self.booking_date)}
+        loaded = getattr(self, '_loaded_values', {})
+        if 'pitch_id' in loaded and 'booking_date' in loaded:
+            keys.add((loaded['pitch_id'], loaded['booking_date']))
+        return keys
 
     def __str__(self):
         return f"{self.pitch.name} - {self.user.username} ({self.booking_date})"
 
+
+# ===== Booking Series =====
+
+
+class BookingSeries(models.Model):
+    """Lịch đặt sân định kỳ hằng tuần (cùng sân, cùng khung giờ)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="booking_series")
+    pitch = models.ForeignKey(
+        Pitch,
+        on_delete=models.CASCADE,
+        related_name="booking_series")
+    time_slot = models.ForeignKey(
+        PitchTimeSlot,
+        on_delete=models.CASCADE,
+        related_name="booking_series")
+    start_date = models.DateField()
+    weeks = models.PositiveSmallIntegerField()
+    note = models.TextField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.pitch.name} - {self.user.username} (từ {self.start_date}, {self.weeks} tuần)"
+
+    @property
+    def occurrence_dates(self):
+        """Các ngày của lịch: cùng thứ với start_date, liên tiếp `weeks` tuần"""
+        return [
+            self.start_date + timedelta(weeks=week)
+            for week in range(self.weeks)
+        ]
+
+
+class DailySlotLedger(models.Model):
+    """
+    Sổ cái khung giờ đã bị chiếm theo (sân, ngày), phi chuẩn hoá từ Booking.
+
+    Được cập nhật trong cùng transaction với Booking.save / xoá booking,
+    giúp việc đọc tình trạng trống chỉ cần 1 lookup theo khoá duy nhất.
+    Có thể dựng lại bằng lệnh `rebuild_slot_ledger`.
+    """
+    pitch = models.ForeignKey(
+        Pitch,
+        on_delete=models.CASCADE,
+        related_name="slot_ledgers")
+    booking_date = models.DateField()
+    # Danh sách id PitchTimeSlot đang có booking Pending/Confirmed
+    occupied_slot_ids = models.JSONField(default=list)
+    occupied_count = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('pitch', 'booking_date')
+
+    def __str__(self):
+        return f"{self.pitch_id} - {self.booking_date}: {self.occupied_slot_ids}"
+
+    @classmethod
+    def build_rows(cls, bookings):
+        """Gom các booking đang hoạt động thành các dòng sổ cái (chưa lưu)"""
+        occupied = {}
+        for pitch_id, booking_date, slot_id in bookings.filter(
+            status__in=ACTIVE_BOOKING_STATUSES,
+            time_slot__isnull=False,
+        ).values_list('pitch_id', 'booking_date', 'time_slot_id'):
+            occupied.setdefault((pitch_id, booking_date), set()).add(slot_id)
+
+        return [
+            cls(
+                pitch_id=pitch_id,
+                booking_date=booking_date,
+                occupied_slot_ids=sorted(slot_ids),
+                occupied_count=len(slot_ids),
+            )
+            for (pitch_id, booking_date), slot_ids in occupied.items()
+        ]
+
+    @classmethod
+    def rebuild_for(cls, keys):
+        """
+        Tính lại sổ cái cho các cặp (pitch_id, booking_date) từ Booking.
+
+        1 query đọc Booking + 1 câu upsert cho tất cả các cặp. Database có
+        SELECT ... FOR UPDATE thì khoá các dòng sổ cái trước khi đọc
+        Booking (xem _lock_rows).
+        """
+        keys = {key for key in keys if None not in key}
+        if not keys:
+            return
+
+        key_filter = models.Q()
+        for pitch_id, booking_date in keys:
+            key_filter |= models.Q(pitch_id=pitch_id, booking_date=booking_date)
+
+        # SQLite không có FOR UPDATE nhưng chỉ cho 1 transaction ghi tại
+        # một thời điểm nên không cần khoá
+        with transaction.atomic(savepoint=False):
+            if connection.features.has_select_for_update:
+                cls._lock_rows(keys, key_filter)
+            cls._upsert_from_bookings(keys, key_filter)
+
+    @classmethod
+    def _lock_rows(cls, keys, key_filter):
+        """
+        Tạo các dòng sổ cái còn thiếu rồi khoá chúng (theo thứ tự cố định
+        để tránh deadlock). Dưới READ COMMITTED, 2 booking khác khung giờ
+        cùng (sân, ngày) không thấy booking chưa commit của nhau; nếu không
+        khoá, lần ghi sau đè mất khung giờ của lần trước. Có khoá thì
+        transaction sau chờ transaction trước commit rồi mới đọc Booking
+        nên thấy đủ cả hai.
+        """
+        cls.objects.bulk_create(
+            [
+                cls(pitch_id=pitch_id, booking_date=booking_date)
+                for pitch_id, booking_date in sorted(keys)
+            ],
+            ignore_conflicts=True,
+        )
+        list(
+            cls.objects.select_for_update().filter(key_filter)
+            .order_by('pitch_id', 'booking_date').values_list('pk', flat=True)
+        )
+
+    @classmethod
+    def _upsert_from_bookings(cls, keys, key_filter):
+        rows = {
+            (row.pitch_id, row.booking_date): row
+            for row in cls.build_rows(Booking.objects.filter(key_filter))
+        }
+        for pitch_id, booking_date in keys:
+            rows.setdefault(
+                (pitch_id, booking_date),
+                cls(pitch_id=pitch_id, booking_date=booking_date),
+            )
+
+        cls.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['pitch', 'booking_date'],
+            update_fields=['occupied_slot_ids', 'occupied_count', 'updated_at'],
+        )
+
 # ===== Review, Comment, Favorite =====
 
 
@@ -318,11 +976,44 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'pitch')
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['pitch', 'rating'])]
+        indexes = [
+            models.Index(fields=['pitch', 'rating']),
+            # Danh sách đánh giá mới nhất của sân, phân trang theo cursor
+            models.Index(
+                fields=['pitch', '-created_at', '-id'],
+                name='review_pitch_feed_keyset'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.username} for {self.pitch.name} - {self.rating} stars"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giữ điểm lúc load để cập nhật điểm trung bình của sân khi sửa
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_pitch_id = instance.__dict__.get('pitch_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded_rating = getattr(self, '_loaded_rating', None)
+        loaded_pitch_id = getattr(self, '_loaded_pitch_id', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Pitch.apply_rating_change(self.pitch_id, added=self.rating)
+            elif loaded_pitch_id is not None and \
+                    loaded_pitch_id != self.pitch_id:
+                Pitch.apply_rating_change(
+                    loaded_pitch_id, removed=loaded_rating)
+                Pitch.apply_rating_change(self.pitch_id, added=self.rating)
+            elif loaded_rating is not None and loaded_rating != self.rating:
+                Pitch.apply_rating_change(
+                    self.pitch_id, added=self.rating, removed=loaded_rating)
+        self._loaded_rating = self.rating
+        self._loaded_pitch_id = self.pitch_id
+
 
 class Comment(models.Model):
     user = models.ForeignKey(
@@ -340,15 +1031,92 @@ class Comment(models.Model):
         blank=True,
         related_name="replies")
     content = models.TextField()
+    # Đường dẫn id tổ tiên, mỗi đoạn PATH_SEGMENT_WIDTH chữ số + "/",
+    # ví dụ "00000012/00000034/". Sắp theo path = duyệt cây theo chiều sâu.
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    PATH_SEGMENT_WIDTH = 8
+    # Số tầng tối đa để path không vượt max_length
+    MAX_DEPTH = 255 // (PATH_SEGMENT_WIDTH + 1) - 1
+
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['review', 'path'])]
 
     def __str__(self):
         return f"Comment by {self.user.username} on review {self.review.id}"
 
+    @classmethod
+    def path_segment(cls, comment_id):
+        return f"{comment_id:0{cls.PATH_SEGMENT_WIDTH}d}/"
+
+    def clean(self):
+        super().clean()
+        if self.parent_comment_id and \
+                self.parent_comment.review_id != self.review_id:
+            raise ValidationError(
+                {'parent_comment': "Bình luận cha phải thuộc cùng đánh giá."})
+        if self.parent_comment_id and \
+                self.parent_comment.depth >= self.MAX_DEPTH:
+            raise ValidationError(
+                {'parent_comment': "Chuỗi phản hồi đã quá sâu."})
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # path cần id của chính nó nên ghi sau khi insert
+                parent = self.parent_comment if self.parent_comment_id else None
+                self.path = (parent.path if parent else '') + \
+                    self.path_segment(self.pk)
+                self.depth = parent.depth + 1 if parent else 0
+                Comment.objects.filter(pk=self.pk).update(
+                    path=self.path, depth=self.depth)
+
+    def subtree(self):
+        """Bình luận này và mọi phản hồi bên dưới (1 query, theo thứ tự cây)"""
+        return Comment.objects.filter(
+            review_id=self.review_id, path__startswith=self.path
+        ).order_by('path')
+
+    def subtree_count(self):
+        """Số bình luận trong nhánh (kể cả chính nó), 1 câu COUNT"""
+        return self.subtree().count()
+
+    def delete_subtree(self):
+        """
+        Xoá cả nhánh bằng 1 câu DELETE theo tiền tố path (Collector của
+        Django sẽ đi từng tầng replies). Comment không có signal nào.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Comment._meta.db_table} "
+                "WHERE review_id = %s AND path LIKE %s",
+                [self.review_id, f"{self.path}%"])
+            return cursor.rowcount
+
+    @classmethod
+    def build_tree(cls, comments):
+        """
+        Ghép danh sách bình luận đã sắp theo path thành cây.
+        Mỗi bình luận được gắn `children` (list); trả về các gốc.
+        """
+        by_id = {}
+        roots = []
+        for comment in comments:
+            comment.children = []
+            by_id[comment.pk] = comment
+            parent = by_id.get(comment.parent_comment_id)
+            if parent is None:
+                roots.append(comment)
+            else:
+                parent.children.append(comment)
+        return roots
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -367,3 +1135,50 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} favorites {self.pitch.name}"
+
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating:
+                # Thêm qua ORM/admin; add_favorite chèn bằng SQL nên tự cộng.
+                # Xoá (mọi đường) được trừ trong signal post_delete
+                Pitch.apply_favorite_change(self.pitch_id, 1)
+
+
+# ===== Email Outbox =====
+
+
+class EmailOutbox(models.Model):
+    """
+    Email chờ gửi. Request chỉ ghi 1 dòng (cùng transaction với dữ liệu
+    nên rollback thì không gửi), worker run_mail_worker mới nói chuyện
+    với SMTP.
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10,
+        choices=EmailStatus.choices,
+        default=EmailStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Worker lấy các email đến hạn theo thứ tự
+            models.Index(
+                fields=['status', 'next_attempt_at', 'id'],
+                name='email_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,114 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import constants
+from .models import ACTIVE_BOOKING_STATUSES, User
+
+
+logger = logging.getLogger(__name__)
+
+
+def render_messages(subject_template, message_template, recipients,
+                    from_email=None):
+    """
+    Dựng email cho từng người nhận từ 1 cặp template (str.format).
+
+    recipients: danh sách (email, context). Mỗi địa chỉ chỉ nhận 1 email.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    seen = set()
+    messages = []
+    for email, context in recipients:
+        if not email or email in seen:
+            continue
+        seen.add(email)
+        messages.append(EmailMessage(
+            subject=subject_template.format_map(context),
+            body=message_template.format_map(context),
+            from_email=from_email,
+            to=[email],
+        ))
+    return messages
+
+
+def _send_chunk(messages):
+    """Gửi 1 nhóm email qua 1 kết nối, trả về [(email, lỗi hoặc None)]"""
+    results = []
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for message in messages:
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    results.append((message.to[0], f"{type(exc).__name__}: {exc}"))
+                else:
+                    results.append((message.to[0], None))
+    except Exception as exc:
+        # Không mở/đóng được kết nối: các email còn lại coi như lỗi
+        error = f"{type(exc).__name__}: {exc}"
+        results += [(message.to[0], error) for message in messages[len(results):]]
+    return results
+
+
+def send_bulk_email(subject_template, message_template, recipients,
+                    from_email=None, max_workers=None, chunk_size=None):
+    """
+    Gửi thông báo hàng loạt song song.
+
+    Email được dựng sẵn ở luồng chính rồi chia thành từng nhóm chunk_size;
+    tối đa max_workers luồng gửi cùng lúc, mỗi nhóm dùng chung 1 kết nối
+    SMTP. Luồng gửi không đụng tới database.
+    Trả về dict email → None (đã gửi) hoặc chuỗi lỗi.
+    """
+    max_workers = max_workers or constants.BULK_EMAIL_MAX_WORKERS
+    chunk_size = chunk_size or constants.BULK_EMAIL_CHUNK_SIZE
+    messages = render_messages(
+        subject_template, message_template, recipients, from_email)
+    chunks = [
+        messages[start:start + chunk_size]
+        for start in range(0, len(messages), chunk_size)
+    ]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for chunk_results in pool.map(_send_chunk, chunks):
+            results.update(chunk_results)
+
+    failed = sum(1 for error in results.values() if error)
+    if failed:
+        logger.warning(f"Gửi thông báo hàng loạt: {failed}/{len(results)} email lỗi")
+    return results
+
+
+def pitch_customers(pitch, from_date=None):
+    """Khách có booking active tại sân từ from_date (mặc định hôm nay), 1 query"""
+    return User.objects.filter(
+        bookings__pitch=pitch,
+        bookings__booking_date__gte=from_date or date.today(),
+        bookings__status__in=ACTIVE_BOOKING_STATUSES,
+    ).exclude(email='').distinct().only('id', 'email', 'username', 'full_name')
+
+
+def notify_pitch_customers(pitch, message, from_date=None, **options):
+    """
+    Báo cho mọi khách sắp đá tại sân (đóng sân bảo trì, khuyến mãi...).
+    Trả về kết quả theo từng email như send_bulk_email.
+    """
+    recipients = [
+        (user.email, {
+            'user_name': user.full_name or user.username,
+            'pitch_name': pitch.name,
+            'message': message,
+        })
+        for user in pitch_customers(pitch, from_date)
+    ]
+    return send_bulk_email(
+        constants.EMAIL_SUBJECT_PITCH_NOTICE,
+        constants.EMAIL_TEMPLATE_PITCH_NOTICE,
+        recipients,
+        **options,
+    )
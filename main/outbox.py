@@ -0,0 +1,154 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import constants
+from .models import EmailOutbox, EmailStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, recipient_list, from_email=None,
+                html_message=None):
+    """
+    Đưa email vào hàng đợi thay vì gửi ngay (cùng tham số với send_mail).
+
+    Dòng outbox nằm trong transaction hiện tại nên chỉ được gửi khi dữ liệu
+    đi kèm đã commit; request không còn phải chờ SMTP.
+    """
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(recipient_list),
+    )
+
+
+def queue_emails(emails):
+    """
+    Đưa nhiều email vào hàng đợi bằng 1 câu INSERT.
+    emails: các dict cùng tham số với queue_email.
+    """
+    default_from = settings.DEFAULT_FROM_EMAIL or ''
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            subject=email['subject'],
+            body=email['message'],
+            html_body=email.get('html_message') or '',
+            from_email=email.get('from_email') or default_from,
+            to=list(email['recipient_list']),
+        )
+        for email in emails
+    ])
+
+
+def retry_delay(attempts):
+    """Thời gian chờ trước lần thử tiếp theo, gấp đôi sau mỗi lần lỗi"""
+    delay = constants.EMAIL_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, constants.EMAIL_RETRY_MAX_DELAY))
+
+
+def _build_message(item, connection):
+    message = EmailMultiAlternatives(
+        subject=item.subject,
+        body=item.body,
+        from_email=item.from_email or None,
+        to=item.to,
+        connection=connection,
+    )
+    if item.html_body:
+        message.attach_alternative(item.html_body, 'text/html')
+    return message
+
+
+def _send_all(items):
+    """Gửi các email qua 1 kết nối SMTP, trả về (đã gửi, [(email, lỗi)])"""
+    sent, failed = [], []
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for item in items:
+                try:
+                    _build_message(item, connection).send()
+                except Exception as exc:
+                    failed.append((item, exc))
+                else:
+                    sent.append(item)
+    except Exception as exc:
+        # Không mở/đóng được kết nối: các email chưa gửi coi như lỗi
+        done = {item.pk for item in sent} | {item.pk for item, _ in failed}
+        failed += [(item, exc) for item in items if item.pk not in done]
+    return sent, failed
+
+
+def _claim_batch(batch_size, now):
+    """
+    Nhận 1 lô email đến hạn trong 1 transaction ngắn: đẩy next_attempt_at
+    lên sau thời gian giữ để worker khác không lấy trùng trong lúc gửi.
+    """
+    with transaction.atomic():
+        # skip_locked: nhiều worker chạy song song không lấy trùng email
+        # (SQLite không có SELECT ... FOR UPDATE nên bỏ qua)
+        items = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if items:
+            EmailOutbox.objects.filter(pk__in=[item.pk for item in items]).update(
+                next_attempt_at=now + timedelta(
+                    seconds=constants.EMAIL_SEND_LEASE_SECONDS))
+    return items
+
+
+def _record_results(sent, failed):
+    """Ghi kết quả gửi trong 1 transaction ngắn"""
+    now = timezone.now()
+    for item, exc in failed:
+        item.attempts += 1
+        item.last_error = f"{type(exc).__name__}: {exc}"
+        if item.attempts >= constants.EMAIL_MAX_ATTEMPTS:
+            item.status = EmailStatus.DEAD
+            logger.error(
+                f"Bỏ email #{item.pk} sau {item.attempts} lần lỗi: {exc}")
+        else:
+            item.next_attempt_at = now + retry_delay(item.attempts)
+            logger.warning(f"Lỗi gửi email #{item.pk}, sẽ thử lại: {exc}")
+
+    with transaction.atomic():
+        if sent:
+            EmailOutbox.objects.filter(pk__in=[item.pk for item in sent]).update(
+                status=EmailStatus.SENT,
+                attempts=F('attempts') + 1,
+                last_error='',
+                sent_at=now,
+            )
+        EmailOutbox.objects.bulk_update(
+            [item for item, _ in failed],
+            ['attempts', 'last_error', 'status', 'next_attempt_at'],
+        )
+
+
+def deliver_batch(batch_size=None):
+    """
+    Gửi 1 lô email đến hạn qua 1 kết nối SMTP dùng chung.
+
+    Nhận lô và ghi kết quả là 2 transaction ngắn; SMTP chạy ngoài
+    transaction nên không giữ khoá database trong lúc chờ mạng. Email lỗi
+    được hẹn thử lại với thời gian chờ tăng dần; quá EMAIL_MAX_ATTEMPTS
+    lần thì chuyển sang DEAD. Trả về (số đã gửi, số lỗi).
+    """
+    batch_size = batch_size or constants.EMAIL_OUTBOX_BATCH_SIZE
+    items = _claim_batch(batch_size, timezone.now())
+    if not items:
+        return 0, 0
+
+    sent, failed = _send_all(items)
+    _record_results(sent, failed)
+    return len(sent), len(failed)
@@ -0,0 +1,213 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from . import constants
+
+
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+
+_NEXT = 'n'
+_PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _encode_value(value):
+    # isoformat giữ đủ micro giây, so sánh "=" ở trang sau mới khớp
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CursorPage:
+    """
+    1 trang của KeysetPaginator, dùng trong template giống Page của Django
+    (lặp, len, has_next/has_previous...) nhưng điều hướng bằng cursor.
+    """
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Phân trang theo khoá (keyset) thay cho OFFSET.
+
+    `ordering` là tuple field của model, field cuối phải duy nhất (thường
+    là id), ví dụ ('-created_at', 'id'). Mỗi trang chỉ lấy per_page + 1
+    dòng bằng điều kiện WHERE trên các field này nên trang sâu nhanh như
+    trang đầu (nếu có index khớp thứ tự).
+    """
+
+    def __init__(self, queryset, ordering, per_page, with_count=False,
+                 count_limit=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.with_count = with_count
+        self.count_limit = count_limit or constants.APPROXIMATE_COUNT_LIMIT
+        self._count = None
+
+    # ----- Cursor -----
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _ordering_key(self):
+        return ','.join(self.ordering)
+
+    def _encode(self, direction, obj):
+        values = [
+            _encode_value(getattr(obj, name)) for name in self._field_names()
+        ]
+        # Kèm ordering để cursor của thứ tự khác (đổi sort) bị từ chối
+        payload = json.dumps(
+            [direction, values, self._ordering_key()], separators=(',', ':'))
+        return base64.urlsafe_b64encode(
+            payload.encode()).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, raw_values, ordering_key = json.loads(
+                base64.urlsafe_b64decode(padded.encode()))
+            if direction not in (_NEXT, _PREVIOUS) or \
+                    ordering_key != self._ordering_key() or \
+                    len(raw_values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            meta = self.queryset.model._meta
+            values = [
+                meta.get_field(name).to_python(value)
+                for name, value in zip(self._field_names(), raw_values)
+            ]
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError,
+                FieldDoesNotExist, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction, values
+
+    # ----- Query -----
+
+    def _after(self, values, forward):
+        """
+        Điều kiện "đứng sau" bộ giá trị theo thứ tự ordering, ví dụ
+        (-created_at, id): created_at < c OR (created_at = c AND id > i).
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') == forward else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    @property
+    def count(self):
+        """
+        Số dòng, đếm tối đa tới count_limit (COUNT trên subquery có
+        LIMIT nên không quét hết bảng). None nếu không bật with_count.
+        """
+        if not self.with_count:
+            return None
+        if self._count is None:
+            self._count = self.queryset.order_by()[:self.count_limit + 1].count()
+        return min(self._count, self.count_limit)
+
+    @property
+    def count_is_exact(self):
+        return self.count is not None and self._count <= self.count_limit
+
+    def page(self, cursor=None):
+        """Trang sau/trước cursor (None = trang đầu); cursor sai -> InvalidCursor"""
+        direction, values = _NEXT, None
+        if cursor:
+            direction, values = self._decode(cursor)
+        forward = direction == _NEXT
+
+        ordering = self.ordering if forward else tuple(
+            _flip(field) for field in self.ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self._encode(_NEXT, rows[-1]) if rows and has_next else None,
+            previous_cursor=(
+                self._encode(_PREVIOUS, rows[0]) if rows and has_previous else None
+            ),
+        )
+
+    def get_page(self, cursor=None):
+        """Như page() nhưng cursor sai thì trả về trang đầu"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+def paginate(request, queryset, per_page, ordering=None, with_count=False):
+    """
+    Phân trang cho list view.
+
+    Có `ordering` thì mặc định dùng cursor (?cursor=...); vẫn dùng được
+    kiểu số trang cũ (?page=N, Paginator của Django) khi request có
+    `page` hoặc thứ tự hiện tại không phân trang theo khoá được
+    (ordering=None, ví dụ sắp theo độ liên quan).
+    """
+    if ordering is None or PAGE_PARAM in request.GET:
+        return Paginator(queryset, per_page).get_page(request.GET.get(PAGE_PARAM))
+    paginator = KeysetPaginator(
+        queryset, ordering, per_page, with_count=with_count)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
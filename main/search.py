@@ -0,0 +1,292 @@
+import hashlib
+import re
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from . import constants
+from .utils import normalize_search_text
+
+
+PITCH_INDEX_TABLE = 'main_pitch_search'
+FACILITY_INDEX_TABLE = 'main_facility_search'
+
+# Bảng FTS5 (rowid = id của Pitch/Facility) được tạo lại trong migration
+# 0007_search_key trên cột `search_key` (đã bỏ dấu); Postgres dùng GIN index
+# trên tsvector của `search_key`.
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _vendor():
+    return connection.vendor
+
+
+def build_match_query(query):
+    """
+    Chuyển từ khóa người dùng thành biểu thức MATCH của FTS5.
+
+    Từ khóa được bỏ dấu giống `search_key`, mỗi từ đặt trong ngoặc kép
+    (tránh cú pháp FTS5 lọt vào) và tìm theo tiền tố; các từ nối với nhau
+    bằng AND.
+    """
+    return ' '.join(
+        f'"{token}"*'
+        for token in _TOKEN_RE.findall(normalize_search_text(query)))
+
+
+def _sqlite_search(queryset, table, match):
+    # Join bảng FTS5 theo rowid: MATCH và bm25 tính trong cùng 1 lần quét
+    # index thay vì 1 subquery xếp hạng cho mỗi dòng
+    outer = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[table],
+        where=[f"{table}.rowid = {outer}.id", f"{table} MATCH %s"],
+        params=[match],
+    ).annotate(
+        # bm25 càng nhỏ càng liên quan
+        search_rank=RawSQL(f"bm25({table})", ())
+    )
+
+
+def _postgres_search(queryset, query, fields):
+    from django.contrib.postgres.search import (
+        SearchQuery, SearchRank, SearchVector
+    )
+
+    search_query = SearchQuery(
+        normalize_search_text(query), search_type='websearch', config='simple')
+    vectors = {
+        f'_search_{i}': SearchVector(field, config='simple')
+        for i, field in enumerate(fields)
+    }
+    combined = None
+    for vector in vectors.values():
+        combined = vector if combined is None else combined + vector
+
+    match = Q()
+    for name in vectors:
+        match |= Q(**{name: search_query})
+    return queryset.annotate(**vectors).filter(match).annotate(
+        # Đổi dấu để "nhỏ hơn = liên quan hơn" giống bm25 của SQLite
+        search_rank=-SearchRank(combined, search_query)
+    )
+
+
+def _fallback_search(queryset, query, fields):
+    # Mỗi từ phải xuất hiện ở ít nhất 1 cột search_key
+    match = Q()
+    for token in normalize_search_text(query).split():
+        token_match = Q()
+        for field in fields:
+            token_match |= Q(**{f'{field}__contains': token})
+        match &= token_match
+    return queryset.filter(match).annotate(search_rank=Value(0.0))
+
+
+def _search(queryset, query, index_table, fields):
+    if not query.strip():
+        return queryset.annotate(search_rank=Value(0.0))
+    match = build_match_query(query)
+    if not match:
+        # Từ khóa không có chữ/số nào (vd. chỉ có dấu câu) thì không khớp gì
+        return queryset.none().annotate(search_rank=Value(0.0))
+
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        return _sqlite_search(queryset, index_table, match)
+    if vendor == 'postgresql':
+        return _postgres_search(queryset, query, fields)
+    return _fallback_search(queryset, query, fields)
+
+
+def search_pitches(queryset, query):
+    """
+    Lọc queryset Pitch theo từ khóa và gắn `search_rank` (nhỏ = liên quan).
+
+    Tìm không phân biệt dấu ("san my dinh" khớp "Sân Mỹ Đình"). SQLite
+    dùng bảng FTS5, Postgres dùng tsvector; database khác quay về
+    contains trên `search_key`.
+    """
+    return _search(
+        queryset, query, PITCH_INDEX_TABLE,
+        ['search_key', 'facility__search_key'])
+
+
+def search_facilities(queryset, query):
+    """Lọc queryset Facility theo từ khóa (không dấu) và gắn `search_rank`."""
+    return _search(queryset, query, FACILITY_INDEX_TABLE, ['search_key'])
+
+
+# ===== Gợi ý khi gõ (autocomplete) =====
+
+AUTOCOMPLETE_CACHE_PREFIX = 'autocomplete'
+_AUTOCOMPLETE_VERSION_KEY = f'{AUTOCOMPLETE_CACHE_PREFIX}:version'
+
+
+def _autocomplete_version():
+    version = cache.get(_AUTOCOMPLETE_VERSION_KEY)
+    if version is None:
+        cache.add(_AUTOCOMPLETE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_AUTOCOMPLETE_VERSION_KEY)
+    return version
+
+
+def invalidate_autocomplete():
+    """Tăng version để bỏ toàn bộ gợi ý đã cache (khi sân/cơ sở thay đổi)"""
+    try:
+        cache.incr(_AUTOCOMPLETE_VERSION_KEY)
+    except ValueError:
+        cache.set(_AUTOCOMPLETE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+# Lớn hơn mọi ký tự có thể theo sau tiền tố trong search_key
+_PREFIX_RANGE_END = '\uffff'
+
+
+def prefix_range_q(field, prefix):
+    """
+    Điều kiện `field` bắt đầu bằng `prefix` dưới dạng khoảng
+    [prefix, prefix + U+FFFF). Khác với __startswith (LIKE 'x%'), khoảng
+    này dùng được index b-tree thường để SEARCH thay vì quét cả index trên
+    SQLite, và trên Postgres không cần index varchar_pattern_ops.
+    """
+    return Q(**{
+        f'{field}__gte': prefix,
+        f'{field}__lt': prefix + _PREFIX_RANGE_END,
+    })
+
+
+def _prefix_matches(queryset, prefix, search, limit):
+    """
+    Tối đa `limit` tên khớp tiền tố: trước hết những tên bắt đầu bằng
+    tiền tố (tìm theo khoảng trên index b-tree của search_key), sau đó bù
+    bằng các tên có 1 từ bắt đầu bằng tiền tố (index tìm kiếm toàn văn).
+    """
+    rows = list(
+        queryset.filter(prefix_range_q('search_key', prefix))
+        .order_by('search_key', 'id')[:limit]
+    )
+    if len(rows) < limit:
+        seen = [row.id for row in rows]
+        rows += list(
+            search(queryset, prefix).exclude(id__in=seen)
+            .order_by('search_rank', 'id')[:limit - len(rows)]
+        )
+    return rows
+
+
+def autocomplete(prefix, limit=None):
+    """
+    Gợi ý tên sân và cơ sở cho tiền tố người dùng đang gõ.
+
+    Kết quả cache theo tiền tố đã chuẩn hoá ("Sân" và "san" dùng chung),
+    key có version nên lưu sân/cơ sở là bỏ được toàn bộ cache cũ.
+    """
+    from .models import Facility, Pitch
+
+    limit = limit or constants.AUTOCOMPLETE_LIMIT
+    prefix = normalize_search_text(
+        prefix[:constants.AUTOCOMPLETE_MAX_PREFIX_LENGTH])
+    if not prefix:
+        return {'pitches': [], 'facilities': []}
+
+    # Băm tiền tố: key không chứa khoảng trắng/ký tự lạ (memcached từ chối)
+    prefix_hash = hashlib.md5(prefix.encode()).hexdigest()
+    cache_key = (
+        f'{AUTOCOMPLETE_CACHE_PREFIX}:{_autocomplete_version()}:'
+        f'{limit}:{prefix_hash}'
+    )
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    pitches = _prefix_matches(
+        Pitch.objects.select_related('facility').only(
+            'id', 'name', 'search_key', 'facility__name'),
+        prefix, search_pitches, limit)
+    facilities = _prefix_matches(
+        Facility.objects.only('id', 'name', 'address', 'search_key'),
+        prefix, search_facilities, limit)
+    result = {
+        'pitches': [
+            {
+                'id': pitch.id,
+                'name': pitch.name,
+                'facility': pitch.facility.name if pitch.facility else '',
+            }
+            for pitch in pitches
+        ],
+        'facilities': [
+            {
+                'id': facility.id,
+                'name': facility.name,
+                'address': facility.address,
+                'url': reverse('facility_detail', args=[facility.id]),
+            }
+            for facility in facilities
+        ],
+    }
+    cache.set(cache_key, result, timeout=constants.AUTOCOMPLETE_CACHE_TIMEOUT)
+    return result
+
+
+# ===== Đồng bộ bảng FTS5 (chỉ SQLite; Postgres dùng index trên chính bảng) =====
+
+def _id_filter(column, ids):
+    if ids is None:
+        return "", []
+    placeholders = ', '.join(['%s'] * len(ids))
+    return f" WHERE {column} IN ({placeholders})", list(ids)
+
+
+def index_pitches(pitch_ids=None, using=None):
+    """Ghi lại dòng FTS5 của các sân (None = toàn bộ)."""
+    conn = connection if using is None else using
+    if conn.vendor != 'sqlite' or (pitch_ids is not None and not pitch_ids):
+        return
+    where, params = _id_filter('rowid', pitch_ids)
+    source_where, _ = _id_filter('p.id', pitch_ids)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PITCH_INDEX_TABLE}{where}", params)
+        cursor.execute(
+            f"INSERT INTO {PITCH_INDEX_TABLE} "
+            "(rowid, search_key, facility_key) "
+            "SELECT p.id, p.search_key, COALESCE(f.search_key, '') "
+            "FROM main_pitch p LEFT JOIN main_facility f ON f.id = p.facility_id"
+            f"{source_where}",
+            params)
+
+
+def index_facilities(facility_ids=None, using=None):
+    """Ghi lại dòng FTS5 của các cơ sở (None = toàn bộ)."""
+    conn = connection if using is None else using
+    if conn.vendor != 'sqlite' or (
+            facility_ids is not None and not facility_ids):
+        return
+    where, params = _id_filter('rowid', facility_ids)
+    source_where, _ = _id_filter('id', facility_ids)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FACILITY_INDEX_TABLE}{where}", params)
+        cursor.execute(
+            f"INSERT INTO {FACILITY_INDEX_TABLE} (rowid, search_key) "
+            f"SELECT id, search_key FROM main_facility{source_where}",
+            params)
+
+
+def unindex(table, object_id):
+    """Xoá 1 dòng khỏi bảng FTS5."""
+    if _vendor() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [object_id])
+
+
+def rebuild_search_index(using=None):
+    """Dựng lại toàn bộ index tìm kiếm."""
+    index_pitches(using=using)
+    index_facilities(using=using)
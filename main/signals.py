@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .availability import invalidate_availability_on_commit
+from .models import (
+    Booking, DailySlotLedger, Facility, Favorite, Pitch, Review, Voucher
+)
+from .search import (
+    FACILITY_INDEX_TABLE, PITCH_INDEX_TABLE, index_facilities, index_pitches,
+    invalidate_autocomplete, unindex
+)
+from .vouchers import invalidate_voucher_cache_on_commit
+
+
+@receiver(post_save, sender=Booking)
+def invalidate_availability_on_booking_save(sender, instance, **kwargs):
+    """Mọi thay đổi booking (tạo, hủy, duyệt, từ chối) đều làm cache cũ"""
+    invalidate_availability_on_commit(instance._ledger_keys())
+
+
+def _rebuild_ledger_for_existing_pitches(keys):
+    """Dựng lại sổ cái, bỏ qua các sân đã bị xoá (dòng sổ cái đã CASCADE theo)"""
+    pitch_ids = set(
+        Pitch.objects.filter(pk__in={pitch_id for pitch_id, _ in keys})
+        .values_list('pk', flat=True)
+    )
+    DailySlotLedger.rebuild_for(
+        {key for key in keys if key[0] in pitch_ids})
+
+
+@receiver(post_delete, sender=Booking)
+def sync_ledger_on_booking_delete(sender, instance, origin=None, **kwargs):
+    """
+    Xoá booking phải giải phóng khung giờ trong sổ cái.
+
+    Xoá trực tiếp booking thì dựng lại ngay trong transaction. Xoá do
+    cascade (xoá sân, cơ sở, user...) thì sân có thể đang bị xoá cùng
+    transaction: ghi lại dòng sổ cái lúc này sẽ vi phạm khoá ngoại, nên
+    chỉ dựng lại sau commit cho các sân còn tồn tại.
+    """
+    keys = {(instance.pitch_id, instance.booking_date)}
+    deleted_directly = (
+        isinstance(origin, Booking) or getattr(origin, 'model', None) is Booking)
+    if deleted_directly:
+        DailySlotLedger.rebuild_for(keys)
+    else:
+        transaction.on_commit(lambda: _rebuild_ledger_for_existing_pitches(keys))
+    invalidate_availability_on_commit(keys)
+
+
+@receiver(post_save, sender=Pitch)
+def index_pitch_on_save(sender, instance, **kwargs):
+    """Giữ bảng tìm kiếm và gợi ý khớp với tên sân"""
+    index_pitches([instance.pk])
+    invalidate_autocomplete()
+
+
+@receiver(post_delete, sender=Pitch)
+def unindex_pitch_on_delete(sender, instance, **kwargs):
+    unindex(PITCH_INDEX_TABLE, instance.pk)
+    invalidate_autocomplete()
+
+
+@receiver(post_save, sender=Facility)
+def index_facility_on_save(sender, instance, **kwargs):
+    """Tên/địa chỉ cơ sở cũng nằm trong dòng tìm kiếm của các sân thuộc cơ sở"""
+    index_facilities([instance.pk])
+    index_pitches(list(instance.pitches.values_list('id', flat=True)))
+    invalidate_autocomplete()
+
+
+@receiver(post_delete, sender=Facility)
+def unindex_facility_on_delete(sender, instance, **kwargs):
+    unindex(FACILITY_INDEX_TABLE, instance.pk)
+    invalidate_autocomplete()
+
+
+@receiver(post_delete, sender=Review)
+def update_pitch_rating_on_review_delete(sender, instance, **kwargs):
+    """Xoá review (kể cả do cascade khi xoá user) phải trừ khỏi điểm của sân"""
+    Pitch.apply_rating_change(instance.pitch_id, removed=instance.rating)
+
+
+@receiver(post_delete, sender=Favorite)
+def update_favorite_count_on_favorite_delete(sender, instance, **kwargs):
+    """Xoá yêu thích (bỏ thích, admin, cascade khi xoá user...) phải trừ lượt"""
+    Pitch.apply_favorite_change(instance.pitch_id, -1)
+
+
+@receiver(post_save, sender=Voucher)
+@receiver(post_delete, sender=Voucher)
+def invalidate_voucher_cache_on_change(sender, instance, **kwargs):
+    """
+    Sửa/xoá voucher (trang quản lý, VoucherAdmin, shell...) phải bỏ cache
+    tra cứu theo mã, kể cả khi đổi mã
+    """
+    invalidate_voucher_cache_on_commit()
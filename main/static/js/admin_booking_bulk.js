@@ -0,0 +1,33 @@
+// ============= ADMIN BULK APPROVE/REJECT =============
+// Checkbox data-bulk-item thuộc form #bulkBookingForm (qua thuộc tính form)
+document.addEventListener('DOMContentLoaded', () => {
+    const selectAll = document.querySelector('[data-bulk-all]');
+    const items = document.querySelectorAll('[data-bulk-item]');
+    const counter = document.querySelector('[data-bulk-count]');
+    const buttons = document.querySelectorAll('[data-bulk-submit]');
+
+    function refresh() {
+        const checked = Array.from(items).filter(item => item.checked).length;
+        if (counter) {
+            counter.textContent = checked;
+        }
+        buttons.forEach(button => {
+            button.disabled = checked === 0;
+        });
+        if (selectAll) {
+            selectAll.checked = items.length > 0 && checked === items.length;
+            selectAll.indeterminate = checked > 0 && checked < items.length;
+        }
+    }
+
+    if (selectAll) {
+        selectAll.addEventListener('change', () => {
+            items.forEach(item => {
+                item.checked = selectAll.checked;
+            });
+            refresh();
+        });
+    }
+    items.forEach(item => item.addEventListener('change', refresh));
+    refresh();
+});
@@ -0,0 +1,122 @@
+import { TEXT } from './const.js';
+
+// ============= SEARCH AUTOCOMPLETE =============
+// Input cần có data-autocomplete-url; gợi ý hiện ngay dưới ô tìm kiếm.
+const DEBOUNCE_MS = 150;
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value;
+    return div.innerHTML;
+}
+
+function setupAutocomplete(input) {
+    const url = input.dataset.autocompleteUrl;
+    const form = input.form;
+    const results = new Map();
+    let timer = null;
+    let controller = null;
+
+    const menu = document.createElement('div');
+    menu.className = 'list-group position-absolute w-100 shadow-sm d-none';
+    menu.style.top = '100%';
+    menu.style.left = '0';
+    menu.style.zIndex = '1050';
+    input.parentElement.classList.add('position-relative');
+    input.parentElement.appendChild(menu);
+
+    function hide() {
+        menu.classList.add('d-none');
+        menu.innerHTML = '';
+    }
+
+    function render(data) {
+        const items = [];
+        if (data.pitches.length) {
+            items.push(`<div class="list-group-item small fw-bold text-muted">${TEXT.AUTOCOMPLETE_PITCHES}</div>`);
+            data.pitches.forEach(pitch => {
+                const facility = pitch.facility ? ` <small class="text-muted">${escapeHtml(pitch.facility)}</small>` : '';
+                items.push(`<button type="button" class="list-group-item list-group-item-action" data-name="${escapeHtml(pitch.name)}">`
+                    + `${escapeHtml(pitch.name)}${facility}</button>`);
+            });
+        }
+        if (data.facilities.length) {
+            items.push(`<div class="list-group-item small fw-bold text-muted">${TEXT.AUTOCOMPLETE_FACILITIES}</div>`);
+            data.facilities.forEach(facility => {
+                items.push(`<a class="list-group-item list-group-item-action" href="${facility.url}">`
+                    + `${escapeHtml(facility.name)} <small class="text-muted">${escapeHtml(facility.address)}</small></a>`);
+            });
+        }
+        if (!items.length) {
+            hide();
+            return;
+        }
+        menu.innerHTML = items.join('');
+        menu.classList.remove('d-none');
+    }
+
+    async function fetchSuggestions(query) {
+        const key = query.trim().toLowerCase();
+        if (!key) {
+            hide();
+            return;
+        }
+        if (results.has(key)) {
+            render(results.get(key));
+            return;
+        }
+        // Huỷ request cũ khi người dùng gõ tiếp
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+        try {
+            const response = await fetch(`${url}?q=${encodeURIComponent(query)}`, {
+                signal: controller.signal
+            });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            results.set(key, data);
+            if (input.value.trim().toLowerCase() === key) {
+                render(data);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                hide();
+            }
+        }
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fetchSuggestions(input.value), DEBOUNCE_MS);
+    });
+
+    input.addEventListener('keydown', event => {
+        if (event.key === 'Escape') {
+            hide();
+        }
+    });
+
+    menu.addEventListener('click', event => {
+        const button = event.target.closest('button[data-name]');
+        if (!button) {
+            return;
+        }
+        input.value = button.dataset.name;
+        hide();
+        if (form) {
+            form.submit();
+        }
+    });
+
+    document.addEventListener('click', event => {
+        if (!input.parentElement.contains(event.target)) {
+            hide();
+        }
+    });
+}
+
+document.querySelectorAll('input[data-autocomplete-url]').forEach(setupAutocomplete);
@@ -7,12 +7,74 @@ if (bookingDateInput) {
         const selectedDate = this.value;
 
         if (selectedDate) {
-            const key = QUERY_KEYS.bookingDate;
-            window.location.href = `?${key}=${encodeURIComponent(selectedDate)}`;
+            goToDate(selectedDate);
         }
     });
 }
 
+// ============= AVAILABILITY CALENDAR =============
+function goToDate(selectedDate) {
+    const key = QUERY_KEYS.bookingDate;
+    window.location.href = `?${key}=${encodeURIComponent(selectedDate)}`;
+}
+
+function renderAvailabilityCalendar(container, data) {
+    if (!data.slots.length) {
+        container.innerHTML = `<p class="text-muted small p-3 mb-0">${TEXT.MSG_CALENDAR_EMPTY}</p>`;
+        return;
+    }
+
+    const headerCells = data.dates.map(day => {
+        const [, month, date] = day.split('-');
+        return `<th class="text-center small">${date}/${month}</th>`;
+    }).join('');
+
+    const rows = data.slots.map((slot, i) => {
+        const cells = data.matrix[i].map((free, j) => {
+            if (!free) {
+                return '<td class="text-center table-secondary"><i class="fas fa-times text-muted"></i></td>';
+            }
+            return `<td class="text-center table-success calendar-cell" role="button" data-date="${data.dates[j]}">`
+                + '<i class="fas fa-check text-success"></i></td>';
+        }).join('');
+        return `<tr><th class="small text-nowrap">${slot.start_time} - ${slot.end_time}</th>${cells}</tr>`;
+    }).join('');
+
+    container.innerHTML = `
+        <table class="table table-sm table-bordered mb-0 availability-calendar">
+            <thead><tr><th></th>${headerCells}</tr></thead>
+            <tbody>${rows}</tbody>
+        </table>
+    `;
+
+    container.querySelectorAll('.calendar-cell').forEach(cell => {
+        cell.addEventListener('click', () => goToDate(cell.dataset.date));
+    });
+}
+
+async function loadAvailabilityCalendar() {
+    const container = document.getElementById('availabilityCalendar');
+    if (!container || !window.availabilityCalendarUrl) return;
+
+    try {
+        const res = await fetch(window.availabilityCalendarUrl);
+        if (!res.ok) {
+            throw new Error(`Calendar HTTP error ${res.status}`);
+        }
+        renderAvailabilityCalendar(container, await res.json());
+    } catch (err) {
+        container.innerHTML = `<p class="text-danger small p-3 mb-0">${TEXT.MSG_CALENDAR_ERROR}</p>`;
+        console.error({
+            level: 'error',
+            type: err.name,
+            message: err.message,
+            time: new Date().toISOString()
+        });
+    }
+}
+
+loadAvailabilityCalendar();
+
 // ============= TIME SLOT SELECT =============
 function selectTimeSlot(card) {
     if (!card || card.dataset.available !== 'true') return;
@@ -32,6 +94,10 @@ function selectTimeSlot(card) {
     if (submitBtn) {
         submitBtn.disabled = false;
     }
+    const addToCartBtn = document.getElementById('addToCartBtn');
+    if (addToCartBtn) {
+        addToCartBtn.disabled = false;
+    }
 }
 
 document.querySelectorAll('.time-slot-card').forEach(card => {
@@ -134,3 +200,68 @@ if (bookingForm) {
         }
     });
 }
+
+// ============= REVIEW FEED (LOAD MORE ON SCROLL) =============
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value;
+    return div.innerHTML;
+}
+
+function renderReview(review) {
+    const stars = [1, 2, 3, 4, 5].map(i =>
+        i <= review.rating ? '<i class="fas fa-star"></i>' : '<i class="far fa-star"></i>'
+    ).join('');
+    return '<div class="p-3 border-bottom">'
+        + '<div class="d-flex justify-content-between align-items-start mb-1">'
+        + `<div><strong class="text-dark">${escapeHtml(review.author)}</strong>`
+        + `<div class="small text-warning">${stars}</div></div>`
+        + `<small class="text-muted" style="font-size: 0.8rem;">${review.created_at}</small>`
+        + '</div>'
+        + `<p class="mb-0 small text-secondary">${escapeHtml(review.content)}</p>`
+        + '</div>';
+}
+
+const reviewFeedMore = document.getElementById('reviewFeedMore');
+if (reviewFeedMore) {
+    let loading = false;
+
+    const loadMoreReviews = async () => {
+        const cursor = reviewFeedMore.dataset.nextCursor;
+        if (loading || !cursor) {
+            return;
+        }
+        loading = true;
+        try {
+            const response = await fetch(
+                `${reviewFeedMore.dataset.url}?cursor=${encodeURIComponent(cursor)}`);
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            const data = await response.json();
+            reviewFeedMore.insertAdjacentHTML(
+                'beforebegin', data.reviews.map(renderReview).join(''));
+            if (data.next_cursor) {
+                reviewFeedMore.dataset.nextCursor = data.next_cursor;
+                // Quan sát lại để tải tiếp nếu mốc vẫn đang hiện trên màn hình
+                observer.unobserve(reviewFeedMore);
+                observer.observe(reviewFeedMore);
+            } else {
+                observer.disconnect();
+                reviewFeedMore.remove();
+            }
+        } catch (error) {
+            observer.disconnect();
+            reviewFeedMore.textContent = TEXT.MSG_REVIEWS_ERROR;
+        } finally {
+            loading = false;
+        }
+    };
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreReviews();
+        }
+    }, { root: document.getElementById('reviewList'), rootMargin: '100px' });
+    observer.observe(reviewFeedMore);
+}
@@ -20,7 +20,12 @@ export const TEXT = {
     MSG_VOUCHER_CHECKING: 'Đang kiểm tra...',
     MSG_VOUCHER_VALID: 'Voucher hợp lệ!',
     MSG_VOUCHER_INVALID: 'Voucher không hợp lệ!',
-    MSG_VOUCHER_ERROR: 'Có lỗi xảy ra, vui lòng thử lại.'
+    MSG_VOUCHER_ERROR: 'Có lỗi xảy ra, vui lòng thử lại.',
+    MSG_CALENDAR_ERROR: 'Không tải được lịch trống.',
+    MSG_CALENDAR_EMPTY: 'Sân chưa có khung giờ nào.',
+    AUTOCOMPLETE_PITCHES: 'Sân',
+    AUTOCOMPLETE_FACILITIES: 'Cơ sở',
+    MSG_REVIEWS_ERROR: 'Không tải được thêm đánh giá.'
 };
 
 export const URL_CONFIG = {
@@ -0,0 +1,60 @@
+// ============= FAVORITES (PUT/DELETE + BATCH STATE) =============
+// Form yêu thích cần data-favorite-pitch và data-favorite-url; không có JS
+// thì form vẫn POST tới toggle_favorite như cũ.
+const forms = document.querySelectorAll('form[data-favorite-pitch]');
+
+function getCsrfToken(form) {
+    const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+}
+
+function setFavorited(form, isFavorited) {
+    form.dataset.favorited = isFavorited ? '1' : '0';
+    const icon = form.querySelector('i');
+    if (icon) {
+        icon.classList.toggle('fas', isFavorited);
+        icon.classList.toggle('far', !isFavorited);
+    }
+}
+
+function adjustCount(pitchId, delta) {
+    const counter = document.querySelector(`[data-favorite-count="${pitchId}"]`);
+    if (counter) {
+        counter.textContent = Math.max(0, parseInt(counter.textContent, 10) + delta);
+    }
+}
+
+async function loadFavoriteState() {
+    const ids = Array.from(forms, form => form.dataset.favoritePitch);
+    if (!ids.length || !window.favoriteStateUrl) {
+        return;
+    }
+    const response = await fetch(`${window.favoriteStateUrl}?ids=${ids.join(',')}`);
+    if (!response.ok) {
+        return;
+    }
+    const data = await response.json();
+    const favorited = new Set(data.favorited.map(String));
+    forms.forEach(form => setFavorited(form, favorited.has(form.dataset.favoritePitch)));
+}
+
+forms.forEach(form => {
+    form.addEventListener('submit', async event => {
+        event.preventDefault();
+        const isFavorited = form.dataset.favorited === '1';
+        const response = await fetch(form.dataset.favoriteUrl, {
+            method: isFavorited ? 'DELETE' : 'PUT',
+            headers: { 'X-CSRFToken': getCsrfToken(form) }
+        });
+        if (!response.ok) {
+            return;
+        }
+        const data = await response.json();
+        setFavorited(form, data.is_favorited);
+        if (data.changed) {
+            adjustCount(form.dataset.favoritePitch, data.is_favorited ? 1 : -1);
+        }
+    });
+});
+
+loadFavoriteState();
@@ -47,6 +47,18 @@ def param_remove(value, key_to_remove):
     return urlencode(params, doseq=True)
 
 
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    """
+    Query string của trang ứng với cursor, giữ nguyên các filter đang có
+    Usage: <a href="{% cursor_url page.next_cursor %}">
+    """
+    params = context['request'].GET.copy()
+    params.pop('page', None)
+    params['cursor'] = cursor
+    return '?' + params.urlencode()
+
+
 @register.filter
 def price_range_display(value):
     if isinstance(value, list):
@@ -1,13 +1,42 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
 from datetime import date, time, timedelta
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from smtplib import SMTPException
+from unittest import mock, skipUnless
+import warnings
+from django.utils import timezone
 
 from .models import (
     Facility, Pitch, PitchType, Favorite, TimeSlot, PitchTimeSlot,
-    Voucher, Booking, BookingStatus
+    Voucher, Booking, BookingStatus, DailySlotLedger, Review, Comment,
+    VoucherRedemption, EmailOutbox, EmailStatus, is_slot_conflict
+)
+from .availability import (
+    annotate_free_slot_count, get_booked_slot_ids, get_cache_stats, get_free_pitch_slots,
+    get_pitch_slots_on_date
+)
+from .favorites import add_favorite, remove_favorite
+from .notifications import notify_pitch_customers, send_bulk_email
+from .outbox import deliver_batch, queue_email, retry_delay
+from .pagination import InvalidCursor, KeysetPaginator
+from .search import prefix_range_q, search_facilities, search_pitches
+from .utils import normalize_search_text, send_booking_confirmation_email
+from .vouchers import get_voucher_by_code
+from .bookings import (
+    bulk_update_booking_status, cancel_booking_series, checkout_cart,
+    create_booking_series
 )
 from . import constants
 
@@ -251,6 +280,48 @@ class PitchTimeSlotTests(TestCase):
         is_available = self.pitch_time_slot.is_available_on_date(date.today() + timedelta(days=1))
         self.assertFalse(is_available)
 
+    def test_duration_minutes_stored(self):
+        """Test TimeSlot lưu sẵn thời lượng theo phút"""
+        self.assertEqual(self.time_slot.duration_minutes, 120)
+        self.assertEqual(self.time_slot.duration_hours(), Decimal('2.00'))
+
+    def test_get_price_does_not_query(self):
+        """Test get_price() đọc giá lưu sẵn, không query sân/khung giờ"""
+        pts = PitchTimeSlot.objects.get(pk=self.pitch_time_slot.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(pts.get_price(), Decimal('200.00'))
+
+    def test_price_synced_when_pitch_price_changes(self):
+        """Test đổi giá/giờ của sân cập nhật giá lưu sẵn của các khung giờ"""
+        pitch = Pitch.objects.get(pk=self.pitch.pk)
+        pitch.base_price_per_hour = Decimal('150.00')
+        pitch.save()
+        self.pitch_time_slot.refresh_from_db()
+        self.assertEqual(self.pitch_time_slot.price, Decimal('300.00'))
+
+    def test_price_synced_when_time_slot_changes(self):
+        """Test đổi giờ kết thúc cập nhật thời lượng và giá lưu sẵn"""
+        self.time_slot.end_time = time(8, 0)
+        self.time_slot.save()
+        self.pitch_time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.duration_minutes, 60)
+        self.assertEqual(self.pitch_time_slot.price, Decimal('100.00'))
+
+    def test_order_by_stored_price(self):
+        """Test sắp xếp khung giờ theo giá bằng SQL"""
+        short_slot = TimeSlot.objects.create(
+            name="9h-10h",
+            start_time=time(9, 0),
+            end_time=time(10, 0)
+        )
+        short_pts = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=short_slot
+        )
+        self.assertEqual(
+            list(PitchTimeSlot.objects.order_by('price')),
+            [short_pts, self.pitch_time_slot])
+
 
 # ===== Voucher Tests =====
 class VoucherTests(TestCase):
@@ -431,4 +502,2564 @@ class BookingTests(TestCase):
         )
         expected = f"{self.pitch.name} - {self.user.username} ({booking_date})"
         self.assertEqual(str(booking), expected)
-        
\ No newline at end of file
+        
+
+# ===== Availability Tests =====
+class AvailabilityTests(TestCase):
+    """Test availability service (main/availability.py)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            address='123 Test St'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def _create_slots(self, count, start=0):
+        slots = []
+        for hour in range(start, start + count):
+            time_slot = TimeSlot.objects.create(
+                name=f"slot-{hour}",
+                start_time=time(hour, 0),
+                end_time=time(hour, 30)
+            )
+            slots.append(PitchTimeSlot.objects.create(
+                pitch=self.pitch,
+                time_slot=time_slot
+            ))
+        return slots
+
+    def test_booked_slot_is_marked(self):
+        """Test slot có booking Pending/Confirmed bị đánh dấu is_booked"""
+        slots = self._create_slots(3)
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=slots[1],
+            booking_date=self.booking_date
+        )
+
+        result = get_pitch_slots_on_date(self.pitch, self.booking_date)
+        booked = {slot.id: slot.is_booked for slot in result}
+        self.assertEqual(
+            booked, {slots[0].id: False, slots[1].id: True, slots[2].id: False})
+
+    def test_cancelled_booking_frees_slot(self):
+        """Test booking đã hủy không chiếm khung giờ"""
+        slots = self._create_slots(1)
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=slots[0],
+            booking_date=self.booking_date,
+            status=BookingStatus.CANCELLED
+        )
+        self.assertEqual(
+            get_free_pitch_slots(self.pitch, self.booking_date), slots)
+
+    def test_query_count_independent_of_slot_count(self):
+        """Test số query không đổi dù sân có 4 hay 20 khung giờ"""
+        self._create_slots(4)
+        with self.assertNumQueries(2):
+            for slot in get_pitch_slots_on_date(self.pitch, self.booking_date):
+                slot.get_price()
+
+        self._create_slots(16, start=4)
+        cache.clear()
+        with self.assertNumQueries(2):
+            for slot in get_pitch_slots_on_date(self.pitch, self.booking_date):
+                slot.get_price()
+
+    def test_ajax_time_slots_query_count(self):
+        """Test AJAX time slots không phát sinh N+1 query"""
+        self._create_slots(12)
+        url = reverse('ajax_time_slots', args=[self.pitch.id])
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                url, {'date': self.booking_date.isoformat()})
+        self.assertEqual(len(response.json()['slots']), 12)
+
+    def test_availability_calendar_matrix(self):
+        """Test lịch trống đánh dấu đúng ô đã đặt và trả về đủ 14 ngày"""
+        slots = self._create_slots(2)
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=slots[0],
+            booking_date=self.booking_date
+        )
+
+        url = reverse('ajax_availability_calendar', args=[self.pitch.id])
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        data = response.json()
+
+        self.assertEqual(len(data['dates']), constants.MAX_BOOKING_ADVANCE_DAYS)
+        self.assertEqual([s['id'] for s in data['slots']], [s.id for s in slots])
+        day_index = data['dates'].index(self.booking_date.isoformat())
+        self.assertEqual(data['matrix'][0][day_index], 0)
+        self.assertEqual(data['matrix'][1][day_index], 1)
+
+    def test_availability_calendar_rejects_out_of_range_start(self):
+        """Test lịch trống từ chối ngày bắt đầu ngoài khoảng được đặt"""
+        url = reverse('ajax_availability_calendar', args=[self.pitch.id])
+        past = (date.today() - timedelta(days=1)).isoformat()
+        response = self.client.get(url, {'start': past})
+        self.assertEqual(response.status_code, 400)
+
+    def test_facility_availability_query_count_independent_of_pitches(self):
+        """Test lịch trống toàn cơ sở có số query cố định theo số sân"""
+        self._create_slots(3)
+        url = reverse('ajax_facility_availability', args=[self.facility.id])
+        params = {'date': self.booking_date.isoformat()}
+
+        with self.assertNumQueries(4):
+            self.client.get(url, params)
+
+        time_slots = list(TimeSlot.objects.all())
+        for i in range(5):
+            pitch = Pitch.objects.create(
+                name=f'Extra {i}',
+                facility=self.facility,
+                pitch_type=self.pitch_type,
+                base_price_per_hour=Decimal('100.00')
+            )
+            for time_slot in time_slots:
+                PitchTimeSlot.objects.create(pitch=pitch, time_slot=time_slot)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.json()['pitches']), 6)
+
+    def test_facility_detail_marks_booked_slots(self):
+        """Test trang cơ sở gắn trạng thái khung giờ cho từng sân"""
+        slots = self._create_slots(2)
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=slots[0],
+            booking_date=self.booking_date
+        )
+
+        response = self.client.get(
+            reverse('facility_detail', args=[self.facility.id]),
+            {'date': self.booking_date.isoformat()})
+        pitch = response.context['pitches'][0]
+        self.assertEqual(
+            [slot.is_booked for slot in pitch.slots_on_date], [True, False])
+
+
+# ===== DailySlotLedger Tests =====
+class DailySlotLedgerTests(TestCase):
+    """Test sổ cái khung giờ được đồng bộ với Booking"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            address='123 Test St'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slot = TimeSlot.objects.create(
+            name="7h-9h",
+            start_time=time(7, 0),
+            end_time=time(9, 0)
+        )
+        self.pitch_time_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=self.time_slot
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def _ledger(self, booking_date=None):
+        return DailySlotLedger.objects.get(
+            pitch=self.pitch, booking_date=booking_date or self.booking_date)
+
+    def _create_booking(self, **kwargs):
+        return Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date,
+            **kwargs
+        )
+
+    def test_booking_create_occupies_slot(self):
+        """Test tạo booking ghi khung giờ vào sổ cái"""
+        self._create_booking()
+        ledger = self._ledger()
+        self.assertEqual(ledger.occupied_slot_ids, [self.pitch_time_slot.id])
+        self.assertEqual(ledger.occupied_count, 1)
+
+    def test_status_transition_frees_slot(self):
+        """Test hủy booking giải phóng khung giờ trong sổ cái"""
+        booking = self._create_booking()
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = BookingStatus.CANCELLED
+        booking.save(update_fields=['status'])
+        self.assertEqual(self._ledger().occupied_slot_ids, [])
+
+    def test_date_change_updates_both_days(self):
+        """Test đổi ngày booking cập nhật cả ngày cũ và ngày mới"""
+        booking = Booking.objects.get(pk=self._create_booking().pk)
+        new_date = self.booking_date + timedelta(days=1)
+        booking.booking_date = new_date
+        booking.save()
+        self.assertEqual(self._ledger().occupied_count, 0)
+        self.assertEqual(self._ledger(new_date).occupied_count, 1)
+
+    def test_booking_delete_frees_slot(self):
+        """Test xoá booking giải phóng khung giờ trong sổ cái"""
+        self._create_booking().delete()
+        self.assertEqual(self._ledger().occupied_count, 0)
+
+    def test_pitch_delete_with_bookings(self):
+        """Test xoá sân còn booking không dựng lại sổ cái cho sân đã xoá"""
+        self._create_booking()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pitch.delete()
+        self.assertFalse(DailySlotLedger.objects.exists())
+        connection.check_constraints()
+
+    def test_facility_delete_with_bookings(self):
+        """Test xoá cơ sở kéo theo sân và booking mà không lỗi khoá ngoại"""
+        self._create_booking()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.facility.delete()
+        self.assertFalse(Pitch.objects.exists())
+        self.assertFalse(DailySlotLedger.objects.exists())
+        connection.check_constraints()
+
+    def test_user_delete_frees_slot_after_commit(self):
+        """Test xoá user kéo theo booking, sổ cái được dựng lại sau commit"""
+        self._create_booking()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self._ledger().occupied_count, 0)
+
+    def test_rebuild_locks_ledger_rows_before_reading(self):
+        """Test có FOR UPDATE thì tạo + khoá dòng sổ cái trước khi đọc Booking"""
+        # SQLite không hiểu cú pháp FOR UPDATE: bật nhánh khoá nhưng bỏ mệnh đề
+        with mock.patch.object(
+                connection.features, 'has_select_for_update', True), \
+                mock.patch.object(
+                    connection.ops, 'for_update_sql', return_value=''), \
+                CaptureQueriesContext(connection) as ctx:
+            self._create_booking()
+
+        statements = [
+            q['sql'] for q in ctx.captured_queries
+            if 'main_dailyslotledger' in q['sql'] or
+            q['sql'].startswith('SELECT "main_booking"')
+        ]
+        self.assertTrue(statements[0].startswith('INSERT OR IGNORE'))
+        self.assertTrue(statements[1].startswith('SELECT "main_dailyslotledger"'))
+        self.assertTrue(statements[2].startswith('SELECT "main_booking"'))
+        self.assertEqual(self._ledger().occupied_slot_ids, [self.pitch_time_slot.id])
+
+    def test_rebuild_command_repairs_ledger(self):
+        """Test lệnh rebuild_slot_ledger dựng lại sổ cái từ Booking"""
+        self._create_booking()
+        DailySlotLedger.objects.all().delete()
+
+        call_command('rebuild_slot_ledger', stdout=StringIO())
+        self.assertEqual(
+            self._ledger().occupied_slot_ids, [self.pitch_time_slot.id])
+
+    def test_pitch_list_date_filter_hides_full_pitches(self):
+        """Test lọc theo ngày ẩn sân đã kín lịch"""
+        self._create_booking()
+        response = self.client.get(
+            reverse('pitch_list'),
+            {'booking_date': self.booking_date.isoformat()})
+        self.assertEqual(len(response.context['pitches']), 0)
+
+        response = self.client.get(
+            reverse('pitch_list'),
+            {'booking_date': (self.booking_date + timedelta(days=1)).isoformat()})
+        self.assertEqual(len(response.context['pitches']), 1)
+
+
+# ===== Availability Cache Tests =====
+class AvailabilityCacheTests(TestCase):
+    """Test cache tình trạng trống và cơ chế invalidate theo signal"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slot = TimeSlot.objects.create(
+            name="7h-9h",
+            start_time=time(7, 0),
+            end_time=time(9, 0)
+        )
+        self.pitch_time_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=self.time_slot
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def test_second_read_is_served_from_cache(self):
+        """Test lần đọc thứ hai không chạm database và được tính là hit"""
+        get_booked_slot_ids(self.pitch, self.booking_date)
+        with self.assertNumQueries(0):
+            get_booked_slot_ids(self.pitch, self.booking_date)
+        self.assertEqual(get_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_booking_save_invalidates_cache(self):
+        """Test tạo và hủy booking làm mới dữ liệu đã cache"""
+        self.assertEqual(get_booked_slot_ids(self.pitch, self.booking_date), set())
+
+        booking = Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date
+        )
+        self.assertEqual(
+            get_booked_slot_ids(self.pitch, self.booking_date),
+            {self.pitch_time_slot.id})
+
+        booking.status = BookingStatus.CANCELLED
+        booking.save(update_fields=['status'])
+        self.assertEqual(get_booked_slot_ids(self.pitch, self.booking_date), set())
+
+    def test_booking_delete_invalidates_cache(self):
+        """Test xoá booking làm mới dữ liệu đã cache"""
+        booking = Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date
+        )
+        get_booked_slot_ids(self.pitch, self.booking_date)
+        booking.delete()
+        self.assertEqual(get_booked_slot_ids(self.pitch, self.booking_date), set())
+
+
+# ===== Booking Slot Constraint Tests =====
+class BookingSlotConstraintTests(TestCase):
+    """Test ràng buộc UNIQUE chống đặt trùng khung giờ"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slot = TimeSlot.objects.create(
+            name="7h-9h",
+            start_time=time(7, 0),
+            end_time=time(9, 0)
+        )
+        self.pitch_time_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=self.time_slot
+        )
+        self.voucher = Voucher.objects.create(
+            code="TEST10",
+            discount_percent=10,
+            is_active=True
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def _book(self, user, **kwargs):
+        return Booking.objects.create(
+            user=user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date,
+            **kwargs
+        )
+
+    def test_second_active_booking_is_rejected(self):
+        """Test booking thứ hai cùng khung giờ bị từ chối bằng ValidationError"""
+        self._book(self.user)
+        with self.assertRaises(ValidationError) as ctx:
+            self._book(self.other_user)
+        self.assertIn('time_slot', ctx.exception.message_dict)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_conflict_does_not_redeem_voucher(self):
+        """Test booking bị trùng không làm tăng used_count của voucher"""
+        self._book(self.user)
+        with self.assertRaises(ValidationError):
+            self._book(self.other_user, voucher=self.voucher)
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 0)
+
+    def test_cancelled_booking_frees_slot(self):
+        """Test booking đã hủy không chiếm khung giờ"""
+        booking = self._book(self.user)
+        booking.status = BookingStatus.CANCELLED
+        booking.save(update_fields=['status'])
+
+        self._book(self.other_user)
+        self.assertEqual(
+            Booking.objects.filter(
+                status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED]
+            ).count(), 1)
+
+    def test_constraint_enforced_by_database(self):
+        """Test ràng buộc vẫn chặn khi bỏ qua Booking.save()"""
+        self._book(self.user)
+        duplicate = Booking(
+            user=self.other_user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date,
+            duration_hours=Decimal('2.00'),
+            final_price=Decimal('200.00')
+        )
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Booking.objects.bulk_create([duplicate])
+
+    def test_is_slot_conflict_matches_only_slot_constraint(self):
+        """Test chỉ lỗi trùng khung giờ mới bị đổi thành ValidationError"""
+        self._book(self.user)
+        duplicate = Booking(
+            user=self.other_user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date,
+            duration_hours=Decimal('2.00'),
+            final_price=Decimal('200.00')
+        )
+        with self.assertRaises(IntegrityError) as ctx:
+            with transaction.atomic():
+                Booking.objects.bulk_create([duplicate])
+        self.assertTrue(is_slot_conflict(ctx.exception))
+
+        self.assertFalse(is_slot_conflict(IntegrityError(
+            'NOT NULL constraint failed: main_booking.time_slot_id')))
+        with self.assertRaises(IntegrityError) as ctx:
+            with transaction.atomic():
+                User.objects.create(username='testuser')
+        self.assertFalse(is_slot_conflict(ctx.exception))
+
+    def test_clean_rejects_closed_slot(self):
+        """Test clean() từ chối khung giờ đang đóng"""
+        self.pitch_time_slot.is_available = False
+        self.pitch_time_slot.save()
+        booking = Booking(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date
+        )
+        with self.assertRaises(ValidationError):
+            booking.clean()
+
+
+# ===== Booking Save Path Tests =====
+class BookingSavePathTests(TestCase):
+    """Test số query của từng nhánh trong Booking.save()"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slot = TimeSlot.objects.create(
+            name="7h-9h",
+            start_time=time(7, 0),
+            end_time=time(9, 0)
+        )
+        self.pitch_time_slot = PitchTimeSlot.objects.select_related(
+            'time_slot').get(
+            pk=PitchTimeSlot.objects.create(
+                pitch=self.pitch, time_slot=self.time_slot).pk)
+        self.voucher = Voucher.objects.create(
+            code="TEST10",
+            discount_percent=10,
+            is_active=True
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def _new_booking(self, **kwargs):
+        return Booking(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=self.booking_date,
+            **kwargs
+        )
+
+    def test_create_uses_loaded_objects(self):
+        """Test tạo booking: savepoint, insert, đọc + ghi sổ cái, release"""
+        booking = self._new_booking()
+        with self.assertNumQueries(5):
+            booking.save()
+        self.assertEqual(booking.final_price, Decimal('200.00'))
+
+    def test_create_with_voucher_adds_one_update(self):
+        """Test voucher chỉ tốn thêm 2 câu: ghi lượt dùng và UPDATE used_count"""
+        booking = self._new_booking(voucher=self.voucher)
+        with self.assertNumQueries(7):
+            booking.save()
+        self.assertEqual(booking.final_price, Decimal('180.00'))
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 1)
+
+    def test_status_transition_skips_pricing_and_validation(self):
+        """Test duyệt booking đã load không query khung giờ/sân"""
+        self._new_booking().save()
+        booking = Booking.objects.get()
+        booking.status = BookingStatus.CONFIRMED
+        # savepoint, update, đọc + ghi sổ cái, release
+        with self.assertNumQueries(5):
+            booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.CONFIRMED)
+
+    def test_status_transition_keeps_price(self):
+        """Test đổi trạng thái không tính lại giá dù giá sân đã đổi"""
+        self._new_booking().save()
+        Pitch.objects.filter(pk=self.pitch.pk).update(
+            base_price_per_hour=Decimal('500.00'))
+        booking = Booking.objects.get()
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.final_price, Decimal('200.00'))
+
+    def test_note_change_skips_ledger(self):
+        """Test sửa ghi chú không đụng tới sổ cái"""
+        self._new_booking().save()
+        booking = Booking.objects.get()
+        booking.note = 'Mang thêm bóng'
+        # savepoint, update, release
+        with self.assertNumQueries(3):
+            booking.save()
+
+    def test_changing_slot_revalidates(self):
+        """Test đổi sang khung giờ đang đóng vẫn bị validate"""
+        self._new_booking().save()
+        closed_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=TimeSlot.objects.create(
+                name="9h-11h", start_time=time(9, 0), end_time=time(11, 0)),
+            is_available=False
+        )
+        booking = Booking.objects.get()
+        booking.time_slot = closed_slot
+        with self.assertRaises(ValidationError):
+            booking.save()
+
+
+# ===== Booking Cart Tests =====
+class BookingCartTests(TestCase):
+    """Test đặt nhiều khung giờ trong 1 lần checkout"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            role=constants.ROLE_USER
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Pitch 2',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('150.00')
+        )
+        self.morning = TimeSlot.objects.create(
+            name="7h-9h", start_time=time(7, 0), end_time=time(9, 0))
+        self.late_morning = TimeSlot.objects.create(
+            name="9h-11h", start_time=time(9, 0), end_time=time(11, 0))
+        self.slot_a = PitchTimeSlot.objects.create(
+            pitch=self.pitch, time_slot=self.morning)
+        self.slot_b = PitchTimeSlot.objects.create(
+            pitch=self.pitch, time_slot=self.late_morning)
+        self.slot_c = PitchTimeSlot.objects.create(
+            pitch=self.other_pitch, time_slot=self.morning)
+        self.voucher = Voucher.objects.create(
+            code="TEST10", discount_percent=10, is_active=True)
+        self.booking_date = date.today() + timedelta(days=1)
+        self.items = [
+            (self.slot_a.id, self.booking_date),
+            (self.slot_b.id, self.booking_date),
+            (self.slot_c.id, self.booking_date),
+        ]
+        cache.clear()
+
+    def test_checkout_creates_all_bookings(self):
+        """Test checkout tạo đủ booking với giá đúng và cập nhật sổ cái"""
+        bookings = checkout_cart(self.user, self.items)
+
+        self.assertEqual(len(bookings), 3)
+        self.assertTrue(all(booking.pk for booking in bookings))
+        self.assertEqual(
+            sorted(booking.final_price for booking in bookings),
+            [Decimal('200.00'), Decimal('200.00'), Decimal('300.00')])
+        self.assertEqual(
+            get_booked_slot_ids(self.pitch, self.booking_date),
+            {self.slot_a.id, self.slot_b.id})
+
+    def test_checkout_query_count_independent_of_cart_size(self):
+        """Test số query không tăng theo số khung giờ trong giỏ"""
+        # slot, sổ cái, savepoint, insert, đọc + ghi sổ cái, release
+        with self.assertNumQueries(7):
+            checkout_cart(self.user, self.items)
+
+    def test_voucher_counted_once(self):
+        """Test voucher giảm giá mọi booking nhưng chỉ tính 1 lượt dùng"""
+        bookings = checkout_cart(self.user, self.items, voucher=self.voucher)
+
+        self.assertTrue(all(b.voucher_id == self.voucher.id for b in bookings))
+        self.assertIn(Decimal('180.00'), [b.final_price for b in bookings])
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 1)
+
+    def test_conflict_rejects_whole_cart(self):
+        """Test 1 khung giờ đã bị đặt thì không tạo booking nào"""
+        Booking.objects.create(
+            user=self.other_user,
+            pitch=self.other_pitch,
+            time_slot=self.slot_c,
+            booking_date=self.booking_date
+        )
+        with self.assertRaises(ValidationError):
+            checkout_cart(self.user, self.items, voucher=self.voucher)
+
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 0)
+
+    def test_checkout_view_sends_one_email(self):
+        """Test checkout qua view xóa giỏ và gửi 1 email chung"""
+        self.client.login(username='testuser', password='testpass123')
+        for time_slot_id, booking_date in self.items:
+            slot = PitchTimeSlot.objects.get(pk=time_slot_id)
+            self.client.post(
+                reverse('booking_cart_add', args=[slot.pitch_id]),
+                {'time_slot': time_slot_id,
+                 'booking_date': booking_date.isoformat()})
+
+        response = self.client.post(reverse('booking_cart_checkout'))
+
+        self.assertRedirects(response, reverse('user_booking_list'))
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 3)
+        # Email nằm trong hàng đợi, worker gửi đúng 1 email
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        deliver_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            self.client.session[constants.CART_SESSION_KEY], [])
+
+
+    def _checkout_messages(self, voucher_code):
+        self.client.login(username='testuser', password='testpass123')
+        for time_slot_id, booking_date in self.items:
+            slot = PitchTimeSlot.objects.get(pk=time_slot_id)
+            self.client.post(
+                reverse('booking_cart_add', args=[slot.pitch_id]),
+                {'time_slot': time_slot_id,
+                 'booking_date': booking_date.isoformat()})
+        response = self.client.post(
+            reverse('booking_cart_checkout'),
+            {'voucher_code': voucher_code}, follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def test_checkout_view_reports_voucher_after_success(self):
+        """Test chỉ báo đã áp dụng voucher khi đặt giỏ thành công"""
+        applied = constants.MSG_VOUCHER_APPLIED.format(discount_percent=10)
+        Booking.objects.create(
+            user=self.other_user,
+            pitch=self.other_pitch,
+            time_slot=self.slot_c,
+            booking_date=self.booking_date
+        )
+        self.assertNotIn(applied, self._checkout_messages('TEST10'))
+
+        Booking.objects.filter(user=self.other_user).delete()
+        self.assertIn(applied, self._checkout_messages('TEST10'))
+
+
+# ===== Booking Series Tests =====
+class BookingSeriesTests(TestCase):
+    """Test lịch đặt định kỳ hằng tuần"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            role=constants.ROLE_USER
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slot = TimeSlot.objects.create(
+            name="7h-9h", start_time=time(7, 0), end_time=time(9, 0))
+        PitchTimeSlot.objects.create(pitch=self.pitch, time_slot=self.time_slot)
+        self.pitch_time_slot = PitchTimeSlot.objects.select_related(
+            'pitch', 'time_slot').get(pitch=self.pitch)
+        self.start_date = date.today() + timedelta(days=1)
+        cache.clear()
+
+    def test_series_expands_weekly(self):
+        """Test lịch tạo đủ số buổi, mỗi buổi cách nhau 7 ngày"""
+        series, bookings, conflicts = create_booking_series(
+            self.user, self.pitch_time_slot, self.start_date, 4)
+
+        self.assertEqual(conflicts, [])
+        self.assertEqual(
+            [booking.booking_date for booking in bookings],
+            [self.start_date + timedelta(weeks=i) for i in range(4)])
+        self.assertEqual(series.bookings.count(), 4)
+        self.assertTrue(all(b.final_price == Decimal('200.00') for b in bookings))
+
+    def test_conflicting_dates_are_skipped(self):
+        """Test ngày đã có người đặt bị bỏ qua và được báo lại"""
+        taken = self.start_date + timedelta(weeks=2)
+        Booking.objects.create(
+            user=self.other_user,
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=taken
+        )
+        series, bookings, conflicts = create_booking_series(
+            self.user, self.pitch_time_slot, self.start_date, 4)
+
+        self.assertEqual(conflicts, [taken])
+        self.assertEqual(len(bookings), 3)
+        self.assertNotIn(taken, [booking.booking_date for booking in bookings])
+
+    def test_query_count_independent_of_weeks(self):
+        """Test số query không tăng theo số tuần"""
+        # kiểm tra trùng, savepoint, series, bulk insert, đọc + ghi sổ cái, release
+        with self.assertNumQueries(7):
+            create_booking_series(
+                self.user, self.pitch_time_slot, self.start_date, 12)
+
+    def test_cancel_series_updates_upcoming_bookings(self):
+        """Test hủy lịch hủy mọi buổi sắp tới và giải phóng khung giờ"""
+        series, bookings, _ = create_booking_series(
+            self.user, self.pitch_time_slot, self.start_date, 3)
+        self.assertIn(
+            self.pitch_time_slot.id,
+            get_booked_slot_ids(self.pitch, self.start_date))
+
+        cancelled = cancel_booking_series(series)
+
+        self.assertEqual(cancelled, 3)
+        self.assertFalse(series.is_active)
+        self.assertEqual(
+            series.bookings.filter(status=BookingStatus.CANCELLED).count(), 3)
+        self.assertEqual(get_booked_slot_ids(self.pitch, self.start_date), set())
+
+    def test_cancel_series_keeps_confirmed_and_today(self):
+        """Test hủy lịch chỉ hủy buổi đang chờ từ ngày mai, như user tự hủy"""
+        series, bookings, _ = create_booking_series(
+            self.user, self.pitch_time_slot, date.today(), 3)
+        today, confirmed, pending = bookings
+        Booking.objects.filter(pk=confirmed.pk).update(
+            status=BookingStatus.CONFIRMED)
+
+        cancelled = cancel_booking_series(series)
+
+        self.assertEqual(cancelled, 1)
+        statuses = dict(series.bookings.values_list('pk', 'status'))
+        self.assertEqual(statuses[today.pk], BookingStatus.PENDING)
+        self.assertEqual(statuses[confirmed.pk], BookingStatus.CONFIRMED)
+        self.assertEqual(statuses[pending.pk], BookingStatus.CANCELLED)
+        self.assertEqual(
+            list(EmailOutbox.objects.values_list('subject', flat=True)),
+            [constants.EMAIL_SUBJECT_BOOKING_CANCELLATION.format(
+                booking_id=pending.pk)])
+
+    def test_create_view_preview_does_not_book(self):
+        """Test bước xem trước chỉ báo lịch trống, không tạo booking"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.post(
+            reverse('booking_series_create', args=[self.pitch.id]),
+            {
+                'time_slot': self.pitch_time_slot.id,
+                'start_date': self.start_date.isoformat(),
+                'weeks': 3,
+                'form_action': 'preview',
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['preview']), 3)
+        self.assertFalse(Booking.objects.exists())
+
+
+# ===== Pitch List Availability Tests =====
+class PitchListAvailabilityTests(TestCase):
+    """Test lọc và sắp xếp danh sách sân theo số khung giờ trống"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.small_pitch = Pitch.objects.create(
+            name='A Pitch',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.big_pitch = Pitch.objects.create(
+            name='B Pitch',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.time_slots = [
+            TimeSlot.objects.create(
+                name=f"{hour}h-{hour + 1}h",
+                start_time=time(hour, 0),
+                end_time=time(hour + 1, 0))
+            for hour in range(7, 10)
+        ]
+        self.small_slot = PitchTimeSlot.objects.create(
+            pitch=self.small_pitch, time_slot=self.time_slots[0])
+        self.big_slots = [
+            PitchTimeSlot.objects.create(pitch=self.big_pitch, time_slot=slot)
+            for slot in self.time_slots
+        ]
+        self.booking_date = date.today() + timedelta(days=1)
+
+    def _book(self, pitch_time_slot):
+        return Booking.objects.create(
+            user=self.user,
+            pitch=pitch_time_slot.pitch,
+            time_slot=pitch_time_slot,
+            booking_date=self.booking_date
+        )
+
+    def _list(self, **params):
+        params.setdefault('booking_date', self.booking_date.isoformat())
+        response = self.client.get(reverse('pitch_list'), params)
+        return list(response.context['pitches'])
+
+    def test_free_slot_count_in_one_query(self):
+        """Test số khung giờ trống được tính bằng 1 query"""
+        self._book(self.big_slots[0])
+        with self.assertNumQueries(1):
+            counts = {
+                pitch.id: pitch.free_slot_count
+                for pitch in annotate_free_slot_count(
+                    Pitch.objects.all(), self.booking_date)
+            }
+        self.assertEqual(
+            counts, {self.small_pitch.id: 1, self.big_pitch.id: 2})
+
+    def test_booked_closed_slot_not_subtracted(self):
+        """Test booking của khung giờ đã đóng không bị trừ thêm lần nữa"""
+        self._book(self.big_slots[0])
+        self.big_slots[0].is_available = False
+        self.big_slots[0].save()
+
+        pitch = annotate_free_slot_count(
+            Pitch.objects.filter(pk=self.big_pitch.pk), self.booking_date).get()
+        self.assertEqual(pitch.free_slot_count, 2)
+
+    def test_min_free_slots_filter(self):
+        """Test lọc sân còn ít nhất N khung giờ trống"""
+        self.assertEqual(self._list(min_free_slots=2), [self.big_pitch])
+        self._book(self.big_slots[0])
+        self._book(self.big_slots[1])
+        self.assertEqual(self._list(min_free_slots=2), [])
+
+    def test_sort_by_free_slots(self):
+        """Test sắp xếp theo số khung giờ trống giảm dần"""
+        self.assertEqual(
+            self._list(sort='free_slots'), [self.big_pitch, self.small_pitch])
+
+
+# ===== Search Index Tests =====
+class SearchIndexTests(TestCase):
+    """Test tìm kiếm toàn văn sân và cơ sở"""
+
+    def setUp(self):
+        self.client = Client()
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Trung tâm Mỹ Đình',
+            address='Nam Từ Liêm, Hà Nội'
+        )
+        self.other_facility = Facility.objects.create(
+            name='Sân Thống Nhất',
+            address='Quận 10, TP HCM'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Sân cỏ nhân tạo A1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Sân futsal B2',
+            facility=self.other_facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+
+    def _search(self, query):
+        return list(search_pitches(Pitch.objects.all(), query))
+
+    def test_search_ignores_diacritics_and_matches_prefix(self):
+        """Test tìm không dấu, theo tiền tố và theo địa chỉ cơ sở"""
+        self.assertEqual(self._search('nhan tao'), [self.pitch])
+        self.assertEqual(self._search('Liêm'), [self.pitch])
+        self.assertEqual(self._search('futs'), [self.other_pitch])
+
+    def test_search_is_single_query(self):
+        """Test lọc và xếp hạng trong 1 query"""
+        with self.assertNumQueries(1):
+            self._search('san')
+
+    @skipUnless(connection.vendor == 'sqlite', 'Chỉ SQLite dùng bảng FTS5')
+    def test_rank_uses_single_index_lookup(self):
+        """Test MATCH và bm25 dùng chung 1 lần join bảng FTS5, không subquery mỗi dòng"""
+        Pitch.objects.create(
+            name='Sân cỏ nhân tạo cỏ mới',
+            facility=self.other_facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        queryset = search_pitches(Pitch.objects.all(), 'co').order_by(
+            'search_rank', 'id')
+        sql = str(queryset.query)
+
+        self.assertEqual(sql.count('MATCH'), 1)
+        self.assertNotIn('SELECT bm25', sql)
+        ranks = [pitch.search_rank for pitch in queryset]
+        self.assertEqual(len(ranks), 2)
+        self.assertEqual(ranks, sorted(ranks))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Chỉ chạy trên PostgreSQL')
+    def test_postgres_search_ranks_by_tsvector(self):
+        """Test nhánh PostgreSQL lọc không dấu và xếp hạng theo tsvector"""
+        results = list(
+            search_pitches(Pitch.objects.all(), 'nhan tao').order_by(
+                'search_rank', 'id'))
+        self.assertEqual(results, [self.pitch])
+        self.assertLess(results[0].search_rank, 0)
+        self.assertEqual(self._search('thong nhat'), [self.other_pitch])
+
+    def test_special_characters_are_escaped(self):
+        """Test ký tự đặc biệt của FTS5 không gây lỗi cú pháp"""
+        self.assertEqual(self._search('"A1 *'), [self.pitch])
+        self.assertEqual(self._search('NEAR(('), [])
+
+    def test_punctuation_only_query_matches_nothing(self):
+        """Test từ khóa chỉ có dấu câu không trả về mọi sân"""
+        self.assertEqual(self._search('"'), [])
+        self.assertEqual(self._search('!!!'), [])
+        self.assertEqual(
+            list(search_facilities(Facility.objects.all(), '"')), [])
+
+        response = self.client.get(reverse('pitch_list'), {'q': '"'})
+        self.assertEqual(len(response.context['pitches']), 0)
+        response = self.client.get(reverse('ajax_autocomplete'), {'q': '"'})
+        self.assertEqual(response.json()['pitches'], [])
+        self.assertEqual(response.json()['facilities'], [])
+
+    def test_index_follows_renames(self):
+        """Test đổi tên sân/cơ sở cập nhật index qua signal"""
+        self.pitch.name = 'Sân bóng rổ'
+        self.pitch.save()
+        self.assertEqual(self._search('nhan tao'), [])
+        self.assertEqual(self._search('bong ro'), [self.pitch])
+
+        self.other_facility.address = 'Quận Tân Bình'
+        self.other_facility.save()
+        self.assertEqual(self._search('tan binh'), [self.other_pitch])
+
+    def test_deleted_pitch_leaves_index(self):
+        """Test xoá sân xoá luôn dòng trong index"""
+        self.pitch.delete()
+        self.assertEqual(self._search('nhan tao'), [])
+
+    def test_rebuild_command(self):
+        """Test lệnh rebuild_search_index dựng lại index"""
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM main_pitch_search")
+        self.assertEqual(self._search('futsal'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('futsal'), [self.other_pitch])
+
+    def test_home_searches_facilities(self):
+        """Test trang chủ tìm cơ sở theo tên và địa chỉ"""
+        response = self.client.get(reverse('home'), {'q': 'ha noi'})
+        self.assertEqual(list(response.context['facilities']), [self.facility])
+
+    def test_search_folds_d_stroke(self):
+        """Test "dinh" khớp "Đình" (đ được chuyển thành d)"""
+        self.assertEqual(self._search('my dinh'), [self.pitch])
+        response = self.client.get(reverse('home'), {'q': 'my dinh'})
+        self.assertEqual(list(response.context['facilities']), [self.facility])
+
+
+# ===== Search Key Tests =====
+
+
+class SearchKeyTests(TestCase):
+    """Test cột search_key không dấu của sân và cơ sở"""
+
+    def setUp(self):
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Sân Phú Thịnh',
+            address='Đống Đa, Hà Nội'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Sân Đồng Xanh',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+
+    def test_normalize_search_text(self):
+        """Test bỏ dấu, đ -> d, viết thường và gộp khoảng trắng"""
+        self.assertEqual(
+            normalize_search_text('  Sân  PHÚ Thịnh '), 'san phu thinh')
+        self.assertEqual(normalize_search_text('Đống Đa'), 'dong da')
+        self.assertEqual(normalize_search_text(None), '')
+
+    def test_search_key_maintained_on_save(self):
+        """Test search_key được tính lại khi lưu, kể cả với update_fields"""
+        self.assertEqual(self.facility.search_key, 'san phu thinh dong da, ha noi')
+        self.assertEqual(self.pitch.search_key, 'san dong xanh')
+
+        self.pitch.name = 'Sân Mỹ Đình'
+        self.pitch.save(update_fields=['name'])
+        self.pitch.refresh_from_db()
+        self.assertEqual(self.pitch.search_key, 'san my dinh')
+
+    def test_pitch_list_matches_without_accents(self):
+        """Test trang danh sách sân tìm được khi gõ không dấu"""
+        response = self.client.get(reverse('pitch_list'), {'q': 'san phu thinh'})
+        self.assertIn(self.pitch, list(response.context['pitches']))
+
+    def test_backfill_command(self):
+        """Test lệnh backfill_search_keys điền search_key còn trống"""
+        Pitch.objects.update(search_key='')
+        Facility.objects.update(search_key='')
+
+        call_command('backfill_search_keys', stdout=StringIO())
+
+        self.pitch.refresh_from_db()
+        self.facility.refresh_from_db()
+        self.assertEqual(self.pitch.search_key, 'san dong xanh')
+        self.assertEqual(self.facility.search_key, 'san phu thinh dong da, ha noi')
+        self.assertEqual(
+            list(search_pitches(Pitch.objects.all(), 'dong xanh')), [self.pitch])
+
+
+# ===== Autocomplete Tests =====
+
+
+class AutocompleteTests(TestCase):
+    """Test gợi ý tìm kiếm khi gõ"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('ajax_autocomplete')
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Trung tâm Mỹ Đình',
+            address='Nam Từ Liêm, Hà Nội'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Sân Mỹ Đình 1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Sân cỏ Mỹ Đình',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+
+    def test_prefix_matches_come_first(self):
+        """Test tên bắt đầu bằng tiền tố đứng trước tên chỉ có 1 từ khớp"""
+        response = self.client.get(self.url, {'q': 'san my'})
+        data = response.json()
+        self.assertEqual(
+            [item['id'] for item in data['pitches']],
+            [self.pitch.id, self.other_pitch.id])
+
+        response = self.client.get(self.url, {'q': 'my dinh'})
+        self.assertEqual(response.json()['facilities'][0]['url'], reverse(
+            'facility_detail', args=[self.facility.id]))
+
+    def test_accent_insensitive_and_cache_control(self):
+        """Test gõ không dấu vẫn gợi ý và response có Cache-Control"""
+        response = self.client.get(self.url, {'q': 'trung tam'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.json()['facilities']],
+            [self.facility.id])
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_empty_query_returns_nothing(self):
+        """Test tiền tố rỗng không query database"""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': '  '})
+        self.assertEqual(response.json()['pitches'], [])
+
+    def test_results_are_cached_per_prefix(self):
+        """Test cùng tiền tố (có dấu/không dấu) đọc từ cache"""
+        self.client.get(self.url, {'q': 'Sân'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'san'})
+        self.assertEqual(len(response.json()['pitches']), 2)
+
+    def test_cache_invalidated_on_save(self):
+        """Test lưu sân bỏ cache gợi ý cũ"""
+        response = self.client.get(self.url, {'q': 'thong'})
+        self.assertEqual(response.json()['pitches'], [])
+
+        self.other_pitch.name = 'Sân Thống Nhất'
+        self.other_pitch.save()
+
+        response = self.client.get(self.url, {'q': 'thong'})
+        self.assertEqual(
+            [item['id'] for item in response.json()['pitches']],
+            [self.other_pitch.id])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Kế hoạch query của SQLite')
+    def test_prefix_lookup_searches_index(self):
+        """Test tìm tiền tố dùng khoảng trên index search_key, không quét cả index"""
+        plan = Pitch.objects.filter(
+            prefix_range_q('search_key', 'san my')
+        ).order_by('search_key', 'id').explain()
+
+        self.assertIn('SEARCH', plan)
+        self.assertIn('search_key>? AND search_key<?', plan)
+        self.assertNotIn('SCAN', plan)
+        self.assertEqual(
+            list(Pitch.objects.filter(prefix_range_q('search_key', 'san my'))
+                 .order_by('id')),
+            [self.pitch])
+
+    def test_cache_key_is_memcached_safe(self):
+        """Test tiền tố có khoảng trắng không làm cache key không hợp lệ"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.client.get(self.url, {'q': 'san my dinh'})
+
+    def test_post_not_allowed(self):
+        """Test chỉ nhận GET"""
+        response = self.client.post(self.url, {'q': 'san'})
+        self.assertEqual(response.status_code, 405)
+
+
+# ===== Keyset Pagination Tests =====
+
+
+class KeysetPaginationTests(TestCase):
+    """Test phân trang theo cursor"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            role=constants.ROLE_USER
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        # Tên trùng nhau để id phải phân xử thứ tự
+        self.pitches = [
+            Pitch.objects.create(
+                name=f'Sân {i // 2}',
+                pitch_type=self.pitch_type,
+                base_price_per_hour=Decimal('100.00')
+            )
+            for i in range(7)
+        ]
+        time_slot = TimeSlot.objects.create(
+            name="7h-9h", start_time=time(7, 0), end_time=time(9, 0))
+        self.pitch_time_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitches[0], time_slot=time_slot)
+        start = date.today() + timedelta(days=1)
+        for i in range(5):
+            Booking.objects.create(
+                user=self.user,
+                pitch=self.pitches[0],
+                time_slot=self.pitch_time_slot,
+                booking_date=start + timedelta(days=i % 3 * 7 + i)
+            )
+        # Cùng created_at để kiểm tra phân xử bằng id
+        Booking.objects.update(created_at=timezone.now())
+
+    def _walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_forward_and_backward_walk(self):
+        """Test đi hết các trang rồi quay lại không trùng, không sót"""
+        paginator = KeysetPaginator(
+            Pitch.objects.all(), ('name', 'id'), per_page=3)
+        pages = self._walk(paginator)
+        expected = list(Pitch.objects.order_by('name', 'id'))
+
+        self.assertEqual([p for page in pages for p in page], expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertFalse(pages[-1].has_next())
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
+        self.assertTrue(previous.has_next())
+
+    def test_descending_ordering_with_ties(self):
+        """Test thứ tự (-booking_date, -created_at, id) của danh sách booking"""
+        ordering = ('-booking_date', '-created_at', 'id')
+        paginator = KeysetPaginator(Booking.objects.all(), ordering, per_page=2)
+        walked = [b for page in self._walk(paginator) for b in page]
+        self.assertEqual(walked, list(Booking.objects.order_by(*ordering)))
+
+    def test_each_page_is_one_query(self):
+        """Test trang sâu chỉ 1 query, không COUNT/OFFSET"""
+        paginator = KeysetPaginator(
+            Pitch.objects.all(), ('name', 'id'), per_page=3)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1) as ctx:
+            paginator.page(cursor)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT', sql)
+
+    def test_invalid_or_foreign_cursor(self):
+        """Test cursor sai hoặc của thứ tự khác bị từ chối"""
+        paginator = KeysetPaginator(
+            Pitch.objects.all(), ('name', 'id'), per_page=3)
+        other = KeysetPaginator(
+            Pitch.objects.all(), ('-name', '-id'), per_page=3)
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-cursor')
+        with self.assertRaises(InvalidCursor):
+            paginator.page(other.page().next_cursor)
+        self.assertEqual(
+            list(paginator.get_page('not-a-cursor')), list(paginator.page()))
+
+    def test_approximate_count(self):
+        """Test đếm có giới hạn"""
+        paginator = KeysetPaginator(
+            Pitch.objects.all(), ('name', 'id'), per_page=3,
+            with_count=True, count_limit=5)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.count_is_exact)
+
+        paginator = KeysetPaginator(
+            Pitch.objects.all(), ('name', 'id'), per_page=3, with_count=True)
+        self.assertEqual(paginator.count, 7)
+        self.assertTrue(paginator.count_is_exact)
+
+    def test_pitch_list_uses_cursor_and_keeps_page_mode(self):
+        """Test danh sách sân mặc định dùng cursor, ?page=N vẫn dùng được"""
+        response = self.client.get(reverse('pitch_list'))
+        page = response.context['pitches']
+        self.assertTrue(page.is_cursor_page)
+        self.assertEqual(len(page), constants.ITEMS_PER_PAGE)
+
+        response = self.client.get(
+            reverse('pitch_list'), {'cursor': page.next_cursor})
+        self.assertEqual(
+            list(response.context['pitches']),
+            list(Pitch.objects.order_by('name', 'id'))[constants.ITEMS_PER_PAGE:])
+
+        response = self.client.get(reverse('pitch_list'), {'page': 2})
+        self.assertEqual(response.context['pitches'].number, 2)
+
+    def test_user_booking_list_cursor(self):
+        """Test danh sách booking của user phân trang theo cursor"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('user_booking_list'))
+        page = response.context['page_obj']
+        self.assertTrue(page.is_cursor_page)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_other_pages())
+
+    def test_admin_booking_list_cursor(self):
+        """Test trang quản lý đơn phân trang theo cursor, có tổng số đơn"""
+        User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role=constants.ROLE_ADMIN
+        )
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('admin_booking_list'))
+        page = response.context['bookings']
+        self.assertTrue(page.is_cursor_page)
+        self.assertEqual(page.paginator.count, 5)
+        self.assertContains(response, 'Tổng: 5 đơn')
+
+
+# ===== Pitch Rating Tests =====
+
+
+class PitchRatingTests(TestCase):
+    """Test điểm đánh giá trung bình lưu sẵn trên sân"""
+
+    def setUp(self):
+        self.client = Client()
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Pitch 2',
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@example.com',
+                password='testpass123',
+                role=constants.ROLE_USER
+            )
+            for i in range(3)
+        ]
+        time_slot = TimeSlot.objects.create(
+            name="7h-9h", start_time=time(7, 0), end_time=time(9, 0))
+        self.pitch_time_slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch, time_slot=time_slot)
+
+    def _rating(self, pitch):
+        pitch.refresh_from_db()
+        return round(pitch.rating_avg, 2), pitch.rating_count
+
+    def test_create_edit_delete_updates_aggregate(self):
+        """Test tạo, sửa, xoá review cập nhật trung bình và số lượng"""
+        first = Review.objects.create(
+            user=self.users[0], pitch=self.pitch, rating=5, content='a')
+        Review.objects.create(
+            user=self.users[1], pitch=self.pitch, rating=2, content='b')
+        self.assertEqual(self._rating(self.pitch), (3.5, 2))
+
+        first.rating = 3
+        first.save()
+        self.assertEqual(self._rating(self.pitch), (2.5, 2))
+
+        first.delete()
+        self.assertEqual(self._rating(self.pitch), (2.0, 1))
+
+        Review.objects.get(user=self.users[1]).delete()
+        self.assertEqual(self._rating(self.pitch), (0.0, 0))
+
+    def test_pitch_save_does_not_overwrite_rating(self):
+        """Test lưu instance sân cũ không ghi đè điểm mới"""
+        stale = Pitch.objects.get(pk=self.pitch.pk)
+        Review.objects.create(
+            user=self.users[0], pitch=self.pitch, rating=4, content='a')
+        stale.name = 'Pitch 1 mới'
+        stale.save()
+        self.assertEqual(self._rating(self.pitch), (4.0, 1))
+
+    def test_cascade_delete_updates_aggregate(self):
+        """Test xoá user (cascade review) cũng trừ điểm của sân"""
+        Review.objects.create(
+            user=self.users[0], pitch=self.pitch, rating=4, content='a')
+        self.users[0].delete()
+        self.assertEqual(self._rating(self.pitch), (0.0, 0))
+
+    def test_add_review_view_updates_existing(self):
+        """Test gửi lại đánh giá qua add_review là sửa, delete_review là xoá"""
+        Booking.objects.create(
+            user=self.users[0],
+            pitch=self.pitch,
+            time_slot=self.pitch_time_slot,
+            booking_date=date.today() + timedelta(days=1),
+            status=BookingStatus.CONFIRMED
+        )
+        self.client.login(username='user0', password='testpass123')
+        url = reverse('add_review', args=[self.pitch.id])
+        self.client.post(url, {'rating': 5, 'content': 'Sân rất tốt, sạch sẽ'})
+        self.client.post(url, {'rating': 1, 'content': 'Đèn hỏng, sân trơn'})
+
+        self.assertEqual(Review.objects.filter(pitch=self.pitch).count(), 1)
+        self.assertEqual(self._rating(self.pitch), (1.0, 1))
+
+        self.client.post(reverse('delete_review', args=[self.pitch.id]))
+        self.assertEqual(self._rating(self.pitch), (0.0, 0))
+
+    def test_reconcile_command(self):
+        """Test lệnh reconcile_pitch_ratings sửa số liệu bị lệch"""
+        Review.objects.create(
+            user=self.users[0], pitch=self.pitch, rating=5, content='a')
+        Review.objects.create(
+            user=self.users[1], pitch=self.pitch, rating=4, content='b')
+        Pitch.objects.update(rating_avg=1, rating_count=9)
+
+        call_command('reconcile_pitch_ratings', stdout=StringIO())
+
+        self.assertEqual(self._rating(self.pitch), (4.5, 2))
+        self.assertEqual(self._rating(self.other_pitch), (0.0, 0))
+
+    def test_pitch_list_sort_by_rating(self):
+        """Test sắp xếp danh sách sân theo điểm đánh giá"""
+        Review.objects.create(
+            user=self.users[0], pitch=self.other_pitch, rating=5, content='a')
+        Review.objects.create(
+            user=self.users[1], pitch=self.pitch, rating=3, content='b')
+        response = self.client.get(reverse('pitch_list'), {'sort': 'rating'})
+        self.assertEqual(
+            list(response.context['pitches']), [self.other_pitch, self.pitch])
+
+
+# ===== Review Feed Tests =====
+
+
+class ReviewFeedTests(TestCase):
+    """Test danh sách đánh giá tải dần trên trang đặt sân"""
+
+    def setUp(self):
+        self.client = Client()
+        self.pitch_type = PitchType.objects.create(name='Football')
+        facility = Facility.objects.create(name='Facility', address='Hà Nội')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            facility=facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        total = constants.REVIEWS_INITIAL_COUNT + constants.REVIEWS_PER_PAGE + 2
+        for i in range(total):
+            user = User.objects.create(
+                username=f'user{i}', email=f'user{i}@example.com')
+            Review.objects.create(
+                user=user, pitch=self.pitch, rating=i % 5 + 1,
+                content=f'Đánh giá số {i}')
+        self.client.force_login(user)
+        self.expected = list(
+            Review.objects.filter(pitch=self.pitch)
+            .order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_booking_page_embeds_first_reviews(self):
+        """Test trang đặt sân chỉ nhúng vài đánh giá đầu, tổng lấy từ sân"""
+        response = self.client.get(
+            reverse('user_booking_create', args=[self.pitch.id]))
+        reviews = response.context['reviews']
+        self.assertEqual(
+            [review.id for review in reviews],
+            self.expected[:constants.REVIEWS_INITIAL_COUNT])
+        self.assertTrue(reviews.has_next())
+        self.assertContains(response, 'id="reviewFeedMore"')
+
+    def test_feed_walks_all_reviews(self):
+        """Test tải tiếp bằng cursor đến hết, không trùng, không sót"""
+        response = self.client.get(
+            reverse('user_booking_create', args=[self.pitch.id]))
+        ids = [review.id for review in response.context['reviews']]
+        cursor = response.context['reviews'].next_cursor
+        url = reverse('ajax_reviews', args=[self.pitch.id])
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            self.assertLessEqual(len(data['reviews']), constants.REVIEWS_PER_PAGE)
+            ids += [review['id'] for review in data['reviews']]
+            cursor = data['next_cursor']
+        self.assertEqual(ids, self.expected)
+
+    def test_feed_page_is_single_query(self):
+        """Test mỗi lần tải thêm: 1 query sân + 1 query đánh giá kèm user"""
+        url = reverse('ajax_reviews', args=[self.pitch.id])
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_invalid_cursor(self):
+        """Test cursor sai trả về 400"""
+        response = self.client.get(
+            reverse('ajax_reviews', args=[self.pitch.id]), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ===== Comment Thread Tests =====
+
+
+class CommentThreadTests(TestCase):
+    """Test luồng bình luận lưu theo materialized path"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='alice', email='a@example.com')
+        self.other_user = User.objects.create(username='bob', email='b@example.com')
+        pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.review = Review.objects.create(
+            user=self.user, pitch=self.pitch, rating=5, content='Tốt')
+        self.root = self._comment('root')
+        self.reply = self._comment('reply', parent=self.root, user=self.other_user)
+        self.nested = self._comment('nested', parent=self.reply)
+        self.second_root = self._comment('second root')
+
+    def _comment(self, content, parent=None, user=None):
+        return Comment.objects.create(
+            user=user or self.user, review=self.review,
+            parent_comment=parent, content=content)
+
+    def test_path_and_depth(self):
+        """Test path nối id tổ tiên, depth theo số tầng"""
+        self.nested.refresh_from_db()
+        self.assertEqual(
+            self.nested.path,
+            Comment.path_segment(self.root.id) +
+            Comment.path_segment(self.reply.id) +
+            Comment.path_segment(self.nested.id))
+        self.assertEqual(self.nested.depth, 2)
+
+    def test_thread_endpoint_is_one_comment_query(self):
+        """Test cả luồng: 1 query đánh giá + 1 query bình luận, trả về dạng cây"""
+        url = reverse('ajax_review_comments', args=[self.review.id])
+        with self.assertNumQueries(2):
+            data = self.client.get(url).json()
+
+        self.assertEqual(data['count'], 4)
+        roots = data['comments']
+        self.assertEqual([c['id'] for c in roots], [self.root.id, self.second_root.id])
+        self.assertEqual(roots[0]['reply_count'], 2)
+        self.assertEqual(roots[0]['children'][0]['author'], 'bob')
+        self.assertEqual(
+            roots[0]['children'][0]['children'][0]['id'], self.nested.id)
+
+    def test_subtree_count_and_delete_single_statement(self):
+        """Test đếm và xoá nhánh đều là 1 câu lệnh"""
+        self.root.refresh_from_db()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.root.subtree_count(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.root.delete_subtree(), 3)
+        self.assertEqual(
+            list(Comment.objects.values_list('id', flat=True)),
+            [self.second_root.id])
+
+    def test_delete_endpoint_requires_owner(self):
+        """Test chỉ chủ bình luận (hoặc admin) được xoá nhánh"""
+        url = reverse('ajax_delete_comment', args=[self.root.id])
+        self.client.force_login(self.other_user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url).json(), {'deleted': 3})
+
+    def test_parent_must_belong_to_same_review(self):
+        """Test bình luận cha phải cùng đánh giá"""
+        other_review = Review.objects.create(
+            user=self.other_user, pitch=self.pitch, rating=3, content='Tạm')
+        comment = Comment(
+            user=self.user, review=other_review,
+            parent_comment=self.root, content='x')
+        with self.assertRaises(ValidationError):
+            comment.full_clean()
+
+
+# ===== Favorite Tests =====
+
+
+class FavoriteTests(TestCase):
+    """Test API yêu thích idempotent và favorite_count"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='alice', email='a@example.com')
+        self.client.force_login(self.user)
+        pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Pitch 2',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.url = reverse('ajax_favorite', args=[self.pitch.id])
+
+    def _count(self, pitch=None):
+        return Pitch.objects.get(pk=(pitch or self.pitch).pk).favorite_count
+
+    def test_put_is_idempotent(self):
+        first = self.client.put(self.url).json()
+        second = self.client.put(self.url).json()
+
+        self.assertTrue(first['changed'])
+        self.assertFalse(second['changed'])
+        self.assertTrue(second['is_favorited'])
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user, pitch=self.pitch).count(), 1)
+        self.assertEqual(self._count(), 1)
+
+    def test_delete_is_idempotent(self):
+        add_favorite(self.user, self.pitch.id)
+
+        first = self.client.delete(self.url).json()
+        second = self.client.delete(self.url).json()
+
+        self.assertTrue(first['changed'])
+        self.assertFalse(second['changed'])
+        self.assertFalse(second['is_favorited'])
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(self._count(), 0)
+
+    def _writes(self, func, *args):
+        # Bỏ SAVEPOINT/RELEASE do TestCase bọc atomic lồng nhau
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args)
+        return result, [
+            q['sql'] for q in ctx.captured_queries
+            if 'SAVEPOINT' not in q['sql']
+        ]
+
+    def test_add_and_remove_use_single_write(self):
+        # Ghi bảng Favorite đúng 1 câu, cộng thêm 1 UPDATE bộ đếm nếu đổi;
+        # xoá đọc dòng trước để gửi signal post_delete (trừ bộ đếm)
+        added, queries = self._writes(add_favorite, self.user, self.pitch.id)
+        self.assertTrue(added)
+        self.assertEqual(len(queries), 2)
+
+        added, queries = self._writes(add_favorite, self.user, self.pitch.id)
+        self.assertFalse(added)
+        self.assertEqual(len(queries), 1)
+
+        removed, queries = self._writes(remove_favorite, self.user, self.pitch.id)
+        self.assertTrue(removed)
+        self.assertEqual(len(queries), 3)
+
+        removed, queries = self._writes(remove_favorite, self.user, self.pitch.id)
+        self.assertFalse(removed)
+        self.assertEqual(len(queries), 1)
+
+    def test_missing_pitch_inserts_nothing(self):
+        self.assertFalse(add_favorite(self.user, 999999))
+        self.assertFalse(Favorite.objects.exists())
+
+        missing_url = reverse('ajax_favorite', args=[999999])
+        self.assertEqual(self.client.put(missing_url).status_code, 404)
+        self.assertEqual(self.client.delete(missing_url).status_code, 404)
+
+    def test_requires_put_or_delete(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 405)
+
+    def test_batch_state(self):
+        add_favorite(self.user, self.pitch.id)
+        url = reverse('ajax_favorite_state')
+
+        with self.assertNumQueries(3):  # session + user + favorite
+            response = self.client.get(
+                url, {'ids': f'{self.pitch.id},{self.other_pitch.id}'})
+
+        self.assertEqual(response.json()['favorited'], [self.pitch.id])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_batch_state_validation(self):
+        url = reverse('ajax_favorite_state')
+        too_many = ','.join(
+            str(i) for i in range(constants.FAVORITE_STATE_MAX_IDS + 1))
+
+        self.assertEqual(self.client.get(url, {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+
+    def test_batch_state_anonymous(self):
+        add_favorite(self.user, self.pitch.id)
+        response = Client().get(
+            reverse('ajax_favorite_state'), {'ids': str(self.pitch.id)})
+        self.assertEqual(response.json()['favorited'], [])
+
+    def test_toggle_view_keeps_count(self):
+        url = reverse('toggle_favorite', args=[self.pitch.id])
+
+        self.client.post(url)
+        self.assertEqual(self._count(), 1)
+        self.client.post(url)
+        self.assertEqual(self._count(), 0)
+
+    def test_stale_save_keeps_count(self):
+        stale = Pitch.objects.get(pk=self.pitch.pk)
+        add_favorite(self.user, self.pitch.id)
+
+        stale.name = 'Pitch 1 mới'
+        stale.save()
+
+        self.assertEqual(self._count(), 1)
+
+    def test_count_follows_deletes_outside_api(self):
+        """Test xoá yêu thích qua ORM, queryset hay cascade đều trừ bộ đếm"""
+        other_user = User.objects.create(username='bob', email='b@example.com')
+        add_favorite(self.user, self.pitch.id)
+        add_favorite(other_user, self.pitch.id)
+        Favorite.objects.create(user=self.user, pitch=self.other_pitch)
+        self.assertEqual(self._count(), 2)
+        self.assertEqual(self._count(self.other_pitch), 1)
+
+        Favorite.objects.get(user=self.user, pitch=self.other_pitch).delete()
+        self.assertEqual(self._count(self.other_pitch), 0)
+
+        other_user.delete()
+        self.assertEqual(self._count(), 1)
+
+        Favorite.objects.filter(pitch=self.pitch).delete()
+        self.assertEqual(self._count(), 0)
+
+    def test_reconcile_command(self):
+        add_favorite(self.user, self.pitch.id)
+        Pitch.objects.filter(pk=self.pitch.pk).update(favorite_count=7)
+        Pitch.objects.filter(pk=self.other_pitch.pk).update(favorite_count=3)
+
+        call_command('reconcile_favorite_counts', stdout=StringIO())
+
+        self.assertEqual(self._count(), 1)
+        self.assertEqual(self._count(self.other_pitch), 0)
+
+    def test_pitch_list_sort_popular(self):
+        add_favorite(self.user, self.other_pitch.id)
+
+        response = self.client.get(reverse('pitch_list'), {'sort': 'popular'})
+
+        pitches = list(response.context['pitches'])
+        self.assertEqual(pitches[0], self.other_pitch)
+        self.assertTrue(getattr(response.context['pitches'], 'is_cursor_page', False))
+
+
+# ===== Voucher Redemption Tests =====
+
+
+class VoucherRedemptionTests(TestCase):
+    """Test dùng/trả lượt voucher bằng UPDATE có điều kiện"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='alice', email='a@example.com')
+        self.other_user = User.objects.create(username='bob', email='b@example.com')
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com', role=constants.ROLE_ADMIN)
+        pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.slots = [
+            PitchTimeSlot.objects.create(
+                pitch=self.pitch,
+                time_slot=TimeSlot.objects.create(
+                    name=f'Slot {hour}', start_time=time(hour, 0),
+                    end_time=time(hour + 1, 0)),
+                price=Decimal('100.00'))
+            for hour in (8, 9, 10)
+        ]
+        self.voucher = Voucher.objects.create(
+            code='LIMIT2', discount_percent=10, usage_limit=2)
+        self.booking_date = date.today() + timedelta(days=1)
+
+    def _book(self, slot, voucher=None, user=None):
+        return Booking.objects.create(
+            user=user or self.user, pitch=self.pitch, time_slot=slot,
+            booking_date=self.booking_date, voucher=voucher or self.voucher)
+
+    def _used_count(self):
+        self.voucher.refresh_from_db()
+        return self.voucher.used_count
+
+    def test_redeem_stops_at_limit(self):
+        self.assertTrue(Voucher.redeem(self.voucher.id))
+        self.assertTrue(Voucher.redeem(self.voucher.id))
+        self.assertFalse(Voucher.redeem(self.voucher.id))
+        self.assertEqual(self._used_count(), 2)
+
+    def test_redeem_respects_validity(self):
+        Voucher.objects.filter(pk=self.voucher.pk).update(
+            end_date=date.today() - timedelta(days=1))
+        self.assertFalse(Voucher.redeem(self.voucher.id))
+
+        unlimited = Voucher.objects.create(code='FREE', discount_percent=5)
+        self.assertTrue(Voucher.redeem(unlimited.id))
+
+    def test_stale_instances_cannot_over_redeem(self):
+        """Test nhiều booking đọc voucher cùng lúc (chưa hết lượt) vẫn không vượt giới hạn"""
+        stale = [Voucher.objects.get(pk=self.voucher.pk) for _ in self.slots]
+
+        self._book(self.slots[0], stale[0])
+        self._book(self.slots[1], stale[1], user=self.other_user)
+        with self.assertRaises(ValidationError) as ctx:
+            self._book(self.slots[2], stale[2])
+
+        self.assertIn('voucher', ctx.exception.message_dict)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(self._used_count(), 2)
+
+    def test_cancel_and_reject_release(self):
+        first = self._book(self.slots[0])
+        second = self._book(self.slots[1], user=self.other_user)
+
+        first.status = BookingStatus.CANCELLED
+        first.save(update_fields=['status'])
+        self.assertEqual(self._used_count(), 1)
+
+        second = Booking.objects.get(pk=second.pk)
+        second.status = BookingStatus.REJECTED
+        second.save()
+        self.assertEqual(self._used_count(), 0)
+
+        # Lưu lại booking đã hủy không trả thêm lượt
+        first.note = 'ghi chú'
+        first.save()
+        self.assertEqual(self._used_count(), 0)
+
+    def test_invalid_voucher_not_released(self):
+        """Test voucher hết hạn không được giữ lượt nên hủy cũng không trả lượt"""
+        Voucher.objects.filter(pk=self.voucher.pk).update(
+            used_count=2, usage_limit=5,
+            end_date=date.today() - timedelta(days=1))
+        expired = Voucher.objects.get(pk=self.voucher.pk)
+
+        booking = self._book(self.slots[0], expired)
+        self.assertIsNone(booking.voucher_id)
+        self.assertEqual(booking.final_price, Decimal('100.00'))
+
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        self.assertEqual(self._used_count(), 2)
+
+        cart = checkout_cart(
+            self.user, [(self.slots[1].id, self.booking_date)], voucher=expired)
+        self.assertIsNone(Booking.objects.get(pk=cart[0].pk).voucher_id)
+
+    def test_voucher_edit_keeps_used_count(self):
+        """Test sửa voucher từ bản đọc cũ không ghi đè used_count"""
+        stale = Voucher.objects.get(pk=self.voucher.pk)
+        self._book(self.slots[0])
+
+        stale.description = 'Giảm 10%'
+        stale.save()
+        self.assertEqual(self._used_count(), 1)
+
+        client = Client()
+        client.force_login(self.admin)
+        self._book(self.slots[1], user=self.other_user)
+        client.post(
+            reverse('admin_voucher_update', args=[self.voucher.id]),
+            {'code': 'LIMIT2', 'discount_percent': 15, 'usage_limit': 3,
+             'is_active': 'on'})
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.discount_percent, 15)
+        self.assertEqual(self.voucher.used_count, 2)
+
+    def test_approve_does_not_count_twice(self):
+        booking = self._book(self.slots[0])
+        client = Client()
+        client.force_login(self.admin)
+
+        client.post(
+            reverse('admin_update_booking_status', args=[booking.id]),
+            {'action': 'approve'})
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.CONFIRMED)
+        self.assertEqual(self._used_count(), 1)
+
+    def test_cart_releases_once_last_booking_cancelled(self):
+        bookings = checkout_cart(
+            self.user,
+            [(slot.id, self.booking_date) for slot in self.slots[:2]],
+            voucher=self.voucher)
+        self.assertEqual(self._used_count(), 1)
+
+        for index, booking in enumerate(bookings):
+            booking = Booking.objects.get(pk=booking.pk)
+            booking.status = BookingStatus.CANCELLED
+            booking.save()
+            self.assertEqual(self._used_count(), 1 - index)
+
+    def test_exhausted_voucher_rejects_cart(self):
+        Voucher.objects.filter(pk=self.voucher.pk).update(used_count=2)
+        self.voucher.used_count = 1  # bản đọc cũ, vẫn tưởng còn lượt
+
+        with self.assertRaises(ValidationError):
+            checkout_cart(
+                self.user, [(self.slots[0].id, self.booking_date)],
+                voucher=self.voucher)
+        self.assertFalse(Booking.objects.exists())
+
+
+    def test_booking_records_redemption(self):
+        self._book(self.slots[0])
+        self.assertTrue(VoucherRedemption.has_redeemed(self.user, self.voucher))
+        self.assertFalse(
+            VoucherRedemption.has_redeemed(self.other_user, self.voucher))
+
+    def test_second_booking_same_user_rejected(self):
+        """Test mỗi user chỉ dùng 1 lần kể cả khi bỏ qua kiểm tra ở view"""
+        self._book(self.slots[0])
+        with self.assertRaises(ValidationError) as ctx:
+            self._book(self.slots[1])
+
+        self.assertEqual(
+            ctx.exception.message_dict['voucher'],
+            [constants.ERR_VOUCHER_ALREADY_USED])
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(self._used_count(), 1)
+
+    def test_has_redeemed_single_query(self):
+        self._book(self.slots[0])
+        with self.assertNumQueries(1):
+            VoucherRedemption.has_redeemed(self.user, self.voucher)
+
+    def test_reject_frees_user_redemption(self):
+        booking = self._book(self.slots[0])
+        booking.status = BookingStatus.REJECTED
+        booking.save()
+
+        self.assertFalse(VoucherRedemption.has_redeemed(self.user, self.voucher))
+        self._book(self.slots[1])
+        self.assertEqual(self._used_count(), 1)
+
+    def test_cancel_keeps_user_redemption(self):
+        booking = self._book(self.slots[0])
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+
+        self.assertTrue(VoucherRedemption.has_redeemed(self.user, self.voucher))
+        self.assertEqual(self._used_count(), 0)
+
+    def test_check_voucher_ajax_uses_redemption(self):
+        self._book(self.slots[0])
+        client = Client()
+        client.force_login(self.user)
+
+        response = client.get(
+            reverse('ajax_check_voucher'), {'code': self.voucher.code})
+
+        self.assertFalse(response.json()['valid'])
+
+
+# ===== Voucher Cache Tests =====
+
+
+class VoucherCacheTests(TestCase):
+    """Test cache tra cứu voucher theo mã và header cache của check_voucher_ajax"""
+
+    def setUp(self):
+        cache.clear()
+        self.voucher = Voucher.objects.create(code='SALE10', discount_percent=10)
+        self.url = reverse('ajax_check_voucher')
+
+    def test_lookup_is_cached_by_normalized_code(self):
+        self.assertEqual(get_voucher_by_code('SALE10'), self.voucher)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_voucher_by_code(' sale10 '), self.voucher)
+
+    def test_missing_code_is_cached(self):
+        self.assertIsNone(get_voucher_by_code('NOPE'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_voucher_by_code('NOPE'))
+
+    def test_save_invalidates(self):
+        get_voucher_by_code('SALE10')
+        self.voucher.discount_percent = 20
+        self.voucher.save()
+        self.assertEqual(get_voucher_by_code('SALE10').discount_percent, 20)
+
+        self.voucher.code = 'SALE20'
+        self.voucher.save()
+        self.assertIsNone(get_voucher_by_code('SALE10'))
+
+    def test_new_voucher_replaces_cached_miss(self):
+        self.assertIsNone(get_voucher_by_code('NEW'))
+        Voucher.objects.create(code='NEW', discount_percent=5)
+        self.assertIsNotNone(get_voucher_by_code('NEW'))
+
+    def test_delete_invalidates(self):
+        get_voucher_by_code('SALE10')
+        self.voucher.delete()
+        self.assertIsNone(get_voucher_by_code('SALE10'))
+
+    def test_ajax_uses_cache_and_sets_headers(self):
+        self.client.get(self.url, {'code': 'SALE10'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'code': 'sale10'})
+
+        self.assertTrue(response.json()['valid'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn(
+            f'max-age={constants.VOUCHER_CHECK_BROWSER_MAX_AGE}',
+            response['Cache-Control'])
+
+
+class VoucherRedemptionStressTests(TransactionTestCase):
+    """Test nhiều worker dùng voucher song song không vượt usage_limit"""
+
+    WORKERS = 8
+    ATTEMPTS = 40
+
+    def test_parallel_redeem_never_exceeds_limit(self):
+        voucher = Voucher.objects.create(
+            code='RACE', discount_percent=10, usage_limit=15)
+
+        def worker(_):
+            try:
+                while True:
+                    try:
+                        with transaction.atomic():
+                            return Voucher.redeem(voucher.id)
+                    except OperationalError:
+                        # SQLite báo khoá bảng thay vì chờ, thử lại
+                        continue
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(worker, range(self.ATTEMPTS)))
+
+        voucher.refresh_from_db()
+        self.assertEqual(results.count(True), 15)
+        self.assertEqual(voucher.used_count, 15)
+
+    def test_parallel_same_user_redeems_once(self):
+        user = User.objects.create(username='racer', email='r@example.com')
+        voucher = Voucher.objects.create(code='ONCE', discount_percent=10)
+
+        def worker(_):
+            try:
+                while True:
+                    try:
+                        VoucherRedemption.redeem(user.id, voucher.id)
+                        return True
+                    except ValidationError:
+                        return False
+                    except OperationalError:
+                        continue
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(worker, range(self.WORKERS)))
+
+        voucher.refresh_from_db()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(voucher.used_count, 1)
+        self.assertEqual(VoucherRedemption.objects.count(), 1)
+
+
+# ===== Email Outbox Tests =====
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Backend giả lập SMTP lỗi"""
+
+    def send_messages(self, email_messages):
+        raise SMTPException("Máy chủ mail không phản hồi")
+
+
+class EmailOutboxTests(TestCase):
+    """Test hàng đợi email và worker gửi theo lô"""
+
+    def setUp(self):
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com', role=constants.ROLE_ADMIN)
+        self.user = User.objects.create(username='alice', email='a@example.com')
+        pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        slot = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=TimeSlot.objects.create(
+                name='Sáng', start_time=time(8, 0), end_time=time(9, 0)),
+            price=Decimal('100.00'))
+        self.booking = Booking.objects.create(
+            user=self.user, pitch=self.pitch, time_slot=slot,
+            booking_date=date.today() + timedelta(days=1))
+
+    def _queue(self, count=1):
+        for i in range(count):
+            queue_email(f'Tiêu đề {i}', 'Nội dung', ['a@example.com'])
+
+    def test_queue_does_not_send(self):
+        self._queue()
+        item = EmailOutbox.objects.get()
+        self.assertEqual(item.status, EmailStatus.PENDING)
+        self.assertEqual(item.to, ['a@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rollback_discards_email(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self._queue()
+                raise RuntimeError
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_batch_uses_one_connection(self):
+        self._queue(3)
+        with mock.patch(
+                'main.outbox.get_connection', wraps=mail.get_connection) as conn:
+            self.assertEqual(deliver_batch(), (3, 0))
+
+        conn.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            EmailOutbox.objects.filter(status=EmailStatus.SENT).count(), 3)
+
+    def test_html_body_attached(self):
+        queue_email('Tiêu đề', 'Nội dung', ['a@example.com'],
+                    html_message='<p>Nội dung</p>')
+        deliver_batch()
+        self.assertEqual(
+            mail.outbox[0].alternatives[0][0], '<p>Nội dung</p>')
+
+    @override_settings(EMAIL_BACKEND='main.tests.FailingEmailBackend')
+    def test_failure_backs_off_then_dead(self):
+        self._queue()
+
+        with self.assertLogs('main.outbox', 'WARNING'):
+            self.assertEqual(deliver_batch(), (0, 1))
+        item = EmailOutbox.objects.get()
+        self.assertEqual(item.status, EmailStatus.PENDING)
+        self.assertEqual(item.attempts, 1)
+        self.assertIn('SMTPException', item.last_error)
+        self.assertGreater(item.next_attempt_at, timezone.now())
+        # Chưa đến hạn thử lại
+        self.assertEqual(deliver_batch(), (0, 0))
+
+        with self.assertLogs('main.outbox', 'WARNING') as logs:
+            for _ in range(constants.EMAIL_MAX_ATTEMPTS - 1):
+                EmailOutbox.objects.update(next_attempt_at=timezone.now())
+                deliver_batch()
+        self.assertIn('ERROR', logs.output[-1])
+        item.refresh_from_db()
+        self.assertEqual(item.status, EmailStatus.DEAD)
+        self.assertEqual(item.attempts, constants.EMAIL_MAX_ATTEMPTS)
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual(
+            retry_delay(2), retry_delay(1) * 2)
+        self.assertEqual(
+            retry_delay(50).total_seconds(), constants.EMAIL_RETRY_MAX_DELAY)
+
+    def test_worker_command_drains_queue(self):
+        self._queue(5)
+        call_command(
+            'run_mail_worker', '--once', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(
+            EmailOutbox.objects.exclude(status=EmailStatus.SENT).exists())
+
+    def test_booking_email_is_queued(self):
+        send_booking_confirmation_email(self.booking)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            EmailOutbox.objects.get().to, [self.user.email])
+
+    def test_admin_status_update_queues_email(self):
+        client = Client()
+        client.force_login(self.admin)
+
+        client.post(
+            reverse('admin_update_booking_status', args=[self.booking.id]),
+            {'action': 'approve'})
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.get().to, [self.user.email])
+
+
+class ConcurrentWriteEmailBackend(BaseEmailBackend):
+    """Backend giả lập SMTP chậm: trong lúc gửi, 1 request khác ghi database"""
+
+    results = []
+
+    def send_messages(self, email_messages):
+        def write():
+            try:
+                queue_email('Email khác', 'Nội dung', ['b@example.com'])
+                return True
+            except OperationalError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            self.results.append(
+                (connection.in_atomic_block, pool.submit(write).result()))
+        return len(email_messages)
+
+
+class EmailOutboxConcurrencyTests(TransactionTestCase):
+    """Test worker không giữ khoá database trong lúc chờ SMTP"""
+
+    @override_settings(EMAIL_BACKEND='main.tests.ConcurrentWriteEmailBackend')
+    def test_database_writable_while_sending(self):
+        ConcurrentWriteEmailBackend.results = []
+        queue_email('Tiêu đề', 'Nội dung', ['a@example.com'])
+
+        self.assertEqual(deliver_batch(), (1, 0))
+
+        self.assertEqual(ConcurrentWriteEmailBackend.results, [(False, True)])
+        self.assertEqual(
+            EmailOutbox.objects.filter(status=EmailStatus.SENT).count(), 1)
+        self.assertEqual(
+            EmailOutbox.objects.filter(status=EmailStatus.PENDING).count(), 1)
+
+    def test_claimed_email_not_taken_twice(self):
+        queue_email('Tiêu đề', 'Nội dung', ['a@example.com'])
+
+        with mock.patch('main.outbox._send_all') as send_all:
+            send_all.side_effect = lambda items: (
+                self.assertEqual(deliver_batch(), (0, 0)) or (items, []))
+            self.assertEqual(deliver_batch(), (1, 0))
+        send_all.assert_called_once()
+
+
+# ===== Bulk Notification Tests =====
+
+
+class RejectingEmailBackend(BaseEmailBackend):
+    """Backend từ chối địa chỉ @blocked.test, nhận các địa chỉ khác"""
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if message.to[0].endswith('@blocked.test'):
+                raise SMTPException("Địa chỉ bị từ chối")
+            mail.outbox.append(message)
+        return len(email_messages)
+
+
+class BulkNotificationTests(TestCase):
+    """Test gửi thông báo hàng loạt song song"""
+
+    SUBJECT = 'Thông báo {pitch_name}'
+    MESSAGE = 'Xin chào {user_name}'
+
+    def _recipients(self, count, domain='example.com'):
+        return [
+            (f'user{i}@{domain}', {'user_name': f'User {i}', 'pitch_name': 'Sân 1'})
+            for i in range(count)
+        ]
+
+    def test_sends_every_recipient_with_own_context(self):
+        results = send_bulk_email(
+            self.SUBJECT, self.MESSAGE, self._recipients(30),
+            max_workers=4, chunk_size=7)
+
+        self.assertEqual(len(results), 30)
+        self.assertTrue(all(error is None for error in results.values()))
+        self.assertEqual(len(mail.outbox), 30)
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertEqual(bodies['user3@example.com'], 'Xin chào User 3')
+
+    def test_one_connection_per_chunk(self):
+        with mock.patch(
+                'main.notifications.get_connection',
+                wraps=mail.get_connection) as conn:
+            send_bulk_email(
+                self.SUBJECT, self.MESSAGE, self._recipients(30),
+                max_workers=3, chunk_size=10)
+        self.assertEqual(conn.call_count, 3)
+
+    def test_duplicate_and_empty_addresses_skipped(self):
+        recipients = self._recipients(2) + self._recipients(2) + [('', {})]
+        results = send_bulk_email(self.SUBJECT, self.MESSAGE, recipients)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_BACKEND='main.tests.RejectingEmailBackend')
+    def test_reports_per_recipient_failures(self):
+        recipients = self._recipients(3) + self._recipients(2, 'blocked.test')
+
+        with self.assertLogs('main.notifications', 'WARNING'):
+            results = send_bulk_email(
+                self.SUBJECT, self.MESSAGE, recipients, chunk_size=2)
+
+        failed = {email for email, error in results.items() if error}
+        self.assertEqual(failed, {'user0@blocked.test', 'user1@blocked.test'})
+        self.assertIn('SMTPException', results['user0@blocked.test'])
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND='main.tests.FailingEmailBackend')
+    def test_connection_failure_marks_all_failed(self):
+        with self.assertLogs('main.notifications', 'WARNING'):
+            results = send_bulk_email(
+                self.SUBJECT, self.MESSAGE, self._recipients(4))
+        self.assertTrue(all(results.values()))
+
+    def test_notify_pitch_customers(self):
+        pitch_type = PitchType.objects.create(name='Football')
+        pitch = Pitch.objects.create(
+            name='Sân 1', pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00'))
+        slot = PitchTimeSlot.objects.create(
+            pitch=pitch,
+            time_slot=TimeSlot.objects.create(
+                name='Sáng', start_time=time(8, 0), end_time=time(9, 0)),
+            price=Decimal('100.00'))
+        tomorrow = date.today() + timedelta(days=1)
+        customer = User.objects.create(
+            username='alice', email='a@example.com', full_name='Alice')
+        cancelled = User.objects.create(username='bob', email='b@example.com')
+        for user, status in ((customer, BookingStatus.PENDING),
+                             (cancelled, BookingStatus.CANCELLED)):
+            Booking.objects.create(
+                user=user, pitch=pitch, time_slot=slot,
+                booking_date=tomorrow, status=status)
+
+        results = notify_pitch_customers(pitch, 'Sân bảo trì ngày mai.')
+
+        self.assertEqual(results, {'a@example.com': None})
+        self.assertIn('Xin chào Alice', mail.outbox[0].body)
+        self.assertIn('Sân bảo trì ngày mai.', mail.outbox[0].body)
+
+
+# ===== Bulk Booking Status Tests =====
+
+
+class BulkBookingStatusTests(TestCase):
+    """Test duyệt/từ chối hàng loạt bằng 1 câu UPDATE có điều kiện"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com', role=constants.ROLE_ADMIN)
+        self.client.force_login(self.admin)
+        pitch_type = PitchType.objects.create(name='Football')
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            pitch_type=pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.booking_date = date.today() + timedelta(days=1)
+        self.voucher = Voucher.objects.create(
+            code='BULK', discount_percent=10, usage_limit=10)
+        self.bookings = []
+        for hour in range(8, 12):
+            user = User.objects.create(
+                username=f'user{hour}', email=f'user{hour}@example.com')
+            slot = PitchTimeSlot.objects.create(
+                pitch=self.pitch,
+                time_slot=TimeSlot.objects.create(
+                    name=f'Slot {hour}', start_time=time(hour, 0),
+                    end_time=time(hour + 1, 0)),
+                price=Decimal('100.00'))
+            self.bookings.append(Booking.objects.create(
+                user=user, pitch=self.pitch, time_slot=slot,
+                booking_date=self.booking_date, voucher=self.voucher))
+        self.ids = [booking.id for booking in self.bookings]
+        self.url = reverse('admin_booking_bulk_update')
+
+    def _statuses(self):
+        return list(
+            Booking.objects.filter(pk__in=self.ids).order_by('id')
+            .values_list('status', flat=True))
+
+    def test_approve_changes_only_pending(self):
+        first = self.bookings[0]
+        first.status = BookingStatus.CANCELLED
+        first.save()
+
+        changed = bulk_update_booking_status(self.ids, BookingStatus.CONFIRMED)
+
+        self.assertEqual(
+            sorted(b.id for b in changed), self.ids[1:])
+        self.assertEqual(
+            self._statuses(),
+            [BookingStatus.CANCELLED] + [BookingStatus.CONFIRMED] * 3)
+        # Duyệt không đổi lượt voucher
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 3)
+
+    def test_changed_excludes_rows_updated_same_instant(self):
+        """Test booking đã duyệt sẵn cùng updated_at không bị tính là vừa đổi"""
+        now = timezone.now()
+        Booking.objects.filter(pk=self.ids[0]).update(
+            status=BookingStatus.CONFIRMED, updated_at=now)
+
+        with mock.patch('main.bookings.timezone.now', return_value=now):
+            changed = bulk_update_booking_status(
+                self.ids, BookingStatus.CONFIRMED)
+
+        self.assertEqual(sorted(b.id for b in changed), self.ids[1:])
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+        self.assertEqual(
+            Booking.objects.get(pk=self.ids[1]).updated_at, now)
+
+    def test_lock_then_update_without_returning(self):
+        """Test backend không có RETURNING: khoá các dòng đang chờ rồi UPDATE"""
+        Booking.objects.filter(pk=self.ids[0]).update(
+            status=BookingStatus.CANCELLED)
+
+        with mock.patch(
+                'main.bookings._supports_update_returning', return_value=False):
+            changed = bulk_update_booking_status(
+                self.ids, BookingStatus.REJECTED)
+
+        self.assertEqual(sorted(b.id for b in changed), self.ids[1:])
+        self.assertEqual(
+            self._statuses(),
+            [BookingStatus.CANCELLED] + [BookingStatus.REJECTED] * 3)
+
+    def test_query_count_independent_of_batch_size(self):
+        def writes(ids):
+            with CaptureQueriesContext(connection) as ctx:
+                bulk_update_booking_status(ids, BookingStatus.REJECTED)
+            return len(ctx.captured_queries)
+
+        small = writes(self.ids[:1])
+        large = writes(self.ids[1:])
+        self.assertEqual(small, large)
+
+    def test_reject_releases_vouchers_and_slots(self):
+        bulk_update_booking_status(self.ids, BookingStatus.REJECTED, reason='Bảo trì')
+
+        self.voucher.refresh_from_db()
+        self.assertEqual(self.voucher.used_count, 0)
+        self.assertFalse(VoucherRedemption.objects.exists())
+        self.assertEqual(
+            get_booked_slot_ids(self.pitch, self.booking_date), set())
+        self.assertIn('Bảo trì', EmailOutbox.objects.first().body)
+
+    def test_emails_queued_in_one_batch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            bulk_update_booking_status(self.ids, BookingStatus.CONFIRMED)
+
+        inserts = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('INSERT INTO "main_emailoutbox"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 4)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_second_run_changes_nothing(self):
+        bulk_update_booking_status(self.ids, BookingStatus.CONFIRMED)
+        self.assertEqual(
+            bulk_update_booking_status(self.ids, BookingStatus.REJECTED), [])
+        self.assertEqual(self._statuses(), [BookingStatus.CONFIRMED] * 4)
+
+    def test_unsupported_status(self):
+        with self.assertRaises(ValueError):
+            bulk_update_booking_status(self.ids, BookingStatus.CANCELLED)
+
+    def test_view_reports_changed_count(self):
+        Booking.objects.filter(pk=self.ids[0]).update(
+            status=BookingStatus.CONFIRMED)
+
+        response = self.client.post(
+            self.url, {'action': 'approve', 'booking_ids': self.ids},
+            HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.json(), {
+            'requested': 4, 'changed': 3, 'changed_ids': self.ids[1:]})
+
+    def test_view_redirect_messages(self):
+        response = self.client.post(
+            self.url, {'action': 'reject', 'booking_ids': self.ids[:2]},
+            follow=True)
+
+        self.assertContains(
+            response,
+            constants.MSG_BOOKINGS_BULK_REJECTED.format(changed=2, requested=2))
+
+    def test_view_validation(self):
+        self.assertEqual(
+            self.client.post(
+                self.url, {'action': 'delete', 'booking_ids': self.ids},
+                HTTP_ACCEPT='application/json').status_code, 400)
+        self.assertEqual(
+            self.client.post(
+                self.url, {'action': 'approve'},
+                HTTP_ACCEPT='application/json').status_code, 400)
+
+    def test_view_requires_admin(self):
+        client = Client()
+        client.force_login(self.bookings[0].user)
+        response = client.post(
+            self.url, {'action': 'approve', 'booking_ids': self.ids})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self._statuses(), [BookingStatus.PENDING] * 4)
@@ -23,6 +23,8 @@ urlpatterns = [
         'dashboard/bookings/',
         views.admin_booking_list,
         name='admin_booking_list'),
+    path('dashboard/bookings/bulk-update/', views.admin_booking_bulk_update,
+         name='admin_booking_bulk_update'),
     path('dashboard/bookings/<int:booking_id>/update-status/', views.admin_update_booking_status,
          name='admin_update_booking_status'),
     # Admin pitch CRUD
@@ -41,6 +43,31 @@ urlpatterns = [
         'book/<int:pitch_id>/',
         views.user_booking_create,
         name='user_booking_create'),
+    path('cart/', views.booking_cart, name='booking_cart'),
+    path(
+        'cart/add/<int:pitch_id>/',
+        views.booking_cart_add,
+        name='booking_cart_add'),
+    path(
+        'cart/remove/<int:index>/',
+        views.booking_cart_remove,
+        name='booking_cart_remove'),
+    path(
+        'cart/checkout/',
+        views.booking_cart_checkout,
+        name='booking_cart_checkout'),
+    path(
+        'book/<int:pitch_id>/weekly/',
+        views.booking_series_create,
+        name='booking_series_create'),
+    path(
+        'booking-series/<int:series_id>/',
+        views.booking_series_detail,
+        name='booking_series_detail'),
+    path(
+        'booking-series/<int:series_id>/cancel/',
+        views.booking_series_cancel,
+        name='booking_series_cancel'),
     path(
         'booking-history/',
         views.user_booking_list,
@@ -69,10 +96,46 @@ urlpatterns = [
         'ajax/time-slots/<int:pitch_id>/',
         views.get_available_time_slots_ajax,
         name='ajax_time_slots'),
+    path(
+        'ajax/availability-calendar/<int:pitch_id>/',
+        views.get_availability_calendar_ajax,
+        name='ajax_availability_calendar'),
+    path(
+        'ajax/facility-availability/<int:facility_id>/',
+        views.get_facility_availability_ajax,
+        name='ajax_facility_availability'),
     path(
         'ajax/check-voucher/',
         views.check_voucher_ajax,
         name='ajax_check_voucher'),
+    path(
+        'ajax/reviews/<int:pitch_id>/',
+        views.get_reviews_ajax,
+        name='ajax_reviews'),
+    path(
+        'ajax/review/<int:review_id>/comments/',
+        views.get_review_comments_ajax,
+        name='ajax_review_comments'),
+    path(
+        'ajax/comments/<int:comment_id>/delete/',
+        views.delete_comment_ajax,
+        name='ajax_delete_comment'),
+    path(
+        'ajax/favorites/state/',
+        views.favorite_state_ajax,
+        name='ajax_favorite_state'),
+    path(
+        'ajax/favorites/<int:pitch_id>/',
+        views.favorite_ajax,
+        name='ajax_favorite'),
+    path(
+        'ajax/autocomplete/',
+        views.autocomplete_ajax,
+        name='ajax_autocomplete'),
 
     path('pitch/<int:pitch_id>/review/', views.add_review, name='add_review'),
+    path(
+        'pitch/<int:pitch_id>/review/delete/',
+        views.delete_review,
+        name='delete_review'),
 ]
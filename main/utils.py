@@ -1,22 +1,25 @@
 import logging
-from smtplib import SMTPException
 from .constants import (
     EMAIL_SUBJECT_BOOKING_CONFIRMATION,
     EMAIL_SUBJECT_BOOKING_APPROVED,
     EMAIL_SUBJECT_BOOKING_REJECTION,
     EMAIL_SUBJECT_BOOKING_CANCELLATION,
+    EMAIL_SUBJECT_BOOKING_CART_CONFIRMATION,
     EMAIL_TEMPLATE_BOOKING_CONFIRMATION,
+    EMAIL_TEMPLATE_BOOKING_CART_CONFIRMATION,
+    EMAIL_BOOKING_CART_LINE,
     EMAIL_TEMPLATE_BOOKING_APPROVED,
     EMAIL_TEMPLATE_BOOKING_REJECTION,
     EMAIL_TEMPLATE_BOOKING_CANCELLATION,
+    DEFAULT_REJECTION_REASON,
 )
-from django.core.mail import send_mail
 from django.conf import settings
 from datetime import timedelta
 from django.utils import timezone
 import secrets
 import string
 import textwrap
+import unicodedata
 
 
 def generate_activation_token():
@@ -24,6 +27,8 @@ def generate_activation_token():
 
 
 def send_activation_email(user, request):
+    from .outbox import queue_email
+
     user.activation_token = generate_activation_token()
     user.activation_expiry = timezone.now() + timedelta(
         hours=settings.ACTIVATION_TOKEN_EXPIRY_HOURS
@@ -62,13 +67,12 @@ def send_activation_email(user, request):
         </html>
     """).strip()
 
-    send_mail(
+    queue_email(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [user.email],
+        from_email=settings.DEFAULT_FROM_EMAIL,
         html_message=html_message,
-        fail_silently=False,
     )
 
 
@@ -88,12 +92,40 @@ def verify_activation_token(token):
         return True, "Tài khoản đã được kích hoạt thành công!"
     except User.DoesNotExist:
         return False, "Token không hợp lệ."
-    from django.core.mail import send_mail
 
 
 logger = logging.getLogger(__name__)
 
 
+def build_booking_email(
+        booking,
+        subject_template,
+        message_template,
+        extra_context=None):
+    """
+    Dựng email thông báo booking (dict tham số của queue_email).
+    booking cần load sẵn user, pitch và time_slot__time_slot.
+    """
+    context = {
+        "user_name": booking.user.get_full_name(),
+        "pitch_name": booking.pitch.name,
+        "booking_date": booking.booking_date.strftime('%d/%m/%Y'),
+        "time_slot_name": booking.time_slot.time_slot.name,
+        "start_time": booking.time_slot.time_slot.start_time.strftime('%H:%M'),
+        "end_time": booking.time_slot.time_slot.end_time.strftime('%H:%M'),
+        "final_price": f"{booking.final_price:,.0f}"}
+
+    if extra_context:
+        context.update(extra_context)
+
+    return {
+        "subject": subject_template.format(booking_id=booking.id),
+        "message": message_template.format(**context),
+        "from_email": settings.DEFAULT_FROM_EMAIL,
+        "recipient_list": [booking.user.email],
+    }
+
+
 def send_booking_email(
         booking,
         subject_template,
@@ -101,37 +133,18 @@ def send_booking_email(
         extra_context=None):
     """
     Hàm gửi email tái sử dụng cho tất cả loại thông báo booking.
+
+    Email được đưa vào hàng đợi (EmailOutbox), worker run_mail_worker gửi sau.
     """
+    from .outbox import queue_email
+
     try:
-        context = {
-            "user_name": booking.user.get_full_name(),
-            "pitch_name": booking.pitch.name,
-            "booking_date": booking.booking_date.strftime('%d/%m/%Y'),
-            "time_slot_name": booking.time_slot.time_slot.name,
-            "start_time": booking.time_slot.time_slot.start_time.strftime('%H:%M'),
-            "end_time": booking.time_slot.time_slot.end_time.strftime('%H:%M'),
-            "final_price": f"{booking.final_price:,.0f}"}
-
-        if extra_context:
-            context.update(extra_context)
-
-        subject = subject_template.format(booking_id=booking.id)
-        message = message_template.format(**context)
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            fail_silently=False,
-        )
+        queue_email(**build_booking_email(
+            booking, subject_template, message_template, extra_context))
         return True
 
-    except SMTPException as e:
-        logger.error(f"Lỗi gửi mail (SMTP): {e}")
-
     except Exception as e:
-        logger.error(f"Lỗi không xác định khi gửi mail: {e}", exc_info=True)
+        logger.error(f"Lỗi không xác định khi tạo email: {e}", exc_info=True)
 
     return False
 
@@ -154,7 +167,7 @@ def send_booking_approved_email(booking):
 
 def send_booking_rejection_email(
         booking,
-        reason="Khung giờ đã có người đặt hoặc sân không khả dụng."):
+        reason=DEFAULT_REJECTION_REASON):
     return send_booking_email(
         booking,
         EMAIL_SUBJECT_BOOKING_REJECTION,
@@ -171,6 +184,47 @@ def send_booking_cancellation_email(booking):
     )
 
 
+def send_booking_cart_confirmation_email(user, bookings):
+    """
+    Gửi 1 email xác nhận chung cho tất cả booking của một lần đặt giỏ.
+    """
+    from .outbox import queue_email
+
+    try:
+        booking_lines = "\n".join(
+            EMAIL_BOOKING_CART_LINE.format(
+                booking_id=booking.id,
+                pitch_name=booking.pitch.name,
+                booking_date=booking.booking_date.strftime('%d/%m/%Y'),
+                time_slot_name=booking.time_slot.time_slot.name,
+                start_time=booking.time_slot.time_slot.start_time.strftime('%H:%M'),
+                end_time=booking.time_slot.time_slot.end_time.strftime('%H:%M'),
+                final_price=f"{booking.final_price:,.0f}",
+            )
+            for booking in bookings
+        )
+        total_price = sum(booking.final_price for booking in bookings)
+
+        queue_email(
+            subject=EMAIL_SUBJECT_BOOKING_CART_CONFIRMATION.format(
+                count=len(bookings)),
+            message=EMAIL_TEMPLATE_BOOKING_CART_CONFIRMATION.format(
+                user_name=user.get_full_name(),
+                count=len(bookings),
+                booking_lines=booking_lines,
+                total_price=f"{total_price:,.0f}",
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[user.email],
+        )
+        return True
+
+    except Exception as e:
+        logger.error(f"Lỗi không xác định khi tạo email: {e}", exc_info=True)
+
+    return False
+
+
 def format_price(price):
     """
     Format giá tiền theo định dạng VN
@@ -205,3 +259,20 @@ def format_datetime_vn(dt):
     }
     day_name = days[dt.weekday()]
     return f"{day_name}, {dt.strftime('%d/%m/%Y %H:%M')}"
+
+
+def normalize_search_text(text):
+    """
+    Chuẩn hoá chuỗi để tìm kiếm không dấu
+
+    Args:
+        text: str
+
+    Returns:
+        str: "Sân Phú Thịnh" -> "san phu thinh"
+    """
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(
+        ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.lower().split())
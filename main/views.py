@@ -1,22 +1,22 @@
 # Built-in imports
 import re
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from smtplib import SMTPException
 from django.db import transaction
-from django.core.mail import send_mail
 
 # Django imports
-from django.http import BadHeaderError, HttpResponseNotAllowed, JsonResponse, HttpResponseForbidden
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q, Exists, OuterRef
+from django.db.models import Exists, OuterRef, Q
 from django.contrib import messages
 from django.utils import timezone
 from django.core.files.storage import default_storage
-from django.views.decorators.http import require_http_methods, require_POST
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
 # Third-party imports
 from django_ratelimit.decorators import ratelimit
@@ -30,11 +30,37 @@ from .utils import (
     send_booking_rejection_email,
     send_booking_cancellation_email,
     send_activation_email,
+    send_booking_cart_confirmation_email,
     verify_activation_token
 )
+from .availability import (
+    annotate_free_slot_count,
+    attach_slots_on_date,
+    get_availability_calendar,
+    get_booked_slot_ids_many,
+    get_pitch_slots_on_date,
+)
+from .bookings import (
+    bulk_update_booking_status,
+    cancel_booking_series,
+    checkout_cart,
+    create_booking_series,
+    find_series_conflicts,
+    load_cart_slots,
+)
 from .decorators import user_or_admin_required
-from .forms import SignUpForm, BookingForm, DateSelectionForm, ReviewForm, PitchForm, VoucherForm
-from .models import Booking, Facility, Pitch, PitchTimeSlot, PitchType, Voucher, BookingStatus, Favorite, Role, Review
+from .favorites import (
+    add_favorite,
+    get_favorited_pitch_ids,
+    remove_favorite,
+    toggle_favorite as toggle_favorite_state,
+)
+from .pagination import CURSOR_PARAM, InvalidCursor, KeysetPaginator, paginate
+from .outbox import queue_email
+from .search import autocomplete, search_facilities, search_pitches
+from .vouchers import get_voucher_by_code
+from .forms import SignUpForm, BookingForm, BookingSeriesForm, DateSelectionForm, ReviewForm, PitchForm, VoucherForm
+from .models import Booking, BookingSeries, Comment, Facility, Pitch, PitchTimeSlot, PitchType, Voucher, BookingStatus, Favorite, Role, Review, VoucherRedemption
 from . import constants
 from django.core.exceptions import ValidationError
 
@@ -273,18 +299,8 @@ def book_pitch(request, pitch_id):
     if selected_date: 
         try: 
             booking_date = datetime.strptime(selected_date, '%Y-%m-%d').date() 
-            all_pitch_time_slots = PitchTimeSlot.objects.filter( 
-                pitch=pitch, 
-                is_available=True
-            ).select_related('time_slot')
-            
-            if all_pitch_time_slots.count() == 0:
-                pass
-            
-            for pitch_time_slot in all_pitch_time_slots: 
-                is_available = pitch_time_slot.is_available_on_date(booking_date) 
-                
-                if is_available: 
+            for pitch_time_slot in get_pitch_slots_on_date(pitch, booking_date): 
+                if not pitch_time_slot.is_booked: 
                     price = pitch_time_slot.get_price() 
                     slot_data = { 
                         'id': pitch_time_slot.id, 
@@ -407,6 +423,8 @@ def signup(request):
         form = SignUpForm(request.POST)
         if form.is_valid():
             try:
+                # Email kích hoạt chỉ được ghi vào outbox cùng transaction
+                # với user, transaction không còn phải chờ SMTP
                 with transaction.atomic():
                     user = form.save(commit=True)
                     send_activation_email(user, request)
@@ -416,7 +434,7 @@ def signup(request):
                     return redirect('login')
             except Exception as e:
                 logger.error(
-                    f'Email sending failed for user {form.cleaned_data.get("email")}',
+                    f'Signup failed for user {form.cleaned_data.get("email")}',
                     exc_info=True)
                 messages.error(
                     request,
@@ -555,7 +573,7 @@ def home(request):
     q = request.GET.get("q", "")
     facilities = Facility.objects.all()
     if q:
-        facilities = facilities.filter(name__icontains=q)
+        facilities = search_facilities(facilities, q).order_by('search_rank')
     context = {
         'facilities': facilities,
         'default_facility_image': constants.DEFAULT_FACILITY_IMAGE,
@@ -606,15 +624,10 @@ def admin_booking_list(request):
                 request, "Định dạng ngày 'đến ngày' không hợp lệ.")
             date_to = ""
 
-    paginator = Paginator(bookings, constants.ADMIN_LIST_PER_PAGE)
-    page_number = request.GET.get("page")
-
-    try:
-        bookings_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        bookings_page = paginator.page(1)
-    except EmptyPage:
-        bookings_page = paginator.page(paginator.num_pages)
+    # Mặc định phân trang theo cursor (không OFFSET), ?page=N vẫn dùng được
+    bookings_page = paginate(
+        request, bookings, constants.ADMIN_LIST_PER_PAGE,
+        ordering=("-created_at", "id"), with_count=True)
 
     context = {
         "bookings": bookings_page,
@@ -668,33 +681,21 @@ def admin_update_booking_status(request, booking_id):
             "Chỉ có thể cập nhật đơn đặt sân đang chờ xác nhận.")
         return redirect("admin_booking_list")
 
-    old_status = booking.status
+    # Lượt voucher đã được tính lúc tạo booking; từ chối thì Booking.save
+    # tự trả lại lượt
     booking.status = new_status
     booking.save(update_fields=["status"])
 
-    if (
-        booking.voucher
-        and old_status == BookingStatus.PENDING
-        and new_status == BookingStatus.CONFIRMED
-    ):
-        booking.voucher.used_count += 1
-        booking.voucher.save(update_fields=["used_count"])
-
     if booking.user.email:
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-                recipient_list=[booking.user.email],
-                fail_silently=True,
-            )
-        except (BadHeaderError, SMTPException):
-            messages.warning(
-                request, "Cập nhật trạng thái thành công nhưng gửi email thất bại.")
-        else:
-            messages.success(
-                request, f"{success_msg} Email thông báo đã được gửi.")
+        # Chỉ ghi vào hàng đợi, worker run_mail_worker gửi sau
+        queue_email(
+            subject=subject,
+            message=message,
+            from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
+            recipient_list=[booking.user.email],
+        )
+        messages.success(
+            request, f"{success_msg} Email thông báo sẽ được gửi trong ít phút.")
     else:
         messages.success(
             request,
@@ -703,13 +704,86 @@ def admin_update_booking_status(request, booking_id):
     return redirect("admin_booking_list")
 
 
+BULK_BOOKING_ACTIONS = {
+    "approve": (BookingStatus.CONFIRMED, constants.MSG_BOOKINGS_BULK_APPROVED),
+    "reject": (BookingStatus.REJECTED, constants.MSG_BOOKINGS_BULK_REJECTED),
+}
+
+
+@login_required(login_url='login')
+@require_POST
+def admin_booking_bulk_update(request):
+    """
+    Admin duyệt/từ chối nhiều đơn đang chờ cùng lúc (1 câu UPDATE, email
+    vào hàng đợi). Báo lại số đơn thực sự đổi trạng thái.
+    """
+    if request.user.role != constants.ROLE_ADMIN:
+        return HttpResponseForbidden(
+            "Bạn không có quyền cập nhật đơn đặt sân.")
+
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+
+    def error(message):
+        if wants_json:
+            return JsonResponse({'error': message}, status=400)
+        messages.error(request, message)
+        return redirect("admin_booking_list")
+
+    if request.POST.get("action") not in BULK_BOOKING_ACTIONS:
+        return error(constants.ERR_BULK_INVALID_ACTION)
+    new_status, success_msg = BULK_BOOKING_ACTIONS[request.POST["action"]]
+
+    try:
+        booking_ids = {int(value) for value in request.POST.getlist("booking_ids")}
+    except ValueError:
+        booking_ids = set()
+    if not booking_ids:
+        return error(constants.ERR_BULK_NO_SELECTION)
+    if len(booking_ids) > constants.BULK_BOOKING_MAX_IDS:
+        return error(constants.ERR_BULK_TOO_MANY.format(
+            limit=constants.BULK_BOOKING_MAX_IDS))
+
+    changed = bulk_update_booking_status(
+        booking_ids, new_status, reason=request.POST.get("reason") or None)
+
+    if wants_json:
+        return JsonResponse({
+            'requested': len(booking_ids),
+            'changed': len(changed),
+            'changed_ids': sorted(booking.id for booking in changed),
+        })
+
+    messages.success(request, success_msg.format(
+        changed=len(changed), requested=len(booking_ids)))
+    skipped = len(booking_ids) - len(changed)
+    if skipped:
+        messages.warning(
+            request, constants.MSG_BOOKINGS_BULK_SKIPPED.format(skipped=skipped))
+    return redirect("admin_booking_list")
+
+
+def _parse_availability_date(date_str):
+    """Parse ngày xem lịch trống, mặc định là hôm nay nếu thiếu/sai định dạng."""
+    if date_str:
+        try:
+            return datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return date.today()
+
+
 def facility_detail(request, facility_id):
     facility = get_object_or_404(Facility, id=facility_id)
-    pitches = facility.pitches.filter(is_available=True)
+    availability_date = _parse_availability_date(request.GET.get('date'))
+    pitches = list(
+        facility.pitches.filter(is_available=True).select_related('pitch_type'))
+    attach_slots_on_date(pitches, availability_date)
 
     context = {
         'facility': facility,
         'pitches': pitches,
+        'availability_date': availability_date,
+        'today': date.today().isoformat(),
         'default_facility_image': constants.DEFAULT_FACILITY_IMAGE,
         'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
         'is_user': request.user.role == constants.ROLE_USER if request.user.is_authenticated else False,
@@ -718,6 +792,47 @@ def facility_detail(request, facility_id):
     return render(request, 'user/facility_detail.html', context)
 
 
+def get_facility_availability_ajax(request, facility_id):
+    """AJAX: Khung giờ trống/đã đặt của mọi sân trong cơ sở theo ngày"""
+    facility = get_object_or_404(Facility, id=facility_id)
+    date_str = request.GET.get('date')
+
+    if not date_str:
+        return JsonResponse({'error': 'Missing date parameter'}, status=400)
+
+    try:
+        booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format'}, status=400)
+
+    pitches = list(facility.pitches.filter(is_available=True).order_by('name'))
+    attach_slots_on_date(pitches, booking_date)
+
+    pitches_data = []
+    for pitch in pitches:
+        pitches_data.append({
+            'id': pitch.id,
+            'name': pitch.name,
+            'slots': [
+                {
+                    'id': pts.id,
+                    'name': pts.time_slot.name,
+                    'start_time': pts.time_slot.start_time.strftime('%H:%M'),
+                    'end_time': pts.time_slot.end_time.strftime('%H:%M'),
+                    'price': float(pts.get_price()),
+                    'is_available': not pts.is_booked,
+                }
+                for pts in pitch.slots_on_date
+            ],
+        })
+
+    return JsonResponse({
+        'facility_id': facility.id,
+        'date': date_str,
+        'pitches': pitches_data,
+    })
+
+
 def validate_voucher_code(code):
     """
     Validate voucher code format
@@ -747,15 +862,13 @@ def pitch_list(request):
     pitch_type_filter = request.GET.get('pitch_type', '')
     price_range_filter = request.GET.get('price_range', '')
     booking_date_filter = request.GET.get('booking_date', '')
-    sort_by = request.GET.get('sort', 'name')
+    min_free_slots_filter = request.GET.get('min_free_slots', '')
+    # Có từ khóa thì mặc định xếp theo độ liên quan
+    sort_by = request.GET.get('sort', 'relevance' if search_query else 'name')
 
-    # Filter by search query
+    # Filter by search query (full-text index)
     if search_query:
-        pitches = pitches.filter(
-            Q(name__icontains=search_query) |
-            Q(facility__name__icontains=search_query) |
-            Q(facility__address__icontains=search_query)
-        )
+        pitches = search_pitches(pitches, search_query)
 
     # Filter by pitch type
     if pitch_type_filter:
@@ -773,37 +886,48 @@ def pitch_list(request):
             )
 
     # Filter by booking date availability
+    booking_date = None
     if booking_date_filter:
         try:
             booking_date = datetime.strptime(
                 booking_date_filter, '%Y-%m-%d').date()
-
-            available_time_slots = PitchTimeSlot.objects.filter(
-                pitch=OuterRef('pk'), is_available=True).exclude(
-                bookings__booking_date=booking_date, bookings__status__in=[
-                    BookingStatus.PENDING, BookingStatus.CONFIRMED])
-
-            pitches = pitches.annotate(
-                has_available_slots=Exists(available_time_slots)
-            ).filter(
-                has_available_slots=True,
-                is_available=True
-            )
-
         except ValueError:
             pass
 
+    if booking_date:
+        # Chỉ giữ sân còn ít nhất N khung giờ trống trong ngày
+        try:
+            min_free_slots = max(int(min_free_slots_filter or 1), 1)
+        except ValueError:
+            min_free_slots = 1
+        pitches = annotate_free_slot_count(pitches, booking_date).filter(
+            free_slot_count__gte=min_free_slots,
+            is_available=True
+        )
+
     # Sorting
-    if sort_by == 'name':
-        pitches = pitches.order_by('name')
+    # Thứ tự theo cột của Pitch (kèm id để duy nhất) thì phân trang theo
+    # cursor; thứ tự theo giá trị tính toán (độ liên quan, số khung giờ
+    # trống) dùng số trang
+    keyset_ordering = None
+    if sort_by == 'relevance' and search_query:
+        pitches = pitches.order_by('search_rank', 'name')
+    elif sort_by == 'free_slots' and booking_date:
+        pitches = pitches.order_by('-free_slot_count', 'name')
     elif sort_by == '-name':
-        pitches = pitches.order_by('-name')
+        keyset_ordering = ('-name', '-id')
+    elif sort_by == 'rating':
+        keyset_ordering = ('-rating_avg', '-rating_count', 'id')
+    elif sort_by == 'popular':
+        keyset_ordering = ('-favorite_count', 'id')
     elif sort_by == 'price':
-        pitches = pitches.order_by('base_price_per_hour')
+        keyset_ordering = ('base_price_per_hour', 'id')
     elif sort_by == '-price':
-        pitches = pitches.order_by('-base_price_per_hour')
+        keyset_ordering = ('-base_price_per_hour', '-id')
     else:
-        pitches = pitches.order_by('name')
+        keyset_ordering = ('name', 'id')
+    if keyset_ordering:
+        pitches = pitches.order_by(*keyset_ordering)
 
     has_filters = any([search_query, pitch_type_filter,
                       price_range_filter, booking_date_filter])
@@ -811,20 +935,16 @@ def pitch_list(request):
     pitch_types = PitchType.objects.all()
 
     # Pagination using constant
-    paginator = Paginator(pitches, constants.ITEMS_PER_PAGE)
-    page_number = request.GET.get('page')
-
-    try:
-        pitches_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        pitches_page = paginator.page(1)
-    except EmptyPage:
-        pitches_page = paginator.page(paginator.num_pages)
+    pitches_page = paginate(
+        request, pitches, constants.ITEMS_PER_PAGE,
+        ordering=keyset_ordering, with_count=True)
 
     # Convert request.GET to dict for template
+    # (bỏ cursor để link đổi sort/lọc quay về trang đầu)
     request_get_dict = {}
     for key, value in request.GET.items():
-        request_get_dict[key] = value
+        if key != CURSOR_PARAM:
+            request_get_dict[key] = value
 
     context = {
         'pitches': pitches_page,
@@ -832,16 +952,21 @@ def pitch_list(request):
         'has_filters': has_filters,
         'request_get': request_get_dict,
         'selected_booking_date': booking_date_filter,
+        'has_free_slot_count': booking_date is not None,
+        'today': date.today().isoformat(),
         'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
     }
 
     return render(request, 'user/pitch_list.html', context)
 
 
-def _apply_voucher_to_booking(booking, voucher_code, request):
-    """Helper: Apply voucher to booking if valid and not used by user before."""
+def _resolve_voucher(voucher_code, request):
+    """
+    Helper: Return the voucher for the code if valid and not used by user before.
+    Chỉ báo lỗi; thông báo đã áp dụng do view gửi sau khi đặt thành công.
+    """
     if not voucher_code:
-        return False
+        return None
 
     is_valid_format, error_message = validate_voucher_code(voucher_code)
 
@@ -849,34 +974,33 @@ def _apply_voucher_to_booking(booking, voucher_code, request):
         messages.warning(
             request,
             f'{error_message}, đặt sân không áp dụng giảm giá.')
-        return False
+        return None
 
     voucher_code_clean = voucher_code.strip().upper()
     try:
         voucher = Voucher.objects.get(code=voucher_code_clean)
         if not voucher.is_valid():
             messages.warning(request, constants.ERR_VOUCHER_INVALID)
-            return False
-
-        # Ensure a user only uses a voucher once (excluding rejected bookings)
-        already_used = Booking.objects.filter(
-            user=request.user,
-            voucher=voucher
-        ).exclude(status=BookingStatus.REJECTED).exists()
+            return None
 
-        if already_used:
-            messages.warning(
-                request,
-                "Bạn đã sử dụng voucher này trước đó. Mỗi người chỉ dùng 1 lần.")
-            return False
+        # Ensure a user only uses a voucher once (1 lần tra index unique)
+        if VoucherRedemption.has_redeemed(request.user, voucher):
+            messages.warning(request, constants.ERR_VOUCHER_ALREADY_USED)
+            return None
 
-        booking.voucher = voucher
-        messages.success(
-            request, f'Đã áp dụng mã giảm giá {voucher.discount_percent}%!')
-        return True
+        return voucher
     except Voucher.DoesNotExist:
         messages.warning(request, constants.ERR_VOUCHER_NOT_FOUND)
+        return None
+
+
+def _apply_voucher_to_booking(booking, voucher_code, request):
+    """Helper: Apply voucher to booking if valid and not used by user before."""
+    voucher = _resolve_voucher(voucher_code, request)
+    if voucher is None:
         return False
+    booking.voucher = voucher
+    return True
 
 
 # ============= USER BOOKING VIEWS =============
@@ -914,13 +1038,14 @@ def user_booking_create(request, pitch_id):
     available_time_slots = []
     time_slot_choices = []
 
-    # Get reviews
-    reviews = Review.objects.filter(pitch=pitch).select_related(
-        'user').order_by('-created_at')
+    # Chỉ vài đánh giá mới nhất, phần còn lại tải thêm khi cuộn
+    reviews_page = _review_feed_paginator(
+        pitch, constants.REVIEWS_INITIAL_COUNT).page()
 
     # Check if user can review
     can_review = False
     has_reviewed = False
+    user_review = None
     if request.user.is_authenticated:
         has_booked = Booking.objects.filter(
             user=request.user,
@@ -928,20 +1053,16 @@ def user_booking_create(request, pitch_id):
             status=BookingStatus.CONFIRMED
         ).exists()
 
-        has_reviewed = Review.objects.filter(
-            user=request.user, pitch=pitch).exists()
+        user_review = Review.objects.filter(
+            user=request.user, pitch=pitch).first()
+        has_reviewed = user_review is not None
         can_review = has_booked and not has_reviewed
 
     applied_discount_percent = None
 
     if booking_date:
-        all_time_slots = PitchTimeSlot.objects.filter(
-            pitch=pitch,
-            is_available=True
-        ).select_related('time_slot').order_by('time_slot__start_time')
-
-        for pts in all_time_slots:
-            is_available = pts.is_available_on_date(booking_date)
+        for pts in get_pitch_slots_on_date(pitch, booking_date):
+            is_available = not pts.is_booked
 
             # Prepare data for template
             slot_data = {
@@ -968,11 +1089,7 @@ def user_booking_create(request, pitch_id):
                 try:
                     voucher_obj = Voucher.objects.get(code=voucher_code.strip().upper())
                     if voucher_obj.is_valid():
-                        already_used = Booking.objects.filter(
-                            user=request.user,
-                            voucher=voucher_obj
-                        ).exclude(status=BookingStatus.REJECTED).exists() if request.user.is_authenticated else False
-                        if not already_used:
+                        if not VoucherRedemption.has_redeemed(request.user, voucher_obj):
                             applied_discount_percent = voucher_obj.discount_percent
                 except Voucher.DoesNotExist:
                     pass
@@ -996,8 +1113,8 @@ def user_booking_create(request, pitch_id):
             voucher_code = form.cleaned_data.get('voucher_code')
 
             try:
-                pitch_time_slot = PitchTimeSlot.objects.get(
-                    id=time_slot_id, pitch=pitch)
+                pitch_time_slot = PitchTimeSlot.objects.select_related(
+                    'time_slot').get(id=time_slot_id, pitch=pitch)
 
                 booking = Booking(
                     user=request.user,
@@ -1012,6 +1129,9 @@ def user_booking_create(request, pitch_id):
 
                 # Save booking (auto-calculate duration & price in model)
                 booking.save()
+                if booking.voucher_id:
+                    messages.success(request, constants.MSG_VOUCHER_APPLIED.format(
+                        discount_percent=booking.voucher.discount_percent))
 
                 # Send confirmation email
                 send_booking_confirmation_email(booking)
@@ -1022,7 +1142,7 @@ def user_booking_create(request, pitch_id):
             except PitchTimeSlot.DoesNotExist:
                 messages.error(request, "Khung giờ không hợp lệ.")
             except ValidationError as e:
-                messages.error(request, str(e))
+                messages.error(request, ' '.join(e.messages))
             except Exception as e:
                 logger.error(f"Error creating booking: {e}", exc_info=True)
                 messages.error(request, "Có lỗi xảy ra khi đặt sân.")
@@ -1040,14 +1160,262 @@ def user_booking_create(request, pitch_id):
         'available_time_slots': available_time_slots,
         'today': date.today().isoformat(),
         'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
-        'reviews': reviews,
+        'reviews': reviews_page,
         'can_review': can_review,
         'has_reviewed': has_reviewed,
+        'user_review': user_review,
         'review_form': ReviewForm() if can_review else None,
     }
     return render(request, 'user/booking_create.html', context)
 
 
+# ============= BOOKING CART VIEWS =============
+
+def _get_cart_items(request):
+    """Giỏ đặt sân trong session dưới dạng [(time_slot_id, booking_date)]"""
+    items = []
+    for item in request.session.get(constants.CART_SESSION_KEY, []):
+        try:
+            items.append((
+                int(item['time_slot_id']),
+                datetime.strptime(item['booking_date'], '%Y-%m-%d').date(),
+            ))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return items
+
+
+def _save_cart_items(request, items):
+    request.session[constants.CART_SESSION_KEY] = [
+        {'time_slot_id': time_slot_id, 'booking_date': booking_date.isoformat()}
+        for time_slot_id, booking_date in items
+    ]
+
+
+@user_or_admin_required
+@require_POST
+def booking_cart_add(request, pitch_id):
+    """Thêm (khung giờ, ngày) của sân vào giỏ đặt sân"""
+    pitch = get_object_or_404(Pitch, id=pitch_id, is_available=True)
+    redirect_url = reverse('user_booking_create', args=[pitch.id])
+
+    try:
+        booking_date = datetime.strptime(
+            request.POST.get('booking_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        messages.error(request, constants.INFO_SELECT_DATE_FIRST)
+        return redirect(redirect_url)
+
+    try:
+        pitch_time_slot = PitchTimeSlot.objects.select_related(
+            'time_slot').get(id=request.POST.get('time_slot'), pitch=pitch)
+    except (PitchTimeSlot.DoesNotExist, ValueError):
+        messages.error(request, "Khung giờ không hợp lệ.")
+        return redirect(redirect_url)
+
+    items = _get_cart_items(request)
+    item = (pitch_time_slot.id, booking_date)
+    if item in items:
+        messages.warning(request, constants.ERR_CART_DUPLICATE)
+    elif len(items) >= constants.MAX_CART_ITEMS:
+        messages.error(
+            request,
+            constants.ERR_CART_FULL.format(max_items=constants.MAX_CART_ITEMS))
+    else:
+        items.append(item)
+        _save_cart_items(request, items)
+        messages.success(request, constants.MSG_CART_ITEM_ADDED.format(
+            time_slot_name=pitch_time_slot.time_slot.name,
+            booking_date=booking_date.strftime('%d/%m/%Y')))
+    return redirect(f"{redirect_url}?date={booking_date.isoformat()}")
+
+
+@user_or_admin_required
+@require_POST
+def booking_cart_remove(request, index):
+    """Xóa 1 khung giờ khỏi giỏ theo vị trí"""
+    items = _get_cart_items(request)
+    if 0 <= index < len(items):
+        del items[index]
+        _save_cart_items(request, items)
+        messages.success(request, constants.MSG_CART_ITEM_REMOVED)
+    return redirect('booking_cart')
+
+
+@user_or_admin_required
+def booking_cart(request):
+    """
+    Xem giỏ đặt sân.
+
+    Khung giờ trong giỏ được load bằng 1 query và tình trạng trống của mọi
+    (sân, ngày) được kiểm tra bằng 1 lần đọc sổ cái.
+    """
+    items = _get_cart_items(request)
+    slots = load_cart_slots(items)
+    booked = get_booked_slot_ids_many(
+        (slots[time_slot_id].pitch_id, booking_date)
+        for time_slot_id, booking_date in items if time_slot_id in slots
+    )
+
+    cart_items = []
+    for time_slot_id, booking_date in items:
+        slot = slots.get(time_slot_id)
+        if slot is None:
+            continue
+        cart_items.append({
+            'slot': slot,
+            'booking_date': booking_date,
+            'is_available': (
+                slot.is_available
+                and slot.id not in booked[(slot.pitch_id, booking_date)]),
+        })
+
+    context = {
+        'cart_items': cart_items,
+        'total_price': sum(item['slot'].price for item in cart_items),
+        'max_cart_items': constants.MAX_CART_ITEMS,
+    }
+    return render(request, 'user/booking_cart.html', context)
+
+
+@user_or_admin_required
+@require_POST
+def booking_cart_checkout(request):
+    """Đặt toàn bộ giỏ trong 1 transaction và gửi 1 email xác nhận chung"""
+    items = _get_cart_items(request)
+    voucher = _resolve_voucher(request.POST.get('voucher_code', ''), request)
+    note = request.POST.get('note') or None
+
+    try:
+        bookings = checkout_cart(request.user, items, voucher=voucher, note=note)
+    except ValidationError as e:
+        for error in e.messages:
+            messages.error(request, error)
+        return redirect('booking_cart')
+
+    _save_cart_items(request, [])
+    send_booking_cart_confirmation_email(request.user, bookings)
+    if bookings[0].voucher_id:
+        messages.success(request, constants.MSG_VOUCHER_APPLIED.format(
+            discount_percent=voucher.discount_percent))
+    messages.success(
+        request, constants.MSG_CART_CHECKED_OUT.format(count=len(bookings)))
+    return redirect('user_booking_list')
+
+
+# ============= BOOKING SERIES VIEWS =============
+
+@user_or_admin_required
+def booking_series_create(request, pitch_id):
+    """
+    Tạo lịch đặt định kỳ hằng tuần.
+
+    Bước xem trước liệt kê các buổi bị trùng trước khi người dùng xác nhận;
+    khi xác nhận, các buổi còn trống được tạo cùng lúc.
+    """
+    pitch = get_object_or_404(Pitch, id=pitch_id, is_available=True)
+    pitch_slots = {
+        str(slot.id): slot
+        for slot in PitchTimeSlot.objects.filter(
+            pitch=pitch, is_available=True
+        ).select_related('time_slot').order_by('time_slot__start_time')
+    }
+    time_slot_choices = [
+        (slot_id, f"{slot.time_slot.name} ({slot.price:,.0f}đ)")
+        for slot_id, slot in pitch_slots.items()
+    ]
+
+    preview = None
+    if request.method == 'POST':
+        form = BookingSeriesForm(
+            request.POST, time_slot_choices=time_slot_choices)
+        if form.is_valid():
+            pitch_time_slot = pitch_slots[form.cleaned_data['time_slot']]
+            pitch_time_slot.pitch = pitch
+            start_date = form.cleaned_data['start_date']
+            weeks = form.cleaned_data['weeks']
+
+            if request.POST.get('form_action') == 'preview':
+                dates = BookingSeries(
+                    start_date=start_date, weeks=weeks).occurrence_dates
+                conflicts = find_series_conflicts(pitch_time_slot, dates)
+                preview = [
+                    {'date': day, 'is_available': day not in conflicts}
+                    for day in dates
+                ]
+            else:
+                try:
+                    series, bookings, conflicts = create_booking_series(
+                        request.user,
+                        pitch_time_slot,
+                        start_date,
+                        weeks,
+                        note=form.cleaned_data['note'] or None,
+                    )
+                except ValidationError as e:
+                    messages.error(request, ' '.join(e.messages))
+                else:
+                    messages.success(
+                        request,
+                        constants.MSG_SERIES_CREATED.format(count=len(bookings)))
+                    if conflicts:
+                        messages.warning(
+                            request,
+                            constants.MSG_SERIES_CONFLICTS_SKIPPED.format(
+                                count=len(conflicts),
+                                dates=', '.join(
+                                    day.strftime('%d/%m/%Y') for day in conflicts)))
+                    return redirect('booking_series_detail', series_id=series.id)
+    else:
+        form = BookingSeriesForm(
+            initial={'start_date': date.today()},
+            time_slot_choices=time_slot_choices)
+
+    context = {
+        'form': form,
+        'pitch': pitch,
+        'preview': preview,
+        'max_series_weeks': constants.MAX_SERIES_WEEKS,
+    }
+    return render(request, 'user/booking_series_form.html', context)
+
+
+@user_or_admin_required
+def booking_series_detail(request, series_id):
+    """Chi tiết lịch định kỳ và các buổi của nó"""
+    if request.user.role == Role.ADMIN:
+        series = get_object_or_404(BookingSeries, id=series_id)
+    else:
+        series = get_object_or_404(
+            BookingSeries, id=series_id, user=request.user)
+
+    context = {
+        'series': series,
+        'bookings': series.bookings.order_by('booking_date'),
+        'today': date.today(),
+    }
+    return render(request, 'user/booking_series_detail.html', context)
+
+
+@user_or_admin_required
+@require_POST
+def booking_series_cancel(request, series_id):
+    """Hủy các buổi đang chờ xác nhận của lịch định kỳ"""
+    if request.user.role == Role.ADMIN:
+        series = get_object_or_404(BookingSeries, id=series_id)
+    else:
+        series = get_object_or_404(
+            BookingSeries, id=series_id, user=request.user)
+
+    if not series.is_active:
+        messages.error(request, constants.ERR_SERIES_ALREADY_CANCELLED)
+    else:
+        cancelled = cancel_booking_series(series)
+        messages.success(
+            request, constants.MSG_SERIES_CANCELLED.format(count=cancelled))
+    return redirect('booking_series_detail', series_id=series.id)
+
+
 @user_or_admin_required
 def user_booking_list(request):
     """Danh sách booking của user (hoặc tất cả nếu là admin)"""
@@ -1066,8 +1434,9 @@ def user_booking_list(request):
         bookings = bookings.filter(status=status_filter)
 
     # Pagination
-    paginator = Paginator(bookings, constants.BOOKINGS_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj = paginate(
+        request, bookings, constants.BOOKINGS_PER_PAGE,
+        ordering=('-booking_date', '-created_at', 'id'))
 
     context = {
         'page_obj': page_obj,
@@ -1197,13 +1566,8 @@ def get_available_time_slots_ajax(request, pitch_id):
     except ValueError:
         return JsonResponse({'error': 'Invalid date format'}, status=400)
 
-    all_time_slots = PitchTimeSlot.objects.filter(
-        pitch=pitch,
-        is_available=True
-    ).select_related('time_slot').order_by('time_slot__start_time')
-
     slots_data = []
-    for pts in all_time_slots:
+    for pts in get_pitch_slots_on_date(pitch, booking_date):
         slots_data.append({
             'id': pts.id,
             'name': pts.time_slot.name,
@@ -1211,50 +1575,205 @@ def get_available_time_slots_ajax(request, pitch_id):
             'end_time': pts.time_slot.end_time.strftime('%H:%M'),
             'duration': float(pts.time_slot.duration_hours()),
             'price': float(pts.get_price()),
-            'is_available': pts.is_available_on_date(booking_date)
+            'is_available': not pts.is_booked
         })
 
     return JsonResponse({'date': date_str, 'slots': slots_data})
 
 
-def check_voucher_ajax(request):
-    """AJAX: Kiểm tra mã giảm giá"""
-    code = request.GET.get('code', '')
+def get_availability_calendar_ajax(request, pitch_id):
+    """AJAX: Lịch trống của sân cho toàn bộ khoảng ngày được phép đặt"""
+    pitch = get_object_or_404(Pitch, id=pitch_id)
+    today = date.today()
+    start_str = request.GET.get('start')
 
+    if start_str:
+        try:
+            start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date format'}, status=400)
+    else:
+        start_date = today
+
+    last_date = today + timedelta(days=constants.MAX_BOOKING_ADVANCE_DAYS - 1)
+    if start_date < today or start_date > last_date:
+        return JsonResponse({'error': 'Date out of booking range'}, status=400)
+
+    days = (last_date - start_date).days + 1
+    return JsonResponse(get_availability_calendar(pitch, start_date, days))
+
+
+def _check_voucher(request, code):
+    """Kết quả kiểm tra mã giảm giá cho check_voucher_ajax"""
     if not code:
-        return JsonResponse(
-            {'valid': False, 'message': 'Vui lòng nhập mã giảm giá'})
+        return {'valid': False, 'message': 'Vui lòng nhập mã giảm giá'}
 
     is_valid_format, error_message = validate_voucher_code(code)
 
     if not is_valid_format:
-        return JsonResponse({'valid': False, 'message': error_message})
+        return {'valid': False, 'message': error_message}
+
+    # Tra qua cache theo mã nên gõ lại cùng mã không query Voucher
+    voucher = get_voucher_by_code(code)
+    if voucher is None:
+        return {'valid': False, 'message': 'Mã giảm giá không tồn tại'}
+    if not voucher.is_valid():
+        return {'valid': False, 'message': 'Mã giảm giá đã hết hạn'}
+    if VoucherRedemption.has_redeemed(request.user, voucher):
+        return {'valid': False, 'message': 'Bạn đã sử dụng voucher này rồi.'}
+    return {
+        'valid': True,
+        'message': f'Mã giảm {voucher.discount_percent}% có hiệu lực!',
+        'discount_percent': voucher.discount_percent,
+        'min_order_value': float(voucher.min_order_value) if voucher.min_order_value else None,
+    }
+
+
+@require_GET
+def check_voucher_ajax(request):
+    """AJAX: Kiểm tra mã giảm giá"""
+    response = JsonResponse(_check_voucher(request, request.GET.get('code', '')))
+    # Kết quả phụ thuộc người dùng (đã dùng voucher chưa) nên chỉ cho
+    # trình duyệt cache, tránh hỏi lại cùng 1 mã khi gõ xoá/gõ lại
+    patch_cache_control(
+        response, private=True,
+        max_age=constants.VOUCHER_CHECK_BROWSER_MAX_AGE)
+    return response
+
+
+REVIEW_FEED_ORDERING = ('-created_at', '-id')
+
+
+def _review_feed_paginator(pitch, per_page):
+    """Đánh giá mới nhất của sân, phân trang theo cursor"""
+    reviews = Review.objects.filter(pitch=pitch).select_related('user').only(
+        'id', 'rating', 'content', 'created_at', 'pitch_id',
+        'user__username', 'user__full_name')
+    return KeysetPaginator(reviews, REVIEW_FEED_ORDERING, per_page)
 
-    code_clean = code.strip().upper()
 
+def get_reviews_ajax(request, pitch_id):
+    """AJAX: Trang đánh giá tiếp theo của sân (?cursor=...)"""
+    pitch = get_object_or_404(Pitch, id=pitch_id)
     try:
-        voucher = Voucher.objects.get(code=code_clean)
-        if voucher.is_valid():
-            if request.user.is_authenticated:
-                has_used = Booking.objects.filter(
-                    user=request.user,
-                    voucher=voucher
-                ).exclude(status=BookingStatus.REJECTED).exists()
-                if has_used:
-                    return JsonResponse(
-                        {'valid': False, 'message': 'Bạn đã sử dụng voucher này rồi.'})
-            return JsonResponse({
-                'valid': True,
-                'message': f'Mã giảm {voucher.discount_percent}% có hiệu lực!',
-                'discount_percent': voucher.discount_percent,
-                'min_order_value': float(voucher.min_order_value) if voucher.min_order_value else None,
-            })
-        else:
-            return JsonResponse(
-                {'valid': False, 'message': 'Mã giảm giá đã hết hạn'})
-    except Voucher.DoesNotExist:
-        return JsonResponse(
-            {'valid': False, 'message': 'Mã giảm giá không tồn tại'})
+        page = _review_feed_paginator(
+            pitch, constants.REVIEWS_PER_PAGE
+        ).page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    return JsonResponse({
+        'reviews': [
+            {
+                'id': review.id,
+                'author': review.user.full_name or review.user.username,
+                'rating': review.rating,
+                'content': review.content,
+                'created_at': review.created_at.strftime('%d/%m/%Y'),
+            }
+            for review in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
+def _serialize_comment(comment):
+    children = [_serialize_comment(child) for child in comment.children]
+    return {
+        'id': comment.id,
+        'author': comment.user.full_name or comment.user.username,
+        'content': comment.content,
+        'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
+        'depth': comment.depth,
+        # Tổng số phản hồi trong nhánh (mọi tầng)
+        'reply_count': sum(1 + child['reply_count'] for child in children),
+        'children': children,
+    }
+
+
+def get_review_comments_ajax(request, review_id):
+    """AJAX: Toàn bộ luồng bình luận của đánh giá dạng cây (1 query)"""
+    review = get_object_or_404(Review, id=review_id)
+    comments = Comment.objects.filter(review=review).select_related(
+        'user').only(
+            'id', 'content', 'created_at', 'path', 'depth',
+            'parent_comment_id', 'review_id',
+            'user__username', 'user__full_name'
+    ).order_by('path')
+    comments = list(comments)
+    return JsonResponse({
+        'review_id': review.id,
+        'count': len(comments),
+        'comments': [
+            _serialize_comment(root) for root in Comment.build_tree(comments)
+        ],
+    })
+
+
+@login_required
+@require_POST
+def delete_comment_ajax(request, comment_id):
+    """AJAX: Xóa bình luận và mọi phản hồi bên dưới (chủ bình luận hoặc admin)"""
+    comment = get_object_or_404(Comment, id=comment_id)
+    if comment.user_id != request.user.id and \
+            request.user.role != constants.ROLE_ADMIN:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse({'deleted': comment.delete_subtree()})
+
+
+@login_required(login_url='login')
+@require_http_methods(['PUT', 'DELETE'])
+def favorite_ajax(request, pitch_id):
+    """
+    AJAX: PUT = yêu thích, DELETE = bỏ yêu thích (gọi lại nhiều lần vẫn
+    cùng kết quả). `changed` cho biết trạng thái có thực sự đổi không.
+    """
+    if request.method == 'PUT':
+        changed = add_favorite(request.user, pitch_id)
+    else:
+        changed = remove_favorite(request.user, pitch_id)
+    # Không đổi gì có thể do sân không tồn tại: chỉ khi đó mới query thêm
+    if not changed and not Pitch.objects.filter(pk=pitch_id).exists():
+        raise Http404("Sân không tồn tại.")
+
+    return JsonResponse({
+        'pitch_id': pitch_id,
+        'is_favorited': request.method == 'PUT',
+        'changed': changed,
+    })
+
+
+@require_GET
+def favorite_state_ajax(request):
+    """AJAX: Các sân đã yêu thích trong danh sách ?ids=1,2,3 (1 query)"""
+    try:
+        pitch_ids = {
+            int(value) for value in request.GET.get('ids', '').split(',')
+            if value.strip()
+        }
+    except ValueError:
+        return JsonResponse({'error': 'Invalid ids'}, status=400)
+    if len(pitch_ids) > constants.FAVORITE_STATE_MAX_IDS:
+        return JsonResponse({'error': 'Too many ids'}, status=400)
+
+    response = JsonResponse({
+        'favorited': sorted(get_favorited_pitch_ids(request.user, pitch_ids)),
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def autocomplete_ajax(request):
+    """AJAX: Gợi ý tên sân và cơ sở theo tiền tố đang gõ"""
+    query = request.GET.get('q', '')
+    response = JsonResponse({'query': query, **autocomplete(query)})
+    # Kết quả không phụ thuộc người dùng, cho trình duyệt giữ lại ít giây
+    # để gõ xoá/gõ lại không phải gọi server
+    patch_cache_control(
+        response, public=True,
+        max_age=constants.AUTOCOMPLETE_BROWSER_MAX_AGE)
+    return response
 
 
 @user_or_admin_required
@@ -1262,18 +1781,11 @@ def user_toggle_favorite(request, pitch_id):
     """Toggle yêu thích sân"""
     pitch = get_object_or_404(Pitch, id=pitch_id)
 
-    favorite, created = Favorite.objects.get_or_create(
-        user=request.user,
-        pitch=pitch
-    )
-
-    if not created:
-        favorite.delete()
-        messages.info(request, f'Đã bỏ yêu thích {pitch.name}.')
-        is_favorited = False
-    else:
+    is_favorited = toggle_favorite_state(request.user, pitch.id)
+    if is_favorited:
         messages.success(request, f'Đã thêm {pitch.name} vào yêu thích.')
-        is_favorited = True
+    else:
+        messages.info(request, f'Đã bỏ yêu thích {pitch.name}.')
 
     # Return JSON for AJAX or redirect for normal request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -1318,20 +1830,15 @@ def book_pitch(request, pitch_id):
     if selected_date:
         try:
             booking_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            all_pitch_time_slots = PitchTimeSlot.objects.filter(
-                pitch=pitch,
-                is_available=True
-            ).select_related('time_slot')
+            all_pitch_time_slots = get_pitch_slots_on_date(
+                pitch, booking_date)
 
-            if all_pitch_time_slots.count() == 0:
+            if not all_pitch_time_slots:
                 logger.warning(
                     f"No PitchTimeSlots available for pitch {pitch.id}")
 
             for pitch_time_slot in all_pitch_time_slots:
-                is_available = pitch_time_slot.is_available_on_date(
-                    booking_date)
-
-                if is_available:
+                if not pitch_time_slot.is_booked:
                     price = pitch_time_slot.get_price()
                     slot_data = {
                         'id': pitch_time_slot.id,
@@ -1361,12 +1868,7 @@ def book_pitch(request, pitch_id):
             try:
                 voucher = Voucher.objects.get(code=voucher_code_clean)
                 if voucher.is_valid():
-                    already_used = Booking.objects.filter(
-                        user=request.user,
-                        voucher=voucher
-                    ).exclude(status=BookingStatus.REJECTED).exists()
-
-                    if already_used:
+                    if VoucherRedemption.has_redeemed(request.user, voucher):
                         voucher_message = 'Bạn đã sử dụng voucher này rồi. Mỗi người chỉ dùng 1 lần.'
                         voucher_message_type = 'text-danger'
                     else:
@@ -1428,14 +1930,9 @@ def book_pitch(request, pitch_id):
                             voucher = Voucher.objects.get(
                                 code=voucher_code_clean)
                             if voucher.is_valid():
-                                already_used = Booking.objects.filter(
-                                    user=request.user,
-                                    voucher=voucher
-                                ).exclude(status=BookingStatus.REJECTED).exists()
-                                if already_used:
+                                if VoucherRedemption.has_redeemed(request.user, voucher):
                                     messages.warning(
-                                        request,
-                                        "Bạn đã sử dụng voucher này trước đó. Mỗi người chỉ dùng 1 lần.")
+                                        request, constants.ERR_VOUCHER_ALREADY_USED)
                                 else:
                                     booking.voucher = voucher
                             else:
@@ -1455,6 +1952,9 @@ def book_pitch(request, pitch_id):
                     f"Booking created: #{booking.id} by user {request.user.username}")
                 return redirect('pitch_list')
 
+            except ValidationError as e:
+                # Khung giờ vừa bị người khác đặt trước (ràng buộc UNIQUE)
+                messages.error(request, ' '.join(e.messages))
             except (PitchTimeSlot.DoesNotExist, ValueError) as e:
                 logger.error(f"Error creating booking", exc_info=True)
                 messages.error(
@@ -1499,17 +1999,8 @@ def favorite_list(request):
 @require_POST
 def toggle_favorite(request, pitch_id):
     pitch = get_object_or_404(Pitch, id=pitch_id)
-    
-    favorite, created = Favorite.objects.get_or_create(
-        user=request.user,
-        pitch=pitch
-    )
 
-    if not created:
-        favorite.delete()
-        is_favorited = False
-    else:
-        is_favorited = True
+    is_favorited = toggle_favorite_state(request.user, pitch.id)
 
     if 'application/json' in request.headers.get('Accept', ''):
         return JsonResponse({
@@ -1537,14 +2028,33 @@ def add_review(request, pitch_id):
         messages.error(request, constants.ERR_REVIEW_ONLY_AFTER_BOOKING)
         return redirect('user_booking_create', pitch_id=pitch_id)
 
-    form = ReviewForm(request.POST)
+    # Mỗi user 1 đánh giá/sân: gửi lại là sửa đánh giá cũ
+    existing = Review.objects.filter(user=request.user, pitch=pitch).first()
+    form = ReviewForm(request.POST, instance=existing)
     if form.is_valid():
         review = form.save(commit=False)
         review.user = request.user
         review.pitch = pitch
         review.save()
-        messages.success(request, constants.MSG_REVIEW_CREATED)
+        messages.success(
+            request,
+            constants.MSG_REVIEW_UPDATED if existing
+            else constants.MSG_REVIEW_CREATED)
     else:
         messages.error(request, "Lỗi khi gửi đánh giá. Vui lòng kiểm tra lại.")
 
     return redirect('user_booking_create', pitch_id=pitch_id)
+
+
+@login_required
+@require_POST
+def delete_review(request, pitch_id):
+    """Xóa đánh giá của user cho sân (điểm của sân cập nhật qua signal)"""
+    review = Review.objects.filter(
+        user=request.user, pitch_id=pitch_id).first()
+    if review is None:
+        messages.error(request, constants.ERR_REVIEW_NOT_FOUND)
+    else:
+        review.delete()
+        messages.success(request, constants.MSG_REVIEW_DELETED)
+    return redirect('user_booking_create', pitch_id=pitch_id)
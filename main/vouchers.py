@@ -0,0 +1,63 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import constants
+from .models import Voucher
+
+
+# ===== Cache tra cứu voucher theo mã =====
+
+VOUCHER_CACHE_PREFIX = 'voucher'
+_VOUCHER_VERSION_KEY = f'{VOUCHER_CACHE_PREFIX}:version'
+
+
+def normalize_voucher_code(code):
+    return (code or '').strip().upper()
+
+
+def _voucher_version():
+    version = cache.get(_VOUCHER_VERSION_KEY)
+    if version is None:
+        cache.add(_VOUCHER_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_VOUCHER_VERSION_KEY)
+    return version
+
+
+def invalidate_voucher_cache():
+    """Tăng version để bỏ mọi voucher đã cache (khi voucher được sửa/xoá)"""
+    try:
+        cache.incr(_VOUCHER_VERSION_KEY)
+    except ValueError:
+        cache.set(_VOUCHER_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_voucher_cache_on_commit():
+    """
+    Bỏ cache ngay và bỏ thêm lần nữa khi commit, tránh request khác
+    kịp cache lại voucher cũ trong lúc transaction chưa commit.
+    """
+    invalidate_voucher_cache()
+    transaction.on_commit(invalidate_voucher_cache)
+
+
+def get_voucher_by_code(code):
+    """
+    Voucher theo mã (không phân biệt hoa thường), None nếu không tồn tại.
+
+    Cache cả kết quả "không tồn tại" để gõ đi gõ lại 1 mã sai không query
+    lại. used_count trong cache có thể cũ tối đa VOUCHER_CACHE_TIMEOUT giây;
+    lượt dùng thật vẫn được kiểm tra lúc đặt sân (Voucher.redeem).
+    """
+    code = normalize_voucher_code(code)
+    cache_key = f'{VOUCHER_CACHE_PREFIX}:{_voucher_version()}:{code}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached['voucher']
+
+    voucher = Voucher.objects.filter(code=code).first()
+    cache.set(
+        cache_key, {'voucher': voucher},
+        timeout=constants.VOUCHER_CACHE_TIMEOUT)
+    return voucher